@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+カリキュラム作成時の日ごとの進捗（CurriculumProgress）の追加にかかる時間を比較するベンチマーク
+
+- orm: 1日ごとにCurriculumProgressのオブジェクトを作ってsession.addする従来の方法（コミット2回）
+- bulk: CurriculumProgress.bulk_insert_days による1回のexecutemany（カリキュラムと同じトランザクション）
+
+使い方:
+    python benchmarks/bench_curriculum_progress.py --days 30 180 365 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from src.models.curriculum import Curriculum, CurriculumProgress
+from src.models.user import db
+
+
+def new_curriculum(duration_days):
+    return Curriculum(
+        curriculum_id=str(uuid.uuid4()),
+        user_id='bench-user',
+        title='benchmark',
+        goal='benchmark',
+        duration_days=duration_days,
+        curriculum_data='{}',
+        status='active'
+    )
+
+
+def create_orm(duration_days):
+    curriculum = new_curriculum(duration_days)
+    db.session.add(curriculum)
+    db.session.commit()
+    for day in range(1, duration_days + 1):
+        db.session.add(CurriculumProgress(
+            progress_id=str(uuid.uuid4()),
+            curriculum_id=curriculum.curriculum_id,
+            user_id=curriculum.user_id,
+            day=day,
+            completed=False
+        ))
+    db.session.commit()
+
+
+def create_bulk(duration_days):
+    curriculum = new_curriculum(duration_days)
+    db.session.add(curriculum)
+    CurriculumProgress.bulk_insert_days(curriculum.curriculum_id, curriculum.user_id, duration_days)
+    db.session.commit()
+
+
+def measure(fn, duration_days, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(duration_days)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 180, 365])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', help='既定は一時ディレクトリのSQLiteファイル')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        print(f"{'days':>5} {'orm':>10} {'bulk':>10} {'speedup':>8}")
+        for duration_days in args.days:
+            orm_ms = measure(create_orm, duration_days, args.repeat)
+            bulk_ms = measure(create_bulk, duration_days, args.repeat)
+            print(f"{duration_days:>5} {orm_ms:>8.2f}ms {bulk_ms:>8.2f}ms {orm_ms / bulk_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
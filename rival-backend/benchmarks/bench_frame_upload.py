@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+/api/concentration/detect のフレーム送信方式ごとの転送量とサーバーCPU時間を比較するベンチマーク
+
+- JSON: Base64データURL（従来方式）
+- binary: image/jpeg のボディ
+- multipart: multipart/form-data のimageフィールド
+
+顔検出はスタブに置き換え、リクエストの受信・デコード部分のみを計測する。
+
+使い方:
+    python benchmarks/bench_frame_upload.py --frames 500
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 計測対象外の処理を無効化する
+os.environ['FRAME_CACHE_ENABLED'] = 'false'
+os.environ['FRAME_PREPROCESS_ENABLED'] = 'false'
+os.environ['CONCENTRATION_SESSION_BACKEND'] = 'memory'
+
+from flask import Flask
+from PIL import Image
+
+from src.routes import concentration
+from src.services import concentration_analyzer
+
+
+def make_webcam_like_jpeg(width=640, height=480):
+    """ノイズを含むWebカメラ相当のJPEG（toDataURLの既定品質0.92相当）を作成する"""
+    random.seed(0)
+    image = Image.effect_noise((width, height), 40).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def encode_multipart(image_bytes, boundary='----rivalbenchmarkboundary'):
+    body = (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def measure(client, label, body, content_type, frames):
+    start_cpu = time.process_time()
+    start_wall = time.perf_counter()
+    for _ in range(frames):
+        response = client.post('/api/concentration/detect', data=body, content_type=content_type)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    cpu_ms = (time.process_time() - start_cpu) * 1000 / frames
+    wall_ms = (time.perf_counter() - start_wall) * 1000 / frames
+    print(f"{label:<10} bytes/frame={len(body):>8}  cpu/frame={cpu_ms:6.3f}ms  wall/frame={wall_ms:6.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=500)
+    args = parser.parse_args()
+
+    # 顔検出はスタブに置き換える
+    concentration_analyzer.detect_face_presence = lambda image_bytes, image=None: (True, 99.0, None)
+
+    app = Flask(__name__)
+    app.register_blueprint(concentration.concentration_bp, url_prefix='/api/concentration')
+    client = app.test_client()
+
+    jpeg = make_webcam_like_jpeg()
+    json_body = json.dumps({
+        'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+    }).encode()
+    multipart_body, multipart_type = encode_multipart(jpeg)
+
+    print(f"JPEGサイズ: {len(jpeg)} bytes  フレーム数: {args.frames}")
+    measure(client, 'JSON', json_body, 'application/json', args.frames)
+    measure(client, 'binary', jpeg, 'image/jpeg', args.frames)
+    measure(client, 'multipart', multipart_body, multipart_type, args.frames)
+
+
+if __name__ == '__main__':
+    main()
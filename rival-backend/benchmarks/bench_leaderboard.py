@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+ランキング（累計学習時間・累計集中時間・今日の学習時間・今日の集中時間）の取得時間を比較するベンチマーク
+
+- legacy: User と DailyReport を外部結合して SUM/GROUP BY/ORDER BY する従来のクエリ
+- materialized: 差分更新している LeaderboardTotal と日付インデックスを使うクエリ
+- 今月のランキング: DailyReport を直接集計する場合と日別の集計（LeaderboardDaily）を合計する場合
+
+あわせて日報1件の作成・更新にかかる時間（累計の差分更新を含む）を計測する。
+SQLiteのファイルDBに直接データを投入する（既定の1000万件は数分かかる）。
+
+使い方:
+    python benchmarks/bench_leaderboard.py --users 100000 --reports 10000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func
+
+from src.models.user import DailyReport, LeaderboardDaily, LeaderboardTotal, User, db
+
+BATCH_SIZE = 50000
+
+
+def populate(db_path, users, reports):
+    """ユーザーごとに連続した日付の日報を投入する"""
+    random.seed(0)
+    connection = sqlite3.connect(db_path)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+
+    connection.executemany(
+        'INSERT INTO user (user_id, name, email, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
+        ((f'user-{i}', f'ユーザー{i}', f'user{i}@example.com') for i in range(users))
+    )
+
+    today = date.today()
+    per_user = reports // users
+    remainder = reports % users
+
+    def rows():
+        for i in range(users):
+            for day in range(per_user + (1 if i < remainder else 0)):
+                study_time = random.randint(0, 8 * 3600)
+                yield (
+                    uuid.uuid4().hex, f'user-{i}', (today - timedelta(days=day)).strftime('%Y-%m-%d'),
+                    study_time, int(study_time * random.random())
+                )
+
+    batch = []
+    for row in rows():
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.executemany(
+                'INSERT INTO daily_report (report_id, user_id, date, total_study_time, total_focus_time) '
+                'VALUES (?, ?, ?, ?, ?)', batch
+            )
+            batch.clear()
+    if batch:
+        connection.executemany(
+            'INSERT INTO daily_report (report_id, user_id, date, total_study_time, total_focus_time) '
+            'VALUES (?, ?, ?, ?, ?)', batch
+        )
+    connection.commit()
+    connection.close()
+
+
+def legacy_total(column):
+    return db.session.query(
+        User.user_id, User.name, func.coalesce(func.sum(column), 0)
+    ).outerjoin(
+        DailyReport, User.user_id == DailyReport.user_id
+    ).group_by(
+        User.user_id, User.name
+    ).order_by(
+        func.coalesce(func.sum(column), 0).desc()
+    ).limit(10).all()
+
+
+def materialized_total(column):
+    return db.session.query(
+        User.user_id, User.name, column
+    ).join(
+        User, User.user_id == LeaderboardTotal.user_id
+    ).order_by(column.desc()).limit(10).all()
+
+
+def today_ranking(column):
+    return db.session.query(
+        User.user_id, User.name, column
+    ).join(
+        DailyReport, User.user_id == DailyReport.user_id
+    ).filter(
+        DailyReport.date == date.today()
+    ).order_by(column.desc()).limit(10).all()
+
+
+def month_from_reports(column):
+    start = date.today().replace(day=1)
+    return db.session.query(
+        User.user_id, User.name, func.sum(column).label('value')
+    ).join(
+        DailyReport, User.user_id == DailyReport.user_id
+    ).filter(
+        DailyReport.date >= start
+    ).group_by(User.user_id, User.name).order_by(func.sum(column).desc()).limit(10).all()
+
+
+def month_from_buckets(column):
+    start = date.today().replace(day=1)
+    totals = db.session.query(
+        LeaderboardDaily.user_id, func.sum(column).label('value')
+    ).filter(
+        LeaderboardDaily.day >= start
+    ).group_by(LeaderboardDaily.user_id).subquery()
+    return db.session.query(
+        User.user_id, User.name, totals.c.value
+    ).join(
+        User, User.user_id == totals.c.user_id
+    ).order_by(totals.c.value.desc(), totals.c.user_id).limit(10).all()
+
+
+def measure(label, fn, repeat):
+    fn()  # ウォームアップ
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<32} median={statistics.median(samples):10.3f}ms  max={max(samples):10.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--reports', type=int, default=10000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'rival_bench_leaderboard.db'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{args.db}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        populate(args.db, args.users, args.reports)
+        print(f"データ投入: users={args.users} reports={args.reports} ({time.perf_counter() - start:.1f}s)")
+
+        start = time.perf_counter()
+        LeaderboardTotal.initialize()
+        print(f"累計テーブルの初期構築: {time.perf_counter() - start:.1f}s")
+
+        assert [row[2] for row in legacy_total(DailyReport.total_study_time)] == \
+            [row[2] for row in materialized_total(LeaderboardTotal.total_study_time)]
+
+        measure('legacy total study', lambda: legacy_total(DailyReport.total_study_time), args.repeat)
+        measure('legacy total focus', lambda: legacy_total(DailyReport.total_focus_time), args.repeat)
+        measure('materialized total study', lambda: materialized_total(LeaderboardTotal.total_study_time), args.repeat)
+        measure('materialized total focus', lambda: materialized_total(LeaderboardTotal.total_focus_time), args.repeat)
+        measure('today study (indexed)', lambda: today_ranking(DailyReport.total_study_time), args.repeat)
+        measure('today focus (indexed)', lambda: today_ranking(DailyReport.total_focus_time), args.repeat)
+        measure('month study (daily reports)', lambda: month_from_reports(DailyReport.total_study_time), args.repeat)
+        measure('month study (daily buckets)', lambda: month_from_buckets(LeaderboardDaily.total_study_time), args.repeat)
+
+        # 日報の更新と累計の差分更新を1トランザクションで行うコスト
+        def update_report():
+            user_id = f'user-{random.randrange(args.users)}'
+            report = DailyReport.query.filter_by(user_id=user_id).first()
+            if report is None:
+                return
+            previous = report.total_study_time or 0
+            report.total_study_time = max(0, previous + random.randint(-60, 60))
+            LeaderboardTotal.apply_delta(user_id, report.total_study_time - previous, 0)
+            db.session.commit()
+
+        measure('report update + delta', update_report, args.repeat * 20)
+
+    os.remove(args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Rekognitionクライアントの使い回しによるレイテンシ改善を計測するベンチマーク
+
+ローカルに立てたスタブのRekognitionエンドポイントに対して
+- 毎回クライアントを作成する方式（変更前）
+- 共有クライアントを使う方式（変更後）
+の1回あたりのレイテンシを比較する。
+
+使い方:
+    python benchmarks/bench_rekognition_client.py --calls 200
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3
+
+from src.services import concentration_analyzer
+
+STUB_RESPONSE = json.dumps({
+    'FaceDetails': [{'Confidence': 99.5, 'BoundingBox': {'Width': 0.3, 'Height': 0.4, 'Left': 0.3, 'Top': 0.2}}]
+}).encode()
+
+
+class StubRekognitionHandler(BaseHTTPRequestHandler):
+    # Keep-Aliveを有効にするためHTTP/1.1で応答する
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubRekognitionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def legacy_call(image_bytes, endpoint_url):
+    """変更前: 呼び出しごとにクライアントを作成する"""
+    rekognition = boto3.client(
+        'rekognition',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+        region_name=os.environ['AWS_DEFAULT_REGION'],
+        endpoint_url=endpoint_url
+    )
+    rekognition.detect_faces(Image={'Bytes': image_bytes}, Attributes=['DEFAULT'])
+
+
+def measure(label, func, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<20} mean={statistics.mean(latencies):7.2f}ms  "
+          f"p50={statistics.median(latencies):7.2f}ms  p95={p95:7.2f}ms")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    server, endpoint_url = start_stub_server()
+    os.environ['AWS_ACCESS_KEY_ID'] = 'AKIABENCHMARK'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'benchmark-secret'
+    os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
+    os.environ['REKOGNITION_ENDPOINT_URL'] = endpoint_url
+
+    image_bytes = os.urandom(40 * 1024)
+    image_base64 = 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode()
+
+    print(f"スタブエンドポイント: {endpoint_url}  呼び出し回数: {args.calls}")
+    before = measure('変更前 (毎回作成)', lambda: legacy_call(image_bytes, endpoint_url), args.calls)
+    concentration_analyzer.reset_rekognition_client()
+    after = measure('変更後 (共有)', lambda: concentration_analyzer.analyze_face_presence(image_base64), args.calls)
+
+    print(f"高速化: {before / after:.1f}x")
+    print(f"クライアント統計: {concentration_analyzer.get_client_stats()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
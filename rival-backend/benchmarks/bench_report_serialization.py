@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+日報一覧（GET /api/users/<user_id>/reports）のレスポンス生成時間を比較するベンチマーク
+
+- flask: Flask標準のJSONプロバイダ（保存済みの時系列JSONを json.loads してから再度エンコードする）
+- stdlib: FastJSONProvider（標準のjson）。時系列JSONはデコードせずにそのまま埋め込む
+- orjson: FastJSONProvider（orjson）。時系列JSONはデコードせずにそのまま埋め込む
+
+使い方:
+    python benchmarks/bench_report_serialization.py --reports 365 --points 480
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from src.models.user import DailyReport, db
+from src.routes.user import user_bp
+from src.services.json_provider import FastJSONProvider, orjson
+
+
+def make_app(db_uri, provider):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    if provider == 'stdlib':
+        app.json = FastJSONProvider(app, use_orjson=False)
+    elif provider == 'orjson':
+        app.json = FastJSONProvider(app)
+    db.init_app(app)
+    app.register_blueprint(user_bp, url_prefix='/api')
+    return app
+
+
+def populate(app, reports, points):
+    """1日あたりpoints件の時系列（クライアントが送る形式のJSON）を持つ日報を投入する"""
+    start = date.today() - timedelta(days=reports)
+    with app.app_context():
+        db.create_all()
+        rows = []
+        for offset in range(reports):
+            day = start + timedelta(days=offset)
+            base = datetime.combine(day, datetime.min.time())
+            series = [
+                {'timestamp': (base + timedelta(minutes=i)).isoformat(), 'score': (i * 7) % 100}
+                for i in range(points)
+            ]
+            rows.append({
+                'report_id': str(uuid.uuid4()),
+                'user_id': 'bench-user',
+                'date': day,
+                'total_study_time': 3600,
+                'total_focus_time': 1800,
+                'avg_focus_score': 72.5,
+                'interruption_count': 3,
+                'ai_summary': '今日は集中して学習できました。',
+                'user_notes': '',
+                'time_series_focus_data': json.dumps(series),
+                'created_at': base,
+                'updated_at': base
+            })
+        db.session.execute(DailyReport.__table__.insert(), rows)
+        db.session.commit()
+
+
+def measure(app, path, repeat):
+    client = app.test_client()
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        size = len(response.get_data())
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=365)
+    parser.add_argument('--points', type=int, default=480, help='1日あたりの時系列の件数')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    db_uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    populate(make_app(db_uri, 'flask'), args.reports, args.points)
+
+    providers = ['flask', 'stdlib'] + (['orjson'] if orjson is not None else [])
+    paths = [
+        ('list', f'/api/users/bench-user/reports?exclude=time_series&limit={args.reports}'),
+        ('time_series', f'/api/users/bench-user/reports?limit={args.reports}'),
+    ]
+    print(f"{args.reports} reports x {args.points} points")
+    for label, path in paths:
+        for provider in providers:
+            elapsed_ms, size = measure(make_app(db_uri, provider), path, args.repeat)
+            print(f"{label:<12} {provider:<7} {elapsed_ms:9.2f}ms {size / 1024:10.1f}KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+token_required を付けたエンドポイントの1リクエストあたりの処理時間を比較するベンチマーク
+
+- no auth: トークン検証なし
+- uncached: 毎回RS256の署名を検証する（従来の auth.verify_id_token 相当）
+- cached: TokenVerifier のキャッシュを使う
+
+Firebaseの代わりにローカルで生成したRSA鍵でIDトークン相当のJWTを署名し、
+google-authで検証する（証明書の取得は含まない）。
+
+使い方:
+    python benchmarks/bench_token_verifier.py --requests 2000
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from flask import Flask, g, jsonify
+from google.auth import crypt, jwt
+
+from src.routes import auth as auth_routes
+from src.services.token_verifier import TokenVerifier
+
+
+def make_signer_and_certs():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'benchmark')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()).serial_number(1).not_valid_before(now).not_valid_after(
+        now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(private_pem, key_id='benchmark')
+    return signer, {'benchmark': cert.public_bytes(serialization.Encoding.PEM)}
+
+
+def measure(client, label, headers, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/protected', headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    per_request_us = (time.perf_counter() - start) * 1e6 / requests
+    print(f"{label:<10} {per_request_us:8.1f}us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    signer, certs = make_signer_and_certs()
+    now = int(time.time())
+    token = jwt.encode(signer, {
+        'iss': 'https://securetoken.google.com/benchmark', 'aud': 'benchmark',
+        'sub': 'user-1', 'uid': 'user-1', 'iat': now, 'exp': now + 3600
+    }).decode()
+
+    def verify_signature(id_token):
+        return jwt.decode(id_token, certs=certs, audience='benchmark')
+
+    app = Flask(__name__)
+
+    @app.route('/open')
+    def open_route():
+        return jsonify({'ok': True})
+
+    @app.route('/protected')
+    @auth_routes.token_required
+    def protected_route():
+        return jsonify({'uid': g.user['uid']})
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        client.get('/open')
+    print(f"{'no auth':<10} {(time.perf_counter() - start) * 1e6 / args.requests:8.1f}us/request")
+
+    auth_routes.token_verifier = TokenVerifier(max_ttl=0, prefetch_interval=0, verify=verify_signature)
+    measure(client, 'uncached', headers, args.requests)
+
+    auth_routes.token_verifier = TokenVerifier(prefetch_interval=0, verify=verify_signature)
+    measure(client, 'cached', headers, args.requests)
+    print(auth_routes.token_verifier.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ import json
 sys.path.insert(0, os.path.dirname(__file__))
 
 from src.main import app
-from src.models.user import db, User, DailyReport
+from src.models.user import db, User, DailyReport, rebuild_leaderboards
 
 def create_current_sample_data():
     with app.app_context():
@@ -18,7 +18,7 @@ def create_current_sample_data():
         # 今日から過去7日間のサンプルレポートを作成
         today = datetime.now()
         for i in range(7):
-            date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+            date = (today - timedelta(days=i)).date()
             
             # 既存のレポートを削除
             existing_report = DailyReport.query.filter_by(user_id=sample_user_id, date=date).first()
@@ -65,6 +65,8 @@ def create_current_sample_data():
             print(f"新しいサンプルレポートを作成しました: {date}")
         
         db.session.commit()
+        # 日報を直接追加したため、ランキングの集計を作り直す
+        rebuild_leaderboards()
         print("現在の日付でのサンプルデータの作成が完了しました。")
 
 if __name__ == "__main__":
@@ -9,7 +9,7 @@ import json
 sys.path.insert(0, os.path.dirname(__file__))
 
 from src.main import app
-from src.models.user import db, User, DailyReport
+from src.models.user import db, User, DailyReport, rebuild_leaderboards
 
 def create_sample_data():
     with app.app_context():
@@ -35,7 +35,7 @@ def create_sample_data():
         
         # 過去7日間のサンプルレポートを作成
         for i in range(7):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
+            date = (datetime.now() - timedelta(days=i)).date()
             
             # 既存のレポートをチェック
             existing_report = DailyReport.query.filter_by(user_id=sample_user_id, date=date).first()
@@ -82,6 +82,8 @@ def create_sample_data():
             print(f"サンプルレポートを作成しました: {date}")
         
         db.session.commit()
+        # 日報を直接追加したため、ランキングの集計を作り直す
+        rebuild_leaderboards()
         print("サンプルデータの作成が完了しました。")
 
 if __name__ == "__main__":
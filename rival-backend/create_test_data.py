@@ -8,7 +8,7 @@ import random
 sys.path.insert(0, os.path.dirname(__file__))
 
 from src.main import app
-from src.models.user import db, User, DailyReport
+from src.models.user import db, User, DailyReport, rebuild_leaderboards
 
 def create_test_data():
     with app.app_context():
@@ -38,13 +38,12 @@ def create_test_data():
         today = date.today()
         for i in range(31):  # 今日を含めるため31日に変更
             current_date = today - timedelta(days=i)
-            date_str = current_date.strftime('%Y-%m-%d')
             
             for user_data in test_users:
                 user_id = user_data['user_id']
                 
                 # 既存のレポートがあるかチェック
-                existing_report = DailyReport.query.filter_by(user_id=user_id, date=date_str).first()
+                existing_report = DailyReport.query.filter_by(user_id=user_id, date=current_date).first()
                 if existing_report:
                     continue
                 
@@ -57,7 +56,7 @@ def create_test_data():
                 report = DailyReport(
                     report_id=str(uuid.uuid4()),
                     user_id=user_id,
-                    date=date_str,
+                    date=current_date,
                     total_study_time=total_study_time,
                     total_focus_time=total_focus_time,
                     avg_focus_score=avg_focus_score,
@@ -68,6 +67,8 @@ def create_test_data():
                 db.session.add(report)
         
         db.session.commit()
+        # 日報を直接追加したため、ランキングの集計を作り直す
+        rebuild_leaderboards()
         print("テストデータを作成しました。")
 
 if __name__ == "__main__":
@@ -74,6 +74,15 @@ def migrate_data():
             pg_conn.commit()
             print(f"{table}テーブルの移行完了: {len(rows)}行")
         
+        # ランキングの集計は移行した日報と一致しないため空にする（次回起動時に日報から作り直される）
+        try:
+            pg_cursor.execute("DELETE FROM leaderboard_total")
+            pg_cursor.execute("DELETE FROM leaderboard_daily")
+            pg_conn.commit()
+        except psycopg2.Error:
+            # アプリをまだ起動していない（テーブルがない）場合は何もしない
+            pg_conn.rollback()
+        
         print("\nデータ移行が完了しました")
         return True
         
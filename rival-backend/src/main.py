@@ -4,6 +4,10 @@ from src.routes.concentration import concentration_bp
 from src.routes.curriculum import curriculum_bp
 from src.routes.user import user_bp
 from src.models.user import db
+from src.models.migrations import prepare_database
+from src.services.json_provider import FastJSONProvider
+from src.services.response_compression import response_compressor
+from src.services.token_verifier import token_verifier
 from flask_cors import CORS
 from flask import Flask
 import os
@@ -18,6 +22,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 
 app = Flask(__name__)
+# レスポンスのJSONはorjson（なければ標準のjson）で作り、保存済みのJSON列はそのまま埋め込む
+app.json = FastJSONProvider(app)
+# 一定以上の大きさのレスポンスはAccept-Encodingに応じて圧縮する
+response_compressor.init_app(app)
 
 # --- 設定 ---
 # SECRET_KEYを環境変数から取得
@@ -40,6 +48,12 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# WebSocket（集中度検出ストリーム）の設定
+app.config['SOCK_SERVER_OPTIONS'] = {
+    'ping_interval': 25,
+    'max_message_size': int(os.environ.get('FRAME_MAX_BYTES', 5 * 1024 * 1024))
+}
+
 # Firebase Admin SDKの初期化（エラーハンドリング強化）
 firebase_initialized = False
 try:
@@ -70,7 +84,8 @@ except Exception as e:
     print("Firebase機能なしでアプリケーションを続行します。")
 
 # --- CORS ---
-CORS(app, resources={r"/api/*": {"origins": "*"}})  # APIルートに対してのみCORSを許可
+# APIルートに対してのみCORSを許可（一覧APIの次ページのカーソルはヘッダーで返すため公開する）
+CORS(app, resources={r"/api/*": {"origins": "*", "expose_headers": ["X-Next-Cursor"]}})
 
 # --- データベース ---
 database_initialized = False
@@ -78,8 +93,7 @@ try:
     db.init_app(app)
     with app.app_context():
         if os.environ.get('DATABASE_URL'):
-            # AWS RDS用 - 常にテーブル作成を試行（存在する場合はスキップされる）
-            db.create_all()
+            # AWS RDS用（テーブル作成は下の prepare_database で行う）
             print("AWS RDSデータベースに接続しました。")
         else:
             # ローカル開発用SQLite
@@ -88,11 +102,14 @@ try:
             if not os.path.exists(db_path):
                 # データベースディレクトリが存在しない場合は作成
                 os.makedirs(os.path.dirname(db_path), exist_ok=True)
-                db.create_all()
                 print("ローカルデータベースを新規作成しました。")
             else:
-                db.create_all()
                 print("既存のローカルデータベースに接続しました。")
+        # テーブル作成・未適用のスキーマ変更・ランキング用の累計テーブルの準備を
+        # ロックを取得して行う（ワーカーごとに同時に起動しても実行されるのは1回だけ）
+        applied = prepare_database()
+        if applied:
+            print(f"スキーマのマイグレーションを適用しました: {applied}")
     database_initialized = True
 except Exception as e:
     print(f"データベース初期化でエラーが発生しました: {e}")
@@ -121,6 +138,16 @@ def health_check():
         'database_initialized': database_initialized
     }
 
+# --- アプリ全体のメトリクス（機能ごとのものは各Blueprintの /metrics で返す） ---
+
+
+@app.route('/metrics')
+def app_metrics():
+    return {
+        'token_cache': token_verifier.stats(),
+        'compression': response_compressor.stats()
+    }
+
 
 # --- Blueprints ---
 app.register_blueprint(user_bp, url_prefix='/api')
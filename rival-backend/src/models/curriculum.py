@@ -1,8 +1,15 @@
 from src.models.user import db
+from src.services.json_provider import RawJSON
 from datetime import datetime
 import json
+import uuid
 
 class Curriculum(db.Model):
+    # ユーザーごとの一覧（作成日の新しい順）をインデックス順に読む
+    __table_args__ = (
+        db.Index('ix_curriculum_user_created', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     curriculum_id = db.Column(db.String(128), unique=True, nullable=False)
     user_id = db.Column(db.String(128), nullable=False)
@@ -18,7 +25,23 @@ class Curriculum(db.Model):
     def __repr__(self):
         return f'<Curriculum {self.curriculum_id}>'
 
-    def to_dict(self):
+    def set_plan(self, curriculum_data):
+        """
+        カリキュラムの内容を保存する。daily_plan は CurriculumDay に1日1行で保存し、
+        curriculum_data にはそれ以外（タイトル・概要・マイルストーンなど）だけを残す
+        """
+        header = dict(curriculum_data)
+        daily_plan = header.pop('daily_plan', None)
+        self.curriculum_data = json.dumps(header, ensure_ascii=False)
+        if daily_plan is not None:
+            CurriculumDay.replace_days(self.curriculum_id, daily_plan)
+            # 日ごとの計画だけが変わった場合もETagなどで変更が分かるように更新日時を進める
+            self.updated_at = datetime.utcnow()
+
+    def to_summary_dict(self):
+        """
+        一覧用。curriculum_data（日ごとの計画を含む）を読み込まない
+        """
         return {
             'id': self.id,
             'curriculum_id': self.curriculum_id,
@@ -27,13 +50,73 @@ class Curriculum(db.Model):
             'goal': self.goal,
             'duration_days': self.duration_days,
             'overview': self.overview,
-            'curriculum_data': json.loads(self.curriculum_data) if self.curriculum_data else {},
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_dict(self, raw_json=False):
+        """
+        raw_json: 日ごとの計画をデコードせずRawJSONのまま返す（jsonifyでそのまま埋め込まれる）
+        """
+        curriculum_data = json.loads(self.curriculum_data) if self.curriculum_data else {}
+        if 'daily_plan' not in curriculum_data:
+            curriculum_data['daily_plan'] = CurriculumDay.plans_for(self.curriculum_id, raw_json=raw_json)
+        result = self.to_summary_dict()
+        result['curriculum_data'] = curriculum_data
+        return result
+
+class CurriculumDay(db.Model):
+    """
+    カリキュラムの日ごとの計画（daily_plan の1要素）。dayは daily_plan 内の順番（1から）
+    """
+    __table_args__ = (
+        db.Index('uq_curriculum_day_curriculum_day', 'curriculum_id', 'day', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    curriculum_id = db.Column(db.String(128), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(255))
+    plan_data = db.Column(db.Text, nullable=False)  # JSON string
+
+    def __repr__(self):
+        return f'<CurriculumDay {self.curriculum_id} day {self.day}>'
+
+    def to_dict(self, raw_json=False):
+        return RawJSON(self.plan_data) if raw_json else json.loads(self.plan_data)
+
+    @classmethod
+    def replace_days(cls, curriculum_id, daily_plan):
+        """
+        カリキュラムの日ごとの計画を1回のINSERT（executemany）で入れ替える（コミットは呼び出し側で行う）
+        """
+        cls.query.filter_by(curriculum_id=curriculum_id).delete()
+        rows = [
+            {
+                'curriculum_id': curriculum_id,
+                'day': index,
+                'title': str(plan.get('title', ''))[:255] if isinstance(plan, dict) else None,
+                'plan_data': json.dumps(plan, ensure_ascii=False)
+            }
+            for index, plan in enumerate(daily_plan, start=1)
+        ]
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def plans_for(cls, curriculum_id, raw_json=False):
+        days = cls.query.filter_by(curriculum_id=curriculum_id).order_by(cls.day).all()
+        if raw_json:
+            return RawJSON('[' + ','.join(day.plan_data for day in days) + ']')
+        return [day.to_dict() for day in days]
+
 class CurriculumProgress(db.Model):
+    # カリキュラムの日ごとの進捗は1行だけ。カリキュラム単位の一覧は日順にインデックスで読む
+    __table_args__ = (
+        db.Index('uq_curriculum_progress_curriculum_day', 'curriculum_id', 'day', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     progress_id = db.Column(db.String(128), unique=True, nullable=False)
     curriculum_id = db.Column(db.String(128), nullable=False)
@@ -49,6 +132,50 @@ class CurriculumProgress(db.Model):
     def __repr__(self):
         return f'<CurriculumProgress {self.progress_id}>'
 
+    @classmethod
+    def bulk_insert_days(cls, curriculum_id, user_id, duration_days):
+        """
+        1日目からduration_days日目までの未完了の進捗を1回のINSERT（executemany）で追加する
+        ORMオブジェクトを作らないため日数が多くても速い（コミットは呼び出し側で行う）
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                'progress_id': str(uuid.uuid4()),
+                'curriculum_id': curriculum_id,
+                'user_id': user_id,
+                'day': day,
+                'completed': False,
+                'created_at': now,
+                'updated_at': now
+            }
+            for day in range(1, duration_days + 1)
+        ]
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def summarize(cls, curriculum_filter):
+        """
+        カリキュラムごとの進捗の集計（日数・完了日数・平均スコア）を1回のクエリで返す
+        curriculum_filter は Curriculum に対する条件。結果は (Curriculum.curriculum_id, status, created_at,
+        total_days, completed_days, average_score) の行で、進捗のないカリキュラムも含む
+        """
+        from sqlalchemy import case, func
+
+        return db.session.query(
+            Curriculum.curriculum_id,
+            Curriculum.status,
+            Curriculum.created_at,
+            func.count(cls.id),
+            func.coalesce(func.sum(case((cls.completed.is_(True), 1), else_=0)), 0),
+            func.avg(cls.score)
+        ).outerjoin(
+            cls, cls.curriculum_id == Curriculum.curriculum_id
+        ).filter(curriculum_filter).group_by(
+            Curriculum.id, Curriculum.curriculum_id, Curriculum.status, Curriculum.created_at
+        ).order_by(Curriculum.created_at.desc()).all()
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -64,3 +191,86 @@ class CurriculumProgress(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class CurriculumJob(db.Model):
+    """
+    カリキュラムの生成・再生成ジョブ（status: queued, running, succeeded, failed）
+    """
+    __table_args__ = (
+        db.Index('ix_curriculum_job_user_created', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(128), unique=True, nullable=False)
+    user_id = db.Column(db.String(128), nullable=False)
+    curriculum_id = db.Column(db.String(128))  # 再生成の対象、または生成されたカリキュラム
+    kind = db.Column(db.String(20), nullable=False, default='create')  # create, regenerate
+    goal = db.Column(db.Text, nullable=False)
+    duration_days = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<CurriculumJob {self.job_id}>'
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'curriculum_id': self.curriculum_id,
+            'kind': self.kind,
+            'goal': self.goal,
+            'duration_days': self.duration_days,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class CurriculumJobDay(db.Model):
+    """
+    ストリーミング生成中に届いた日ごとの計画（ジョブの完了時に削除し、以降はカリキュラム本体を参照する）
+    """
+    __table_args__ = (
+        db.Index('uq_curriculum_job_day_job_day', 'job_id', 'day', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(128), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    plan_data = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CurriculumJobDay {self.job_id} day {self.day}>'
+
+    def to_dict(self):
+        return {
+            'day': self.day,
+            'plan': json.loads(self.plan_data)
+        }
+
+class CurriculumResponseCache(db.Model):
+    """
+    Geminiが生成したカリキュラムを (正規化した目標, 日数, プロンプトのバージョン, モデル) のハッシュで保存する
+    """
+    __table_args__ = (
+        db.Index('ix_curriculum_response_cache_last_used', 'last_used_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)  # sha256(hex)
+    goal = db.Column(db.Text, nullable=False)  # 正規化した目標
+    duration_days = db.Column(db.Integer, nullable=False)
+    prompt_version = db.Column(db.Integer, nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    curriculum_data = db.Column(db.Text, nullable=False)  # JSON string
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CurriculumResponseCache {self.cache_key}>'
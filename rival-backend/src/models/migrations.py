@@ -0,0 +1,234 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+
+from src.models.curriculum import Curriculum, CurriculumDay, CurriculumProgress
+from src.models.user import DailyReport, DailyReportComment, FocusSeries, LeaderboardDaily, LeaderboardTotal, db
+
+try:
+    import fcntl
+except ImportError:  # Windowsではファイルロックを使わない（ローカル開発は1プロセスで起動する）
+    fcntl = None
+
+# PostgreSQLのアドバイザリロックのキー（スキーマ変更用）
+SCHEMA_LOCK_KEY = 7270014
+
+# db.create_all() は存在しないテーブルを作るだけで、既存テーブルの列の型やインデックスは変更しない。
+# 既存のデータベース（SQLite / PostgreSQL）に対するスキーマ変更はここにバージョン順に追加する。
+# 新規作成のデータベースではモデル定義どおりに作られるため、各マイグレーションは
+# 既に適用済みの状態であれば何もしないように書く。
+
+
+def _date_columns():
+    return [
+        (DailyReport.__table__, 'date'),
+        (DailyReportComment.__table__, 'date'),
+        (FocusSeries.__table__, 'date'),
+    ]
+
+
+def _migrate_date_columns(connection):
+    """
+    日付の列を String(10)（YYYY-MM-DD）から Date に変更する
+    PostgreSQLでは列の型をDATEに変更する。SQLiteでは値の表記をYYYY-MM-DDにそろえるだけで、
+    列の型宣言はVARCHAR(10)のまま残る（テーブルは作り直さない）。SQLAlchemyのDate型は
+    SQLiteでもYYYY-MM-DDの文字列として読み書きするため、アプリからの扱いは同じになる
+    """
+    inspector = inspect(connection)
+    for table, column in _date_columns():
+        if not inspector.has_table(table.name):
+            continue
+        column_type = next(c['type'] for c in inspector.get_columns(table.name) if c['name'] == column)
+        if isinstance(column_type, db.Date):
+            continue
+
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(
+                f'ALTER TABLE {table.name} ALTER COLUMN "{column}" TYPE DATE USING "{column}"::date'
+            ))
+        elif connection.dialect.name == 'sqlite':
+            # SQLiteのDate型はYYYY-MM-DDの文字列のまま保存されるため、値の表記だけをそろえる
+            # （型宣言は変更しなくても読み書きできる）
+            rows = connection.execute(text(f'SELECT id, "{column}" FROM {table.name}')).all()
+            for row_id, value in rows:
+                try:
+                    normalized = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+                except (TypeError, ValueError):
+                    raise ValueError(f'{table.name}.{column} has an invalid date: {value!r} (id={row_id})')
+                if normalized != value:
+                    connection.execute(
+                        text(f'UPDATE {table.name} SET "{column}" = :value WHERE id = :id'),
+                        {'value': normalized, 'id': row_id}
+                    )
+        else:
+            raise NotImplementedError(f'Date column migration is not supported on {connection.dialect.name}')
+
+
+def _delete_duplicate_rows(connection, table, key_columns):
+    """
+    一意インデックスを作る前に、key_columnsが同じ行を最後に更新された1行だけ残して削除する
+    削除した行のidのリストを返す
+    """
+    keys = [table.c[column] for column in key_columns]
+    duplicated = select(*keys).group_by(*keys).having(db.func.count() > 1).subquery()
+    rows = connection.execute(
+        select(table.c.id, table.c.updated_at, *keys).join(
+            duplicated, db.and_(*[key == duplicated.c[key.name] for key in keys])
+        )
+    ).all()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[2:]), []).append(row)
+    deleted = []
+    for key, group in groups.items():
+        # updated_atが新しい行（同じならidが大きい行）を残す
+        group.sort(key=lambda row: (row.updated_at is not None, row.updated_at or datetime.min, row.id))
+        removed = [row.id for row in group[:-1]]
+        print(f"{table.name}: {dict(zip(key_columns, key))} の重複行を削除します（残す行 id={group[-1].id}, 削除 id={removed}）")
+        deleted.extend(removed)
+    if deleted:
+        connection.execute(table.delete().where(table.c.id.in_(deleted)))
+    return deleted
+
+
+def _create_lookup_indexes(connection):
+    """
+    ユーザー・日付、カリキュラム・日などの検索に使う複合インデックスを作成する
+    一意インデックスを作る前に重複行を削除する（以前は同じユーザー・日付の日報を重複して作成できた）
+    """
+    inspector = inspect(connection)
+    if _delete_duplicate_rows(connection, DailyReport.__table__, ['user_id', 'date']):
+        # 削除した日報を含む集計になっているため空にする（起動時の初期化で日報から作り直される）
+        for table in (LeaderboardTotal.__table__, LeaderboardDaily.__table__):
+            if inspector.has_table(table.name):
+                connection.execute(table.delete())
+    _delete_duplicate_rows(connection, CurriculumProgress.__table__, ['curriculum_id', 'day'])
+
+    for table in (DailyReport.__table__, DailyReportComment.__table__,
+                  Curriculum.__table__, CurriculumProgress.__table__):
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+
+    # 一意インデックスに置き換えた旧インデックス
+    if 'ix_daily_report_user_date' in {index['name'] for index in inspector.get_indexes(DailyReport.__tablename__)}:
+        connection.execute(text('DROP INDEX ix_daily_report_user_date'))
+
+
+def _split_curriculum_days(connection):
+    """
+    curriculum_data に丸ごと保存していた daily_plan を curriculum_day テーブルに1日1行で移す
+    """
+    curriculum_table = Curriculum.__table__
+    day_table = CurriculumDay.__table__
+    rows = connection.execute(
+        curriculum_table.select().with_only_columns(
+            curriculum_table.c.id, curriculum_table.c.curriculum_id, curriculum_table.c.curriculum_data
+        ).where(curriculum_table.c.curriculum_data.like('%"daily_plan"%'))
+    ).all()
+    for row_id, curriculum_id, curriculum_data in rows:
+        try:
+            header = json.loads(curriculum_data)
+        except (TypeError, ValueError):
+            continue
+        daily_plan = header.pop('daily_plan', None) if isinstance(header, dict) else None
+        if not isinstance(daily_plan, list):
+            continue
+
+        connection.execute(day_table.delete().where(day_table.c.curriculum_id == curriculum_id))
+        days = [
+            {
+                'curriculum_id': curriculum_id,
+                'day': index,
+                'title': str(plan.get('title', ''))[:255] if isinstance(plan, dict) else None,
+                'plan_data': json.dumps(plan, ensure_ascii=False)
+            }
+            for index, plan in enumerate(daily_plan, start=1)
+        ]
+        if days:
+            connection.execute(day_table.insert(), days)
+        connection.execute(
+            curriculum_table.update().where(curriculum_table.c.id == row_id).values(
+                curriculum_data=json.dumps(header, ensure_ascii=False)
+            )
+        )
+
+
+# (バージョン, 内容, 関数)
+MIGRATIONS = [
+    (1, 'typed date columns', _migrate_date_columns),
+    (2, 'lookup indexes', _create_lookup_indexes),
+    (3, 'curriculum day rows', _split_curriculum_days),
+]
+
+
+@contextmanager
+def schema_lock(engine):
+    """
+    複数のワーカー・インスタンスが同時に起動してもスキーマ変更を1つずつ行うためのロック
+    PostgreSQLはアドバイザリロック、SQLiteはデータベースファイルの隣のロックファイルを使う
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            connection.commit()
+            try:
+                yield
+            finally:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': SCHEMA_LOCK_KEY})
+                connection.commit()
+    elif engine.dialect.name == 'sqlite' and fcntl is not None and engine.url.database not in (None, '', ':memory:'):
+        with open(f'{engine.url.database}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+def prepare_database():
+    """
+    起動時に呼ぶ（アプリケーションコンテキスト内）。テーブルの作成、未適用のマイグレーション、
+    ランキング集計の初期化をロックを取得して行う。gunicornの各ワーカーが同時に呼んでも
+    先に取得したワーカーだけが変更を行い、後から来たワーカーは適用済みの状態を見て何もしない
+    適用したバージョンのリストを返す
+    """
+    with schema_lock(db.engine):
+        db.create_all()
+        applied = run_migrations()
+        LeaderboardTotal.initialize()
+    return applied
+
+
+def run_migrations(engine=None):
+    """
+    未適用のマイグレーションを順に実行し、schema_version テーブルに記録する
+    db.create_all() の後に呼ぶ。適用したバージョンのリストを返す
+    """
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+        ))
+        current = connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        # 1つのマイグレーションとその記録を同じトランザクションで行う
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(
+                text('INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+            )
+        applied.append(version)
+    return applied
@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+from src.services.focus_series import decode_samples, encode_samples, group_samples_by_date, samples_to_json
+from src.services.json_provider import RawJSON
 
 db = SQLAlchemy()
 
@@ -31,10 +34,18 @@ class User(db.Model):
         }
 
 class DailyReport(db.Model):
+    # 日報の取得・更新はユーザーと日付で引く。今日のランキング（日付で絞って時間順に上位N件）も
+    # インデックスだけで引けるようにする
+    __table_args__ = (
+        db.Index('uq_daily_report_user_date', 'user_id', 'date', unique=True),
+        db.Index('ix_daily_report_date_study_time', 'date', 'total_study_time'),
+        db.Index('ix_daily_report_date_focus_time', 'date', 'total_focus_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     report_id = db.Column(db.String(128), unique=True, nullable=False)
     user_id = db.Column(db.String(128), nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD format
+    date = db.Column(db.Date, nullable=False)
     total_study_time = db.Column(db.Integer, default=0)  # seconds
     total_focus_time = db.Column(db.Integer, default=0)  # seconds
     avg_focus_score = db.Column(db.Float, default=0.0)  # 0-100
@@ -48,29 +59,248 @@ class DailyReport(db.Model):
     def __repr__(self):
         return f'<DailyReport {self.report_id}>'
 
-    def to_dict(self):
+    def to_dict(self, include_time_series=True, focus_series=None, raw_json=False):
+        """
+        include_time_series: 時系列データを含めるか（?exclude=time_series の一覧では省略してデコードを避ける）
+        focus_series: 事前に読み込んだFocusSeries（存在しないことが分かっている場合はFalse、
+                      省略時は必要に応じて取得する）
+        raw_json: 保存済みの時系列JSONをデコードせずRawJSONのまま返す（jsonifyでそのまま埋め込まれる）
+        """
         import json
-        return {
+        data = {
             'id': self.id,
             'report_id': self.report_id,
             'user_id': self.user_id,
-            'date': self.date,
+            'date': self.date.isoformat() if self.date else None,
             'total_study_time': self.total_study_time,
             'total_focus_time': self.total_focus_time,
             'avg_focus_score': self.avg_focus_score,
             'interruption_count': self.interruption_count,
             'ai_summary': self.ai_summary,
             'user_notes': self.user_notes,
-            'time_series_focus_data': json.loads(self.time_series_focus_data) if self.time_series_focus_data else [],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if include_time_series:
+            if focus_series is None:
+                focus_series = FocusSeries.query.filter_by(user_id=self.user_id, date=self.date).first()
+            # サーバー側で記録した時系列があればそれを、なければクライアントが送ったJSONを返す
+            if focus_series and focus_series.sample_count:
+                data['time_series_focus_data'] = focus_series.to_list()
+            elif raw_json:
+                data['time_series_focus_data'] = RawJSON(self.time_series_focus_data or '[]')
+            else:
+                data['time_series_focus_data'] = json.loads(self.time_series_focus_data) if self.time_series_focus_data else []
+        return data
+
+def parse_report_date(value):
+    """
+    YYYY-MM-DD形式の日付文字列をdateに変換する（不正な形式はNone）
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def _increment_totals(model, keys, study_delta, focus_delta):
+    """
+    keysで特定される行の学習時間・集中時間に差分を加える（行がなければ作成する）
+    """
+    if not study_delta and not focus_delta:
+        return
+    # 読み込まずにUPDATE文で加算し、同時更新でも差分が失われないようにする
+    increment = {
+        model.total_study_time: model.total_study_time + study_delta,
+        model.total_focus_time: model.total_focus_time + focus_delta,
+        model.updated_at: datetime.utcnow()
+    }
+    if model.query.filter_by(**keys).update(increment, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(total_study_time=study_delta, total_focus_time=focus_delta, **keys))
+    except IntegrityError:
+        # 別のワーカーが先に行を作成した場合は加算し直す
+        model.query.filter_by(**keys).update(increment, synchronize_session=False)
+
+def apply_report_delta(user_id, day, study_delta=0, focus_delta=0):
+    """
+    日報の変更分を累計と日別のランキング集計に反映する（コミットは呼び出し側で行う）
+    """
+    LeaderboardTotal.apply_delta(user_id, study_delta, focus_delta)
+    LeaderboardDaily.apply_delta(user_id, day, study_delta, focus_delta)
+
+class LeaderboardTotal(db.Model):
+    """
+    ランキング用のユーザーごとの累計（日報の作成・更新・削除時に差分で更新する）
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), unique=True, nullable=False)
+    total_study_time = db.Column(db.Integer, nullable=False, default=0, index=True)  # seconds
+    total_focus_time = db.Column(db.Integer, nullable=False, default=0, index=True)  # seconds
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LeaderboardTotal {self.user_id}>'
+
+    @classmethod
+    def apply_delta(cls, user_id, study_delta=0, focus_delta=0):
+        """
+        累計に差分を加える（コミットは呼び出し側で日報の変更と一緒に行う）
+        """
+        _increment_totals(cls, {'user_id': user_id}, study_delta, focus_delta)
+
+    @classmethod
+    def touch(cls, user_id):
+        """
+        集計値を変えずに更新日時だけを進める（ランキングのキャッシュの版に使われる）
+        """
+        cls.query.filter_by(user_id=user_id).update({cls.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+    @classmethod
+    def ensure_user(cls, user_id):
+        """
+        日報がまだないユーザーも0件でランキングに載るように行を作成する
+        """
+        if cls.query.filter_by(user_id=user_id).first() is None:
+            db.session.add(cls(user_id=user_id, total_study_time=0, total_focus_time=0))
+
+    @classmethod
+    def rebuild(cls):
+        """
+        全ユーザーの日報を集計して累計を作り直す
+        """
+        from sqlalchemy import func, select
+
+        cls.query.delete()
+        totals = select(
+            User.user_id,
+            func.coalesce(func.sum(DailyReport.total_study_time), 0),
+            func.coalesce(func.sum(DailyReport.total_focus_time), 0)
+        ).outerjoin(
+            DailyReport, User.user_id == DailyReport.user_id
+        ).group_by(User.user_id)
+        db.session.execute(
+            cls.__table__.insert().from_select(['user_id', 'total_study_time', 'total_focus_time'], totals)
+        )
+        db.session.commit()
+
+    @classmethod
+    def initialize(cls):
+        """
+        起動時に呼ぶ。累計テーブルが空でユーザーがいる場合（導入直後）は日報から作り直す
+        複数のワーカーから同時に呼ばれないよう migrations.prepare_database でロックを取得して呼ぶ
+        """
+        if cls.query.first() is None and User.query.first() is not None:
+            cls.rebuild()
+        if LeaderboardDaily.query.first() is None and DailyReport.query.first() is not None:
+            LeaderboardDaily.rebuild()
+
+class LeaderboardDaily(db.Model):
+    """
+    ランキング用のユーザー・日ごとの集計（週・月・任意期間のランキングはこの行を合計する）
+    """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_leaderboard_daily_user_day'),
+        # 期間で絞って合計する集計をテーブルを読まずにインデックスだけで行う
+        db.Index('ix_leaderboard_daily_day_user', 'day', 'user_id', 'total_study_time', 'total_focus_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    total_study_time = db.Column(db.Integer, nullable=False, default=0)  # seconds
+    total_focus_time = db.Column(db.Integer, nullable=False, default=0)  # seconds
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LeaderboardDaily {self.user_id} {self.day}>'
+
+    @classmethod
+    def apply_delta(cls, user_id, day, study_delta=0, focus_delta=0):
+        _increment_totals(cls, {'user_id': user_id, 'day': day}, study_delta, focus_delta)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        日報から日別の集計を作り直す
+        """
+        from sqlalchemy import func, select
+
+        cls.query.delete()
+        days = select(
+            DailyReport.user_id,
+            DailyReport.date,
+            func.coalesce(DailyReport.total_study_time, 0),
+            func.coalesce(DailyReport.total_focus_time, 0)
+        )
+        db.session.execute(
+            cls.__table__.insert().from_select(['user_id', 'day', 'total_study_time', 'total_focus_time'], days)
+        )
+        db.session.commit()
+
+def rebuild_leaderboards():
+    """
+    apply_report_deltaを通さずに日報を書き込んだ後（サンプルデータの投入など）に、
+    ランキングの累計と日別の集計を日報から作り直す
+    """
+    LeaderboardTotal.rebuild()
+    LeaderboardDaily.rebuild()
+
+class FocusSeries(db.Model):
+    """
+    集中度検出の時系列（ユーザー・日付ごと）
+    サンプルは差分エンコードした時刻とuint8のスコアのバイナリで保持する
+    """
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='uq_focus_series_user_date'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    samples = db.Column(db.LargeBinary, nullable=False, default=b'')
+    sample_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FocusSeries {self.user_id} {self.date}>'
+
+    def to_list(self):
+        return samples_to_json(decode_samples(self.samples))
+
+    @classmethod
+    def append_samples(cls, user_id, samples):
+        """
+        (UNIX時刻, スコア)のサンプルを日付ごとの行に追記する
+        """
+        for date, date_samples in group_samples_by_date(samples).items():
+            chunk = encode_samples(date_samples)
+            for attempt in range(2):
+                series = cls.query.filter_by(user_id=user_id, date=date).with_for_update().first()
+                if series is None:
+                    series = cls(user_id=user_id, date=date, samples=b'', sample_count=0)
+                    db.session.add(series)
+                series.samples = (series.samples or b'') + chunk
+                series.sample_count = (series.sample_count or 0) + len(date_samples)
+                try:
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    # 別のワーカーが同時に行を作成した場合は追記し直す
+                    db.session.rollback()
+                    if attempt == 1:
+                        raise
 
 class DailyReportComment(db.Model):
+    # 日付ごとのコメント一覧（新しい順）をインデックス順に読む
+    __table_args__ = (
+        db.Index('ix_daily_report_comment_user_date', 'user_id', 'date', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     comment_id = db.Column(db.String(128), unique=True, nullable=False)
     user_id = db.Column(db.String(128), nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD format
+    date = db.Column(db.Date, nullable=False)
     comment_text = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -83,7 +313,7 @@ class DailyReportComment(db.Model):
             'id': self.id,
             'comment_id': self.comment_id,
             'user_id': self.user_id,
-            'date': self.date,
+            'date': self.date.isoformat() if self.date else None,
             'comment_text': self.comment_text,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -0,0 +1,49 @@
+from flask import g, jsonify, request
+from functools import wraps
+from src.services.token_verifier import token_verifier
+import os
+
+# 全てのAPIでFirebase IDトークンを必須にするか（テスト用に既定では無効）
+AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED', 'false').lower() == 'true'
+
+def _get_request_token():
+    """
+    Authorizationヘッダー（Bearer）からトークンを取り出す
+    ヘッダーを付けられないWebSocketの接続では ?access_token= も受け付ける
+    """
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() == 'bearer' and token.strip():
+        return token.strip()
+    return request.args.get('access_token')
+
+def authenticate_request():
+    """
+    トークンを検証してg.userに格納する。失敗した場合はエラーレスポンスを返す
+    """
+    token = _get_request_token()
+    if not token:
+        return jsonify({'error': 'Token is missing'}), 401
+
+    try:
+        g.user = token_verifier.verify(token)  # gオブジェクトにユーザー情報を格納
+    except Exception as e:
+        return jsonify({'error': 'Token is invalid', 'details': str(e)}), 401
+    return None
+
+def token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        error = authenticate_request()
+        if error is not None:
+            return error
+        return f(*args, **kwargs)
+    return decorated_function
+
+def require_auth_for_blueprint():
+    """
+    Blueprintのbefore_requestに登録する。AUTH_REQUIREDが有効な場合のみ全てのルートでトークンを検証する
+    """
+    if not AUTH_REQUIRED or request.method == 'OPTIONS':
+        return None
+    return authenticate_request()
@@ -1,15 +1,43 @@
-from flask import Blueprint, request, jsonify
-from src.services.concentration_analyzer import analyze_face_presence
-import boto3
+from flask import Blueprint, current_app, request, jsonify
+from src.services.concentration_analyzer import (
+    analyze_frame, decode_image_data, get_client_stats, get_detector_info, get_rekognition_client
+)
+from src.services.detection_pool import BATCH_MAX_FRAMES, DETECTION_WAIT_TIMEOUT, batch_executor, detection_pool
+from src.services.focus_series import focus_buffer
+from src.services.frame_cache import frame_cache
+from src.services.frame_preprocessor import preprocess_stats
+from src.services.session_store import create_session_store
+from src.models.user import FocusSeries, db
+from src.routes.auth import require_auth_for_blueprint
+from flask_sock import Sock
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import json
 import os
+import threading
+import time
 from botocore.exceptions import NoCredentialsError
-from datetime import datetime
 
 # Blueprintを作成
 concentration_bp = Blueprint('concentration', __name__)
+concentration_bp.before_request(require_auth_for_blueprint)
 
-# セッション管理用の辞書（本来はデータベースに保存すべき）
-sessions = {}
+# WebSocketストリーム（フレームが届かない状態がこの秒数続いたら切断）
+sock = Sock()
+STREAM_IDLE_TIMEOUT = int(os.environ.get('CONCENTRATION_STREAM_IDLE_TIMEOUT', 60))
+# 1つの接続がワーカーのスレッドを占有し続けるため、HTTP用のスレッドが残るようにプロセスあたりの同時接続数を制限する
+STREAM_MAX_CONNECTIONS = int(os.environ.get('CONCENTRATION_STREAM_MAX_CONNECTIONS', 4))
+# 上限を超えた接続を閉じる際のクローズコード（1013: Try Again Later）
+STREAM_OVERLOADED_CLOSE_CODE = 1013
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONNECTIONS)
+_stream_stats_lock = threading.Lock()
+_stream_stats = {'active': 0, 'rejected': 0}
+
+# バイナリで受け付けるフレームのContent-Typeと最大サイズ
+BINARY_FRAME_MIMETYPES = ('image/jpeg', 'image/png', 'application/octet-stream')
+FRAME_MAX_BYTES = int(os.environ.get('FRAME_MAX_BYTES', 5 * 1024 * 1024))
+
+# セッション管理用のストア（CONCENTRATION_SESSION_BACKENDで切り替え）
+sessions = create_session_store()
 
 @concentration_bp.route('/test-aws', methods=['GET'])
 def test_aws_connection():
@@ -26,11 +54,11 @@ def test_aws_connection():
         if access_key == 'YOUR_AWS_ACCESS_KEY_ID':
             return jsonify({'error': 'AWS認証情報を実際の値に設定してください'}), 400
         
-        rekognition = boto3.client(
-            'rekognition',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')
+        rekognition = get_rekognition_client(
+            access_key,
+            secret_key,
+            os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+            os.environ.get('REKOGNITION_ENDPOINT_URL') or None
         )
         
         # サービスのリストを取得して接続テスト
@@ -41,6 +69,22 @@ def test_aws_connection():
     except Exception as e:
         return jsonify({'error': f'AWS接続エラー: {str(e)}'}), 500
 
+@concentration_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    集中度検出のメトリクスを取得
+    """
+    return jsonify({
+        'detector': get_detector_info(),
+        'rekognition_client': get_client_stats(),
+        'sessions': sessions.stats(),
+        'frame_cache': frame_cache.stats(),
+        'preprocess': preprocess_stats.snapshot(),
+        'detection_pool': detection_pool.stats(),
+        'streams': _get_stream_stats(),
+        'focus_series': focus_buffer.stats()
+    })
+
 @concentration_bp.route('/session/start', methods=['POST'])
 def start_session():
     """
@@ -49,12 +93,7 @@ def start_session():
     data = request.get_json()
     user_id = data.get('userId', 'anonymous')
     
-    sessions[user_id] = {
-        'start_time': datetime.now(),
-        'total_detections': 0,
-        'present_detections': 0,
-        'last_detection': datetime.now()
-    }
+    sessions.start(user_id)
     
     return jsonify({'status': 'セッション開始'})
 
@@ -66,57 +105,348 @@ def end_session():
     data = request.get_json()
     user_id = data.get('userId', 'anonymous')
     
-    if user_id in sessions:
-        del sessions[user_id]
+    sessions.end(user_id)
+    frame_cache.discard(user_id)
+    _flush_focus_series(user_id, force=True)
+    detection_pool.discard(user_id)
     
     return jsonify({'status': 'セッション終了'})
 
+def _build_session_payload(session):
+    """
+    セッションから集中スコアと検出回数を組み立てる
+    """
+    # 集中スコアを計算（在席率）
+    focus_score = (session['present_detections'] / session['total_detections']) * 100 if session['total_detections'] > 0 else 0
+    
+    # 経過時間を計算
+    elapsed_time = time.time() - session['start_time']
+    
+    return {
+        'focusScore': round(focus_score, 1),
+        'elapsedTime': round(elapsed_time),
+        'totalDetections': session['total_detections'],
+        'presentDetections': session['present_detections']
+    }
+
+def _build_detection_payload(result, session):
+    """
+    検出結果とセッションから集中スコアのレスポンスを組み立てる
+    """
+    payload = {
+        'faceDetected': result['face_detected'],
+        'confidence': result['confidence']
+    }
+    payload.update(_build_session_payload(session))
+    payload['cached'] = result['cached']
+    return payload
+
+def _record_focus_sample(user_id, session):
+    """
+    集中スコアを時系列のバッファに追加する（匿名ユーザーは記録しない）
+    """
+    if user_id == 'anonymous' or not session['total_detections']:
+        return
+    focus_buffer.append(user_id, session['present_detections'] / session['total_detections'] * 100)
+
+def _flush_focus_series(user_id, force=False):
+    """
+    バッファした時系列が書き出し条件を満たしていればDBに追記する
+    """
+    _save_focus_series(user_id, focus_buffer.drain(user_id, force=force))
+
+def _sweep_focus_series(app):
+    """
+    見回りのスレッドから呼ばれる。次のリクエストが来ないユーザーや、
+    別のワーカーでセッションを終了したユーザーのバッファを書き出す
+    """
+    with app.app_context():
+        drained = focus_buffer.drain_idle(is_ended=lambda user_id: sessions.get(user_id) is None)
+        for user_id, samples in drained.items():
+            _save_focus_series(user_id, samples)
+
+@concentration_bp.before_request
+def _start_focus_sweeper():
+    """
+    見回りのスレッドを開始する（初回のリクエストのみ）。アプリの取得にはアプリケーションコンテキストが
+    必要なため、検出プールのスレッドではなくリクエストのスレッドで行う
+    """
+    focus_buffer.start_sweeper(_sweep_focus_series, current_app._get_current_object())
+
+def _save_focus_series(user_id, samples):
+    if not samples:
+        return
+    try:
+        FocusSeries.append_samples(user_id, samples)
+    except Exception as e:
+        db.session.rollback()
+        print(f'Error saving focus series: {e}')
+
+def _busy_response(user_id):
+    """
+    検出プールが飽和している場合のレスポンス
+    直近の検出結果があればそれを返し、なければ429を返す
+    """
+    latest = detection_pool.get_latest(user_id)
+    if latest is not None and latest[1] is not None:
+        payload = _build_detection_payload(*latest)
+        payload['stale'] = True
+        return jsonify(payload)
+
+    response = jsonify({'error': '検出処理が混み合っています。しばらくしてから再試行してください。'})
+    response.status_code = 429
+    response.headers['Retry-After'] = '2'
+    return response
+
+def _read_frame_from_request():
+    """
+    リクエストからフレームのバイト列とユーザーIDを取り出す
+    - image/jpeg等のバイナリ: ボディをそのまま使用（userIdはクエリまたはX-User-Idヘッダー）
+    - multipart/form-data: imageフィールドのファイル（userIdはフォーム）
+    - JSON: Base64データURLのimageフィールド（互換用）
+    戻り値: (image_bytes, user_id, error_response)
+    """
+    if request.content_length and request.content_length > FRAME_MAX_BYTES:
+        return None, None, (jsonify({'error': 'Image data too large'}), 413)
+
+    if request.mimetype in BINARY_FRAME_MIMETYPES:
+        image_bytes = request.get_data(cache=False)
+        user_id = request.args.get('userId') or request.headers.get('X-User-Id') or 'anonymous'
+    elif request.mimetype == 'multipart/form-data':
+        image_file = request.files.get('image')
+        image_bytes = image_file.read() if image_file else b''
+        user_id = request.form.get('userId') or request.args.get('userId') or 'anonymous'
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'image' not in data:
+            return None, None, (jsonify({'error': 'No image data provided'}), 400)
+        user_id = data.get('userId', 'anonymous')
+        try:
+            image_bytes = decode_image_data(data['image'])
+        except Exception:
+            return None, None, (jsonify({'error': 'Invalid image data'}), 400)
+
+    if not image_bytes:
+        return None, None, (jsonify({'error': 'No image data provided'}), 400)
+
+    return image_bytes, user_id, None
+
 @concentration_bp.route('/detect', methods=['POST'])
 def detect_face_endpoint():
     """
     顔検出と集中スコア計算API
+    JSON（Base64）に加えて、バイナリ・multipartでのフレーム送信に対応
     """
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
+        image_bytes, user_id, error_response = _read_frame_from_request()
+        if error_response:
+            return error_response
 
-        user_id = data.get('userId', 'anonymous')
-        face_detected, confidence, error = analyze_face_presence(data['image'])
-
-        if error:
-            return jsonify({'error': error}), 500
-
-        # セッションが存在しない場合は作成
-        if user_id not in sessions:
-            sessions[user_id] = {
-                'start_time': datetime.now(),
-                'total_detections': 0,
-                'present_detections': 0,
-                'last_detection': datetime.now()
-            }
-        
-        # 検出結果を記録
-        session = sessions[user_id]
-        session['total_detections'] += 1
-        session['last_detection'] = datetime.now()
-        
-        if face_detected:
-            session['present_detections'] += 1
-        
-        # 集中スコアを計算（在席率）
-        focus_score = (session['present_detections'] / session['total_detections']) * 100 if session['total_detections'] > 0 else 0
-        
-        # 経過時間を計算
-        elapsed_time = (datetime.now() - session['start_time']).total_seconds()
-        
-        return jsonify({
-            'faceDetected': face_detected,
-            'confidence': confidence,
-            'focusScore': round(focus_score, 1),
-            'elapsedTime': round(elapsed_time),
-            'totalDetections': session['total_detections'],
-            'presentDetections': session['present_detections']
-        })
+        def run_detection():
+            # 直前のフレームとほぼ同一ならキャッシュされた検出結果を再利用する
+            result = analyze_frame(image_bytes, session_key=user_id)
+            if result['error']:
+                return result, None
+            # 検出結果を記録（セッションが存在しない場合は作成される）
+            session = sessions.record_detection(user_id, result['face_detected'])
+            _record_focus_sample(user_id, session)
+            return result, session
+
+        # 検出はプールで実行する（同じユーザーの古い待機中フレームは新しいフレームに置き換わる）
+        future = detection_pool.submit(user_id, run_detection)
+        if future is None:
+            return _busy_response(user_id)
+        try:
+            result, session = future.result(timeout=DETECTION_WAIT_TIMEOUT)
+        except FutureTimeoutError:
+            return _busy_response(user_id)
+
+        if result['error']:
+            return jsonify({'error': result['error']}), 500
+
+        _flush_focus_series(user_id)
+
+        response = jsonify(_build_detection_payload(result, session))
+        # ステージごとの処理時間をブラウザの開発者ツールで確認できるようにする
+        response.headers['Server-Timing'] = ', '.join(
+            f'{stage};dur={elapsed:.2f}' for stage, elapsed in result['timings'].items()
+        )
+        return response
+    except Exception as e:
+        return jsonify({'error': f'サーバーエラー: {str(e)}'}), 500
+
+def _read_batch_frames_from_request():
+    """
+    バッチリクエストから(user_id, image_bytes or None, error or None)のリストを取り出す
+    - JSON: {"frames": [{"userId": ..., "image": Base64}, ...]}
+    - multipart: imageフィールドを複数、userIdフィールドをフレームごと（または1つで共通）
+    戻り値: (items, error_response)。リクエストの形式が不正な場合は400を返す
+    """
+    items = []
+    if request.mimetype == 'multipart/form-data':
+        files = request.files.getlist('image')
+        user_ids = request.form.getlist('userId')
+        for index, image_file in enumerate(files):
+            if len(user_ids) == len(files):
+                user_id = user_ids[index]
+            else:
+                user_id = user_ids[0] if user_ids else 'anonymous'
+            image_bytes = image_file.read()
+            items.append((user_id, image_bytes or None, None if image_bytes else 'No image data provided'))
+        return items, None
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('frames'), list):
+        return None, (jsonify({'error': 'frames must be a list'}), 400)
+    for frame in data['frames']:
+        if not isinstance(frame, dict) or not isinstance(frame.get('image'), str):
+            return None, (jsonify({'error': 'Each frame must be an object with a Base64 image string'}), 400)
+
+    for frame in data['frames']:
+        user_id = frame.get('userId', 'anonymous')
+        try:
+            image_bytes = decode_image_data(frame['image'])
+        except Exception:
+            items.append((user_id, None, 'Invalid image data'))
+            continue
+        # 空のフレームは/detectと同様に検出に回さない
+        items.append((user_id, image_bytes or None, None if image_bytes else 'No image data provided'))
+    return items, None
+
+@concentration_bp.route('/detect/batch', methods=['POST'])
+def detect_batch_endpoint():
+    """
+    複数フレーム（複数ユーザー可）をまとめて検出するAPI
+    フレームは並列に解析し、セッションの検出回数はユーザーごとに1回でまとめて加算する。
+    結果はリクエストと同じ順序で返し、失敗したフレームは個別にerrorを返す
+    """
+    try:
+        items, error_response = _read_batch_frames_from_request()
+        if error_response:
+            return error_response
+        if not items:
+            return jsonify({'error': 'No frames provided'}), 400
+        if len(items) > BATCH_MAX_FRAMES:
+            return jsonify({'error': f'Too many frames (max {BATCH_MAX_FRAMES})'}), 413
+
+        futures = [
+            batch_executor.submit(analyze_frame, image_bytes) if image_bytes is not None else None
+            for _, image_bytes, _ in items
+        ]
+
+        results = []
+        counts = {}
+        for (user_id, _, error), future in zip(items, futures):
+            if future is not None:
+                result = future.result()
+                error = result['error']
+            if error:
+                results.append({'userId': user_id, 'error': error})
+                continue
+
+            results.append({
+                'userId': user_id,
+                'faceDetected': result['face_detected'],
+                'confidence': result['confidence']
+            })
+            total, present = counts.get(user_id, (0, 0))
+            counts[user_id] = (total + 1, present + (1 if result['face_detected'] else 0))
+
+        # ユーザーごとに検出回数をまとめて記録する
+        session_payloads = {}
+        for user_id, (total, present) in counts.items():
+            session = sessions.record_detections(user_id, total, present)
+            session_payloads[user_id] = _build_session_payload(session)
+            _record_focus_sample(user_id, session)
+            _flush_focus_series(user_id)
+
+        for item in results:
+            if 'error' not in item:
+                item.update(session_payloads[item['userId']])
+
+        return jsonify({'results': results})
     except Exception as e:
-        return jsonify({'error': f'サーバーエラー: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'サーバーエラー: {str(e)}'}), 500
+
+def _get_stream_stats():
+    with _stream_stats_lock:
+        return dict(_stream_stats, max_connections=STREAM_MAX_CONNECTIONS)
+
+def _update_stream_stats(key, delta):
+    with _stream_stats_lock:
+        _stream_stats[key] += delta
+
+@sock.route('/stream', bp=concentration_bp)
+def concentration_stream(ws):
+    """
+    WebSocketによる集中度検出ストリーム
+    クライアントはフレーム（JPEGのバイナリ、またはimageを含むJSON）を送り続け、
+    サーバーはフレームごとに集中スコアを返す。
+    同時接続数が上限に達している場合は1013で切断する（クライアントはPOSTの/detectに切り替える）
+    """
+    if not _stream_slots.acquire(blocking=False):
+        _update_stream_stats('rejected', 1)
+        ws.close(reason=STREAM_OVERLOADED_CLOSE_CODE, message='Too many streams')
+        return
+
+    _update_stream_stats('active', 1)
+    try:
+        _run_concentration_stream(ws)
+    finally:
+        _update_stream_stats('active', -1)
+        _stream_slots.release()
+
+def _run_concentration_stream(ws):
+    """
+    ストリームの本体。セッションは接続中このハンドラ内に保持し、共有ストアへの問い合わせは行わない
+    """
+    user_id = request.args.get('userId', 'anonymous')
+    session = {
+        'start_time': time.time(),
+        'total_detections': 0,
+        'present_detections': 0
+    }
+
+    try:
+        while True:
+            message = ws.receive(timeout=STREAM_IDLE_TIMEOUT)
+            if message is None:
+                # 一定時間フレームが届かなければ切断する
+                break
+
+            if isinstance(message, str):
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    ws.send(json.dumps({'error': 'Invalid message'}))
+                    continue
+                if not isinstance(data, dict):
+                    ws.send(json.dumps({'error': 'Invalid message'}))
+                    continue
+                if data.get('type') == 'end':
+                    break
+                if 'image' not in data:
+                    continue
+                try:
+                    image_bytes = decode_image_data(data['image'])
+                except Exception:
+                    ws.send(json.dumps({'error': 'Invalid image data'}))
+                    continue
+            else:
+                image_bytes = message
+
+            result = analyze_frame(image_bytes, session_key=user_id)
+            if result['error']:
+                ws.send(json.dumps({'error': result['error']}, ensure_ascii=False))
+                continue
+
+            session['total_detections'] += 1
+            if result['face_detected']:
+                session['present_detections'] += 1
+            _record_focus_sample(user_id, session)
+            _flush_focus_series(user_id)
+
+            ws.send(json.dumps(_build_detection_payload(result, session)))
+    finally:
+        frame_cache.discard(user_id)
+        _flush_focus_series(user_id, force=True)
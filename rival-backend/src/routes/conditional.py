@@ -0,0 +1,44 @@
+from flask import make_response, request
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+from src.models.user import db
+import hashlib
+import json
+
+def version_of(model, *criteria):
+    """
+    条件に一致する行の (件数, 最終更新日時) を返すクエリ。行の追加・更新・削除で値が変わる
+    """
+    return select(func.count(model.id), func.max(model.updated_at)).where(*criteria)
+
+def conditional_response(build, *sources):
+    """
+    sources（version_of のクエリ）から ETag と Last-Modified を作り、
+    If-None-Match / If-Modified-Since が一致すれば本文を作らずに304を返す
+    一致しなければ build() のレスポンスに検証用のヘッダーを付けて返す
+    """
+    versions = [db.session.execute(source).one() for source in sources]
+    if not any(count for count, _ in versions):
+        # 対象がない（404など）場合は検証しない
+        return build()
+
+    last_modified = max((updated for _, updated in versions if updated), default=None)
+    # 同じデータでもクエリ文字列（fields, limit, cursor など）で本文が変わるためURLも含める
+    key = json.dumps([
+        request.full_path,
+        [[count, updated.isoformat() if updated else None] for count, updated in versions]
+    ])
+    etag = hashlib.sha1(key.encode()).hexdigest()
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(microsecond=0)
+    # ブラウザには毎回再検証させる（変更がなければ304で本文を送らない）
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,90 +1,180 @@
-from flask import Blueprint, jsonify, request
-from src.models.curriculum import Curriculum, CurriculumProgress, db
-import google.generativeai as genai
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from src.models.curriculum import Curriculum, CurriculumDay, CurriculumJob, CurriculumJobDay, CurriculumProgress, db
+from src.routes.auth import require_auth_for_blueprint
+from src.routes.conditional import conditional_response, version_of
+from src.routes.pagination import page_response, paginate, parse_fields, project
+from src.services.json_provider import supports_raw_json
+from src.services.curriculum_cache import curriculum_response_cache
+from src.services.curriculum_generator import check_configuration
+from src.services.curriculum_jobs import CURRICULUM_JOB_TIMEOUT, curriculum_job_pool
+from sqlalchemy.orm import defer
+import os
+import time
 import uuid
 import json
-import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 curriculum_bp = Blueprint('curriculum', __name__)
+curriculum_bp.before_request(require_auth_for_blueprint)
+
+# Gemini APIキーを確認する（GEMINI_STUB=true の場合は不要）
+check_configuration()
+
+# ジョブの進捗をストリーミングで返す際にDBを確認する間隔（秒）
+CURRICULUM_STREAM_POLL_INTERVAL = float(os.environ.get('CURRICULUM_STREAM_POLL_INTERVAL', 0.5))
 
-# Gemini APIキーを環境変数から読み込む
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
-genai.configure(api_key=GEMINI_API_KEY)
-
-def generate_curriculum_from_gemini(goal, duration_days):
-    prompt = f"""あなたはプロの家庭教師です。以下の目標と期間に基づいて、詳細な学習カリキュラムをJSON形式で生成してください。
-
-    **目標:** {goal}
-    **期間:** {duration_days}日
-
-    **JSON形式の仕様:**
-    {{
-      "curriculum_title": "(カリキュラムのタイトル)",
-      "overview": "(カリキュラム全体の概要)",
-      "daily_plan": [
-        {{
-          "day": (日数),
-          "title": "(その日の学習テーマ)",
-          "objectives": ["(箇条書きの学習目標1)", "(箇条書きの学習目標2)"],
-          "topics": ["(学習トピック1)", "(学習トピック2)"],
-          "activities": [
-            {{
-              "title": "(具体的な活動タイトル)",
-              "description": "(活動内容の詳細)",
-              "duration_minutes": (活動時間（分）)
-            }}
-          ],
-          "resources": ["(参考リソースのURLや書籍名など)"],
-          "assessment": "(その日の理解度を確認する方法)",
-          "homework": "(宿題や課題)"
-        }}
-      ],
-      "milestones": [
-        {{
-          "day": (マイルストーン達成日),
-          "title": "(マイルストーンのタイトル)",
-          "description": "(マイルストーン達成の具体的な内容)"
-        }}
-      ]
-    }}
+def _apply_generated_curriculum(curriculum, goal, duration_days, curriculum_data):
     """
+    生成したカリキュラムの内容を保存し、日ごとの進捗を作り直す
+    """
+    curriculum.title = curriculum_data.get('curriculum_title', f'{goal}の学習カリキュラム')
+    curriculum.goal = goal
+    curriculum.duration_days = duration_days
+    curriculum.overview = curriculum_data.get('overview', '')
+    curriculum.set_plan(curriculum_data)
 
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    response = model.generate_content(prompt)
-    
+    CurriculumProgress.query.filter_by(curriculum_id=curriculum.curriculum_id).delete()
+    CurriculumProgress.bulk_insert_days(curriculum.curriculum_id, curriculum.user_id, duration_days)
+
+def _run_curriculum_job(app, job_id, use_cache=True):
+    """
+    ジョブ用のスレッドでGeminiを呼び出し（同じ目標・日数の生成結果があれば再利用）、結果をカリキュラムとして保存する
+    """
+    with app.app_context():
+        job = CurriculumJob.query.filter_by(job_id=job_id).first()
+        if job is None:
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        def save_day(plan):
+            # 届いた日をすぐに保存し、/api/curriculum-jobs/<job_id>/stream から読めるようにする
+            try:
+                with db.session.begin_nested():
+                    db.session.add(CurriculumJobDay(
+                        job_id=job_id,
+                        day=int(plan.get('day')),
+                        plan_data=json.dumps(plan, ensure_ascii=False)
+                    ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Error saving generated day for job {job_id}: {e}')
+
+        try:
+            curriculum_data = curriculum_response_cache.get_or_generate(
+                job.goal, job.duration_days, use_cache=use_cache, on_day=save_day
+            )
+
+            if job.kind == 'regenerate':
+                curriculum = Curriculum.query.filter_by(curriculum_id=job.curriculum_id).first()
+                if curriculum is None:
+                    raise Exception('Curriculum was deleted before regeneration finished')
+            else:
+                curriculum = Curriculum(
+                    curriculum_id=str(uuid.uuid4()),
+                    user_id=job.user_id,
+                    status='active'
+                )
+                db.session.add(curriculum)
+            _apply_generated_curriculum(curriculum, job.goal, job.duration_days, curriculum_data)
+
+            job.curriculum_id = curriculum.curriculum_id
+            job.status = 'succeeded'
+            job.finished_at = datetime.utcnow()
+            CurriculumJobDay.query.filter_by(job_id=job_id).delete()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = CurriculumJob.query.filter_by(job_id=job_id).first()
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            CurriculumJobDay.query.filter_by(job_id=job_id).delete()
+            db.session.commit()
+            raise
+
+def _submit_curriculum_job(user_id, goal, duration_days, kind='create', curriculum_id=None, use_cache=True):
+    """
+    ジョブを登録してプールに投入し、202（プールが飽和している場合は429）を返す
+    """
+    job = CurriculumJob(
+        job_id=str(uuid.uuid4()),
+        user_id=user_id,
+        curriculum_id=curriculum_id,
+        kind=kind,
+        goal=goal,
+        duration_days=duration_days,
+        status='queued'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if not curriculum_job_pool.submit(
+            _run_curriculum_job, current_app._get_current_object(), job.job_id, use_cache
+    ):
+        job.status = 'failed'
+        job.error = 'Too many curriculum generation jobs'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        response = jsonify({'error': 'Too many curriculum generation jobs, please retry later', 'job': job.to_dict()})
+        response.status_code = 429
+        response.headers['Retry-After'] = '30'
+        return response
+
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'{request.script_root}/api/curriculum-jobs/{job.job_id}'
+    return response
+
+def _curriculum_page(query, order_columns, descending):
+    """
+    カリキュラムの一覧を1ページ分返す。curriculum_data は読み込まない
+    """
     try:
-        response_text = response.text
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        
-        if json_start == -1 or json_end == 0:
-            raise ValueError("No JSON object found in the response.")
-            
-        json_string = response_text[json_start:json_end]
-        return json.loads(json_string)
-    except (json.JSONDecodeError, ValueError) as e:
-        raise Exception(f"Failed to parse curriculum from Gemini response: {e}, response: {response.text}")
+        fields = parse_fields(Curriculum, excluded=('curriculum_data',))
+        if fields is None:
+            query = query.options(defer(Curriculum.curriculum_data))
+        curriculums, next_cursor = paginate(query, Curriculum, order_columns, descending=descending, fields=fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return page_response([
+        project(curriculum, fields) if fields else curriculum.to_summary_dict() for curriculum in curriculums
+    ], next_cursor)
 
 @curriculum_bp.route('/curriculums', methods=['GET'])
 def get_curriculums():
-    """全てのカリキュラムを取得"""
-    curriculums = Curriculum.query.all()
-    return jsonify([curriculum.to_dict() for curriculum in curriculums])
+    """全てのカリキュラムを取得（?limit= ?cursor= ?fields=）"""
+    return _curriculum_page(Curriculum.query, [Curriculum.id], descending=False)
 
 @curriculum_bp.route('/users/<string:user_id>/curriculums', methods=['GET'])
 def get_user_curriculums(user_id):
     """特定ユーザーのカリキュラムを取得"""
-    curriculums = Curriculum.query.filter_by(user_id=user_id).order_by(Curriculum.created_at.desc()).all()
-    return jsonify([curriculum.to_dict() for curriculum in curriculums])
+    # 一覧には日ごとの計画を含めない（詳細は /curriculums/<id>、1日分は /curriculums/<id>/days/<day>）
+    return conditional_response(
+        lambda: _curriculum_page(
+            Curriculum.query.filter_by(user_id=user_id), [Curriculum.created_at, Curriculum.id], descending=True
+        ),
+        version_of(Curriculum, Curriculum.user_id == user_id)
+    )
 
 @curriculum_bp.route('/curriculums/<string:curriculum_id>', methods=['GET'])
 def get_curriculum(curriculum_id):
     """特定のカリキュラムを取得"""
-    curriculum = Curriculum.query.filter_by(curriculum_id=curriculum_id).first_or_404()
-    return jsonify(curriculum.to_dict())
+    def build():
+        curriculum = Curriculum.query.filter_by(curriculum_id=curriculum_id).first_or_404()
+        return jsonify(curriculum.to_dict(raw_json=supports_raw_json()))
+    return conditional_response(build, version_of(Curriculum, Curriculum.curriculum_id == curriculum_id))
+
+@curriculum_bp.route('/curriculums/<string:curriculum_id>/days/<int:day>', methods=['GET'])
+def get_curriculum_day(curriculum_id, day):
+    """カリキュラムの特定の日の計画を取得"""
+    def build():
+        curriculum_day = CurriculumDay.query.filter_by(curriculum_id=curriculum_id, day=day).first_or_404()
+        return jsonify(curriculum_day.to_dict(raw_json=supports_raw_json()))
+    # 日ごとの計画は再生成・更新でのみ変わり、そのときカリキュラムの updated_at も更新される
+    return conditional_response(build, version_of(Curriculum, Curriculum.curriculum_id == curriculum_id))
 
 @curriculum_bp.route('/users/<string:user_id>/curriculums', methods=['POST'])
 def create_curriculum(user_id):
@@ -97,40 +187,11 @@ def create_curriculum(user_id):
     goal = data['goal']
     duration_days = data.get('duration_days', 30)
     
-    try:
-        curriculum_data = generate_curriculum_from_gemini(goal, duration_days)
-        
-        curriculum = Curriculum(
-            curriculum_id=str(uuid.uuid4()),
-            user_id=user_id,
-            title=curriculum_data.get('curriculum_title', f'{goal}の学習カリキュラム'),
-            goal=goal,
-            duration_days=duration_days,
-            overview=curriculum_data.get('overview', ''),
-            curriculum_data=json.dumps(curriculum_data, ensure_ascii=False),
-            status='active'
-        )
-        
-        db.session.add(curriculum)
-        db.session.commit()
-        
-        for day in range(1, duration_days + 1):
-            progress = CurriculumProgress(
-                progress_id=str(uuid.uuid4()),
-                curriculum_id=curriculum.curriculum_id,
-                user_id=user_id,
-                day=day,
-                completed=False
-            )
-            db.session.add(progress)
-        
-        db.session.commit()
-        
-        return jsonify(curriculum.to_dict()), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Failed to generate curriculum: {str(e)}'}), 500
+    # use_cache: falseで同じ目標・日数の生成結果を再利用せずに生成し直す
+    use_cache = data.get('use_cache', True) is not False
+    
+    # 生成には時間がかかるため、ジョブとして受け付けて /api/curriculum-jobs/<job_id> で状態を返す
+    return _submit_curriculum_job(user_id, goal, duration_days, use_cache=use_cache)
 
 @curriculum_bp.route('/curriculums/<string:curriculum_id>', methods=['PUT'])
 def update_curriculum(curriculum_id):
@@ -143,10 +204,10 @@ def update_curriculum(curriculum_id):
     curriculum.status = data.get('status', curriculum.status)
     
     if 'curriculum_data' in data:
-        curriculum.curriculum_data = json.dumps(data['curriculum_data'], ensure_ascii=False)
+        curriculum.set_plan(data['curriculum_data'])
     
     db.session.commit()
-    return jsonify(curriculum.to_dict())
+    return jsonify(curriculum.to_dict(raw_json=supports_raw_json()))
 
 @curriculum_bp.route('/curriculums/<string:curriculum_id>', methods=['DELETE'])
 def delete_curriculum(curriculum_id):
@@ -154,6 +215,7 @@ def delete_curriculum(curriculum_id):
     curriculum = Curriculum.query.filter_by(curriculum_id=curriculum_id).first_or_404()
     
     CurriculumProgress.query.filter_by(curriculum_id=curriculum_id).delete()
+    CurriculumDay.query.filter_by(curriculum_id=curriculum_id).delete()
     
     db.session.delete(curriculum)
     db.session.commit()
@@ -162,8 +224,10 @@ def delete_curriculum(curriculum_id):
 @curriculum_bp.route('/curriculums/<string:curriculum_id>/progress', methods=['GET'])
 def get_curriculum_progress(curriculum_id):
     """カリキュラムの進捗を取得"""
-    progress_list = CurriculumProgress.query.filter_by(curriculum_id=curriculum_id).order_by(CurriculumProgress.day).all()
-    return jsonify([progress.to_dict() for progress in progress_list])
+    def build():
+        progress_list = CurriculumProgress.query.filter_by(curriculum_id=curriculum_id).order_by(CurriculumProgress.day).all()
+        return jsonify([progress.to_dict() for progress in progress_list])
+    return conditional_response(build, version_of(CurriculumProgress, CurriculumProgress.curriculum_id == curriculum_id))
 
 @curriculum_bp.route('/curriculums/<string:curriculum_id>/progress/<int:day>', methods=['GET'])
 def get_day_progress(curriculum_id, day):
@@ -192,11 +256,15 @@ def update_day_progress(curriculum_id, day):
 @curriculum_bp.route('/users/<string:user_id>/curriculums/<string:curriculum_id>/progress', methods=['GET'])
 def get_user_curriculum_progress(user_id, curriculum_id):
     """特定ユーザーの特定カリキュラムの進捗を取得"""
-    progress_list = CurriculumProgress.query.filter_by(
-        curriculum_id=curriculum_id, 
-        user_id=user_id
-    ).order_by(CurriculumProgress.day).all()
-    return jsonify([progress.to_dict() for progress in progress_list])
+    def build():
+        progress_list = CurriculumProgress.query.filter_by(
+            curriculum_id=curriculum_id, 
+            user_id=user_id
+        ).order_by(CurriculumProgress.day).all()
+        return jsonify([progress.to_dict() for progress in progress_list])
+    return conditional_response(build, version_of(
+        CurriculumProgress, CurriculumProgress.curriculum_id == curriculum_id, CurriculumProgress.user_id == user_id
+    ))
 
 @curriculum_bp.route('/curriculums/<string:curriculum_id>/regenerate', methods=['POST'])
 def regenerate_curriculum(curriculum_id):
@@ -207,57 +275,137 @@ def regenerate_curriculum(curriculum_id):
     goal = data.get('goal', curriculum.goal)
     duration_days = data.get('duration_days', curriculum.duration_days)
     
-    try:
-        curriculum_data = generate_curriculum_from_gemini(goal, duration_days)
-        
-        curriculum.title = curriculum_data.get('curriculum_title', f'{goal}の学習カリキュラム')
-        curriculum.goal = goal
-        curriculum.duration_days = duration_days
-        curriculum.overview = curriculum_data.get('overview', '')
-        curriculum.curriculum_data = json.dumps(curriculum_data, ensure_ascii=False)
-        
-        CurriculumProgress.query.filter_by(curriculum_id=curriculum_id).delete()
-        
-        for day in range(1, duration_days + 1):
-            progress = CurriculumProgress(
-                progress_id=str(uuid.uuid4()),
-                curriculum_id=curriculum.curriculum_id,
-                user_id=curriculum.user_id,
-                day=day,
-                completed=False
-            )
-            db.session.add(progress)
-        
+    # 再生成は別の内容を求めているため、キャッシュを読まずに生成する（use_cache: trueで再利用）
+    use_cache = data.get('use_cache', False) is True
+    
+    return _submit_curriculum_job(
+        curriculum.user_id, goal, duration_days, kind='regenerate', curriculum_id=curriculum_id,
+        use_cache=use_cache
+    )
+
+def _expire_stale_job(job):
+    """
+    CURRICULUM_JOB_TIMEOUT を過ぎても完了していないジョブを失敗にする（実行中にワーカーが再起動した場合など）
+    """
+    if job.status in ('queued', 'running') and job.created_at \
+            and datetime.utcnow() - job.created_at > timedelta(seconds=CURRICULUM_JOB_TIMEOUT):
+        job.status = 'failed'
+        job.error = 'Curriculum generation timed out'
+        job.finished_at = datetime.utcnow()
         db.session.commit()
-        
-        return jsonify(curriculum.to_dict())
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Failed to regenerate curriculum: {str(e)}'}), 500
 
-@curriculum_bp.route('/curriculums/<string:curriculum_id>/stats', methods=['GET'])
-def get_curriculum_stats(curriculum_id):
-    """カリキュラムの統計情報を取得"""
-    curriculum = Curriculum.query.filter_by(curriculum_id=curriculum_id).first_or_404()
-    progress_list = CurriculumProgress.query.filter_by(curriculum_id=curriculum_id).all()
-    
-    total_days = len(progress_list)
-    completed_days = len([p for p in progress_list if p.completed])
+def _job_with_curriculum(job):
+    result = job.to_dict()
+    if job.status == 'succeeded' and job.curriculum_id:
+        curriculum = Curriculum.query.filter_by(curriculum_id=job.curriculum_id).first()
+        result['curriculum'] = curriculum.to_dict(raw_json=supports_raw_json()) if curriculum else None
+    elif job.status in ('queued', 'running'):
+        result['days_generated'] = CurriculumJobDay.query.filter_by(job_id=job.job_id).count()
+    return result
+
+@curriculum_bp.route('/curriculum-jobs/<string:job_id>', methods=['GET'])
+def get_curriculum_job(job_id):
+    """カリキュラム生成ジョブの状態を取得（完了していれば生成されたカリキュラムを含む）"""
+    job = CurriculumJob.query.filter_by(job_id=job_id).first_or_404()
+    _expire_stale_job(job)
+    return jsonify(_job_with_curriculum(job))
+
+@curriculum_bp.route('/curriculum-jobs/<string:job_id>/stream', methods=['GET'])
+def stream_curriculum_job(job_id):
+    """
+    カリキュラム生成の進捗をNDJSONで返す
+    生成された日ごとに {"type": "day", "day": n, "plan": {...}} を返し、
+    最後に {"type": "done"}（カリキュラムを含む）または {"type": "failed"} を返す
+    """
+    CurriculumJob.query.filter_by(job_id=job_id).first_or_404()
+
+    def generate():
+        sent_day = 0
+        sent_status = None
+        while True:
+            # 他のスレッド・プロセスの書き込みを読むため、前回の読み取りのトランザクションを終える
+            db.session.rollback()
+            job = CurriculumJob.query.filter_by(job_id=job_id).first()
+            if job is None:
+                yield json.dumps({'type': 'failed', 'error': 'Job was deleted'}) + '\n'
+                return
+            _expire_stale_job(job)
+
+            if job.status == 'succeeded':
+                days = CurriculumDay.query.filter(
+                    CurriculumDay.curriculum_id == job.curriculum_id, CurriculumDay.day > sent_day
+                ).order_by(CurriculumDay.day).all()
+                for day in days:
+                    yield json.dumps({'type': 'day', 'day': day.day, 'plan': day.to_dict()}, ensure_ascii=False) + '\n'
+                done = _job_with_curriculum(job)
+                done['type'] = 'done'
+                yield json.dumps(done, ensure_ascii=False) + '\n'
+                return
+            if job.status == 'failed':
+                yield json.dumps({'type': 'failed', 'error': job.error}, ensure_ascii=False) + '\n'
+                return
+
+            days = CurriculumJobDay.query.filter(
+                CurriculumJobDay.job_id == job_id, CurriculumJobDay.day > sent_day
+            ).order_by(CurriculumJobDay.day).all()
+            for day in days:
+                event = day.to_dict()
+                event['type'] = 'day'
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+                sent_day = day.day
+            if job.status != sent_status:
+                yield json.dumps({'type': 'status', 'status': job.status}) + '\n'
+                sent_status = job.status
+            time.sleep(CURRICULUM_STREAM_POLL_INTERVAL)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@curriculum_bp.route('/curriculum-jobs/metrics', methods=['GET'])
+def get_curriculum_job_metrics():
+    """カリキュラム生成ジョブのプールと生成結果のキャッシュの状態を取得"""
+    metrics = curriculum_job_pool.stats()
+    metrics['response_cache'] = curriculum_response_cache.stats()
+    return jsonify(metrics)
+
+def _stats_to_dict(row):
+    curriculum_id, status, created_at, total_days, completed_days, average_score = row
     completion_rate = (completed_days / total_days * 100) if total_days > 0 else 0
-    
-    scores = [p.score for p in progress_list if p.score is not None]
-    average_score = sum(scores) / len(scores) if scores else 0
-    
-    stats = {
+    return {
         'curriculum_id': curriculum_id,
         'total_days': total_days,
         'completed_days': completed_days,
         'remaining_days': total_days - completed_days,
         'completion_rate': round(completion_rate, 2),
-        'average_score': round(average_score, 2),
-        'status': curriculum.status,
-        'created_at': curriculum.created_at.isoformat() if curriculum.created_at else None
+        'average_score': round(average_score or 0, 2),
+        'status': status,
+        'created_at': created_at.isoformat() if created_at else None
     }
-    
-    return jsonify(stats)
\ No newline at end of file
+
+@curriculum_bp.route('/curriculums/<string:curriculum_id>/stats', methods=['GET'])
+def get_curriculum_stats(curriculum_id):
+    """カリキュラムの統計情報を取得（進捗の集計はDBで1回のクエリで行う）"""
+    def build():
+        rows = CurriculumProgress.summarize(Curriculum.curriculum_id == curriculum_id)
+        if not rows:
+            return jsonify({'error': 'Curriculum not found'}), 404
+        return jsonify(_stats_to_dict(rows[0]))
+    return conditional_response(
+        build,
+        version_of(Curriculum, Curriculum.curriculum_id == curriculum_id),
+        version_of(CurriculumProgress, CurriculumProgress.curriculum_id == curriculum_id)
+    )
+
+@curriculum_bp.route('/users/<string:user_id>/curriculums/stats', methods=['GET'])
+def get_user_curriculum_stats(user_id):
+    """ユーザーの全カリキュラムの統計情報を1回で取得（作成日の新しい順）"""
+    def build():
+        rows = CurriculumProgress.summarize(Curriculum.user_id == user_id)
+        return jsonify([_stats_to_dict(row) for row in rows])
+    return conditional_response(
+        build,
+        version_of(Curriculum, Curriculum.user_id == user_id),
+        version_of(CurriculumProgress, CurriculumProgress.user_id == user_id)
+    )
\ No newline at end of file
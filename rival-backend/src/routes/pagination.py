@@ -0,0 +1,109 @@
+from datetime import date, datetime
+from flask import jsonify, request
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+import base64
+import json
+
+# 一覧APIの1ページの件数（?limit= で変更できる。limitもcursorも指定しない場合は従来どおり全件を返す）
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def _to_json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _from_json_value(value, column):
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def encode_cursor(item, order_columns):
+    values = [_to_json_value(getattr(item, column.key)) for column in order_columns]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, order_columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(order_columns):
+            raise ValueError
+        return [_from_json_value(value, column) for value, column in zip(values, order_columns)]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def parse_fields(model, excluded=()):
+    """
+    ?fields=a,b,c を列名のリストにする（指定がなければNone）。重い列（excluded）は指定できない
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    allowed = {column.key for column in model.__table__.columns} - set(excluded)
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown or not requested:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}" if unknown else 'No fields specified')
+    return requested
+
+def project(item, fields):
+    return {field: _to_json_value(getattr(item, field)) for field in fields}
+
+def paginate(query, model, order_columns, descending=False, fields=None):
+    """
+    キーセット（order_columnsの値）でページ分割した一覧を返す
+    ?limit=件数（cursorのみ指定した場合は100、最大500）?cursor=前のページの X-Next-Cursor
+    limitもcursorも指定しない場合は分割せずに全件を返す（ページ分割に対応していないクライアント向け）
+    fieldsを指定した場合はその列だけをSELECTする（戻り値の項目のシリアライズは呼び出し側で行う）
+    戻り値: (items, next_cursor)。不正な引数はValueError
+    """
+    cursor = request.args.get('cursor')
+    if 'limit' in request.args:
+        limit = request.args.get('limit', type=int)
+        if limit is None or limit < 1:
+            raise ValueError('Invalid limit')
+        limit = min(limit, MAX_PAGE_SIZE)
+    elif cursor:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        limit = None
+
+    if cursor:
+        values = decode_cursor(cursor, order_columns)
+        # (a, b) < (x, y) を a < x OR (a = x AND b < y) の形で書く（インデックスを使える）
+        conditions = []
+        for index, (column, value) in enumerate(zip(order_columns, values)):
+            compare = column < value if descending else column > value
+            equals = [c == v for c, v in zip(order_columns[:index], values[:index])]
+            conditions.append(and_(*equals, compare))
+        query = query.filter(or_(*conditions))
+
+    ordering = [column.desc() if descending else column.asc() for column in order_columns]
+    query = query.order_by(*ordering)
+    if fields is not None:
+        columns = {column.key for column in order_columns} | set(fields)
+        query = query.options(load_only(*[getattr(model, key) for key in columns]))
+
+    if limit is None:
+        return query.all(), None
+
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1], order_columns)
+    return items, next_cursor
+
+def page_response(data, next_cursor):
+    """
+    一覧は従来どおり配列で返し、次のページがあればカーソルを X-Next-Cursor ヘッダーで返す
+    """
+    response = jsonify(data)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -1,43 +1,35 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import User, DailyReport, DailyReportComment, db
+from flask import Blueprint, jsonify, make_response, request
+from src.models.user import (
+    User, DailyReport, DailyReportComment, FocusSeries, LeaderboardDaily, LeaderboardTotal, db,
+    apply_report_delta, parse_report_date
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from src.services.ranking_cache import ranking_cache
 import uuid
 import json
 import random
 
-from functools import wraps
-from firebase_admin import auth
-from flask import request, g
-
-def token_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(' ')[1]
-
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-
-        try:
-            decoded_token = auth.verify_id_token(token)
-            g.user = decoded_token # gオブジェクトにユーザー情報を格納
-        except Exception as e:
-            return jsonify({'error': 'Token is invalid', 'details': str(e)}), 401
-
-        return f(*args, **kwargs)
-    return decorated_function
-    
+from src.routes.auth import require_auth_for_blueprint
+from src.routes.conditional import conditional_response, version_of
+from src.routes.pagination import page_response, paginate, parse_fields, project
+from src.services.json_provider import supports_raw_json
 
 user_bp = Blueprint('user', __name__)
+user_bp.before_request(require_auth_for_blueprint)
 
 # User endpoints
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    # ?limit= ?cursor=（次のページは X-Next-Cursor）?fields=user_id,name のように列を絞れる
+    try:
+        fields = parse_fields(User)
+        users, next_cursor = paginate(User.query, User, [User.id], fields=fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return page_response([project(user, fields) if fields else user.to_dict() for user in users], next_cursor)
 
 @user_bp.route('/users', methods=['POST'])
-# @token_required  # テスト用に一時的に無効化
 def create_user():
     data = request.json or {}
     user_id = data.get('user_id')
@@ -66,17 +58,17 @@ def create_user():
         email=email
     )
     db.session.add(new_user)
+    LeaderboardTotal.ensure_user(user_id)
     db.session.commit()
+    ranking_cache.invalidate()
     return jsonify(new_user.to_dict()), 201
 
 @user_bp.route('/users/<string:user_id>', methods=['GET'])
-# @token_required  # テスト用に一時的に無効化
 def get_user(user_id):
     user = User.query.filter_by(user_id=user_id).first_or_404()
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<string:user_id>', methods=['PUT'])
-# @token_required  # テスト用に一時的に無効化
 def update_user(user_id):
     try:
         user = User.query.filter_by(user_id=user_id).first_or_404()
@@ -100,7 +92,11 @@ def update_user(user_id):
         if 'focus_threshold' in data:
             user.focus_threshold = data['focus_threshold']
         
+        if 'name' in data:
+            # ランキングに表示する名前が変わるため、他のワーカーのキャッシュも作り直されるよう版を進める
+            LeaderboardTotal.touch(user_id)
         db.session.commit()
+        ranking_cache.invalidate()
         print(f'User updated successfully: {user.to_dict()}')
         return jsonify(user.to_dict())
     except Exception as e:
@@ -111,40 +107,102 @@ def update_user(user_id):
 @user_bp.route('/users/<string:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user = User.query.filter_by(user_id=user_id).first_or_404()
+    LeaderboardTotal.query.filter_by(user_id=user_id).delete()
+    LeaderboardDaily.query.filter_by(user_id=user_id).delete()
     db.session.delete(user)
     db.session.commit()
+    ranking_cache.invalidate()
     return '', 204
 
 # Daily Report endpoints
 @user_bp.route('/users/<string:user_id>/reports', methods=['GET'])
 def get_user_reports(user_id):
-    reports = DailyReport.query.filter_by(user_id=user_id).order_by(DailyReport.date.desc()).all()
-    return jsonify([report.to_dict() for report in reports])
+    # 日報（時系列を含める場合はFocusSeriesも）が前回から変わっていなければ304を返す
+    sources = [version_of(DailyReport, DailyReport.user_id == user_id)]
+    if _include_time_series():
+        sources.append(version_of(FocusSeries, FocusSeries.user_id == user_id))
+    return conditional_response(lambda: _user_reports_response(user_id), *sources)
+
+def _include_time_series():
+    # 従来どおり時系列を含める。不要なクライアントは ?exclude=time_series で読み込みとデコードを省略できる
+    return 'time_series' not in request.args.get('exclude', '').split(',')
+
+def _user_reports_response(user_id):
+    # ?from=YYYY-MM-DD ?to=YYYY-MM-DD で期間を絞り、?limit= ?cursor= でページ分割する（新しい日付順）
+    # ?fields=date,total_study_time のように列を絞った場合は時系列を含めない
+    include_time_series = _include_time_series()
+    query = DailyReport.query.filter_by(user_id=user_id)
+    date_from = parse_report_date(request.args['from']) if request.args.get('from') else None
+    date_to = parse_report_date(request.args['to']) if request.args.get('to') else None
+    if (request.args.get('from') and date_from is None) or (request.args.get('to') and date_to is None):
+        return jsonify({'error': 'Invalid date range'}), 400
+    if date_from:
+        query = query.filter(DailyReport.date >= date_from)
+    if date_to:
+        query = query.filter(DailyReport.date <= date_to)
+
+    try:
+        fields = parse_fields(DailyReport, excluded=('time_series_focus_data',))
+        if fields is None and not include_time_series:
+            query = query.options(defer(DailyReport.time_series_focus_data))
+        reports, next_cursor = paginate(
+            query, DailyReport, [DailyReport.date, DailyReport.id], descending=True, fields=fields
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if fields is not None:
+        return page_response([project(report, fields) for report in reports], next_cursor)
+    if not include_time_series:
+        return page_response([report.to_dict(include_time_series=False) for report in reports], next_cursor)
+
+    dates = [report.date for report in reports]
+    series_by_date = {
+        series.date: series
+        for series in FocusSeries.query.filter(FocusSeries.user_id == user_id, FocusSeries.date.in_(dates)).all()
+    } if dates else {}
+    return page_response([
+        report.to_dict(focus_series=series_by_date.get(report.date, False), raw_json=supports_raw_json()) for report in reports
+    ], next_cursor)
 
 @user_bp.route('/users/<string:user_id>/reports/<string:date>', methods=['GET'])
 def get_daily_report(user_id, date):
     print(f"Fetching report for user_id: {user_id}, date: {date}")
-    report = DailyReport.query.filter_by(user_id=user_id, date=date).first()
-    if not report:
-        print(f"No report found for user_id: {user_id}, date: {date}")
-        return jsonify({'error': 'Report not found'}), 404
-    print(f"Report found: {report.to_dict()}")
-    return jsonify(report.to_dict())
+    report_date = parse_report_date(date)
+
+    def build():
+        report = DailyReport.query.filter_by(user_id=user_id, date=report_date).first() if report_date else None
+        if not report:
+            print(f"No report found for user_id: {user_id}, date: {date}")
+            return jsonify({'error': 'Report not found'}), 404
+        report_data = report.to_dict(raw_json=supports_raw_json())
+        print(f"Report found: {report_data}")
+        return jsonify(report_data)
+
+    if report_date is None:
+        return build()
+    return conditional_response(
+        build,
+        version_of(DailyReport, DailyReport.user_id == user_id, DailyReport.date == report_date),
+        version_of(FocusSeries, FocusSeries.user_id == user_id, FocusSeries.date == report_date)
+    )
 
 @user_bp.route('/users/<string:user_id>/reports', methods=['POST'])
-# @token_required  # テスト用に一時的に無効化
 def create_daily_report(user_id):
     data = request.json
+    report_date = parse_report_date(data.get('date'))
+    if report_date is None:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
     
     # Check if report for this date already exists
-    existing_report = DailyReport.query.filter_by(user_id=user_id, date=data['date']).first()
+    existing_report = DailyReport.query.filter_by(user_id=user_id, date=report_date).first()
     if existing_report:
         return jsonify({'error': 'Report for this date already exists'}), 400
     
     report = DailyReport(
         report_id=str(uuid.uuid4()),
         user_id=user_id,
-        date=data['date'],
+        date=report_date,
         total_study_time=data.get('total_study_time', 0),
         total_focus_time=data.get('total_focus_time', 0),
         avg_focus_score=data.get('avg_focus_score', 0.0),
@@ -154,14 +212,23 @@ def create_daily_report(user_id):
         time_series_focus_data=json.dumps(data.get('time_series_focus_data', []))
     )
     db.session.add(report)
-    db.session.commit()
-    return jsonify(report.to_dict()), 201
+    apply_report_delta(user_id, report_date, report.total_study_time or 0, report.total_focus_time or 0)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 同じ日付の日報が同時に作成された場合（ユーザー・日付の一意インデックス）
+        db.session.rollback()
+        return jsonify({'error': 'Report for this date already exists'}), 400
+    ranking_cache.invalidate()
+    return jsonify(report.to_dict(raw_json=supports_raw_json())), 201
 
 @user_bp.route('/users/<string:user_id>/reports/<string:date>', methods=['PUT'])
-# @token_required  # テスト用に一時的に無効化
 def update_daily_report(user_id, date):
-    report = DailyReport.query.filter_by(user_id=user_id, date=date).first_or_404()
+    report_date = parse_report_date(date)
+    report = DailyReport.query.filter_by(user_id=user_id, date=report_date).first_or_404()
     data = request.json
+    previous_study_time = report.total_study_time or 0
+    previous_focus_time = report.total_focus_time or 0
     
     report.total_study_time = data.get('total_study_time', report.total_study_time)
     report.total_focus_time = data.get('total_focus_time', report.total_focus_time)
@@ -173,14 +240,26 @@ def update_daily_report(user_id, date):
     if 'time_series_focus_data' in data:
         report.time_series_focus_data = json.dumps(data['time_series_focus_data'])
     
+    apply_report_delta(
+        user_id,
+        report_date,
+        (report.total_study_time or 0) - previous_study_time,
+        (report.total_focus_time or 0) - previous_focus_time
+    )
     db.session.commit()
-    return jsonify(report.to_dict())
+    ranking_cache.invalidate()
+    return jsonify(report.to_dict(raw_json=supports_raw_json()))
 
 @user_bp.route('/users/<string:user_id>/reports/<string:date>', methods=['DELETE'])
 def delete_daily_report(user_id, date):
-    report = DailyReport.query.filter_by(user_id=user_id, date=date).first_or_404()
+    report_date = parse_report_date(date)
+    report = DailyReport.query.filter_by(user_id=user_id, date=report_date).first_or_404()
+    FocusSeries.query.filter_by(user_id=user_id, date=report_date).delete()
+    LeaderboardTotal.apply_delta(user_id, -(report.total_study_time or 0), -(report.total_focus_time or 0))
+    LeaderboardDaily.query.filter_by(user_id=user_id, day=report_date).delete()
     db.session.delete(report)
     db.session.commit()
+    ranking_cache.invalidate()
     return '', 204
 
 # AI feedback endpoint
@@ -271,7 +350,6 @@ def generate_ai_feedback():
 
 # Generate AI summary for daily report
 @user_bp.route('/ai/summary', methods=['POST'])
-# @token_required  # テスト用に一時的に無効化
 def generate_ai_summary():
     data = request.json
     total_study_time = data.get('total_study_time', 0)
@@ -315,154 +393,262 @@ def generate_ai_summary():
     return jsonify({'summary': summary})
 
 # Ranking endpoints
-@user_bp.route('/rankings/study-time/total', methods=['GET'])
-# @token_required  # テスト用に一時的に無効化
-def get_total_study_time_ranking():
-    from sqlalchemy import func
-    
+RANKING_LIMIT = 10
+
+# ランキングの種類ごとの (並べる値, 値のキー名)
+RANKING_BOARDS = {
+    'study_time_total': (LeaderboardTotal.total_study_time, 'total_study_time'),
+    'focus_time_total': (LeaderboardTotal.total_focus_time, 'total_focus_time'),
+    'study_time_today': (DailyReport.total_study_time, 'total_study_time'),
+    'focus_time_today': (DailyReport.total_focus_time, 'total_focus_time')
+}
+
+def _query_rankings(today):
+    """
+    4種類のランキングを1回のクエリ（インデックスで上位N件を引くSELECTのUNION ALL）で取得する
+    """
+    from sqlalchemy import literal, select, union_all
+
+    parts = []
+    for board, (value, _) in RANKING_BOARDS.items():
+        inner = select(User.user_id, User.name, value.label('value'))
+        if value.class_ is LeaderboardTotal:
+            inner = inner.select_from(LeaderboardTotal).join(User, User.user_id == LeaderboardTotal.user_id)
+        else:
+            inner = inner.select_from(DailyReport).join(User, User.user_id == DailyReport.user_id).where(
+                DailyReport.date == today
+            )
+        top = inner.order_by(value.desc(), User.user_id).limit(RANKING_LIMIT).subquery()
+        parts.append(select(literal(board).label('board'), top.c.user_id, top.c.name, top.c.value))
+
+    rows = {board: [] for board in RANKING_BOARDS}
+    for board, user_id, name, value in db.session.execute(union_all(*parts)):
+        rows[board].append((user_id, name, value or 0))
+
+    result = {'date': today.isoformat()}
+    for board, (_, key) in RANKING_BOARDS.items():
+        # UNION ALLは順序を保証しないため、各ランキング内で並べ直す
+        ranked = sorted(rows[board], key=lambda row: (-row[2], row[0]))
+        result[board] = [
+            {'rank': rank, 'user_id': user_id, 'name': name, key: value}
+            for rank, (user_id, name, value) in enumerate(ranked, 1)
+        ]
+    return result
+
+def _get_rankings():
+    """
+    キャッシュ済みのランキングと、そのETagを返す（今日の日付が変われば作り直す）
+    """
+    from datetime import date
+
+    today = date.today()
+    # 他のワーカーでの書き込みも反映されるよう、元データの版（件数と最終更新日時）をキーに含める
+    version = tuple(
+        tuple(db.session.execute(source).one())
+        for source in (version_of(LeaderboardTotal), version_of(DailyReport, DailyReport.date == today))
+    )
+    return ranking_cache.get((today, version), lambda: _query_rankings(today))
+
+def _rankings_response(data, etag):
+    """
+    ETagが一致すれば304を返す。ブラウザには毎回再検証させる
+    （圧縮したレスポンスのETagは弱いETagになるため弱い比較で判定する）
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(data)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@user_bp.route('/rankings', methods=['GET'])
+def get_rankings():
     try:
-        rankings = db.session.query(
-            User.user_id,
-            User.name,
-            func.coalesce(func.sum(DailyReport.total_study_time), 0).label('total_study_time')
-        ).outerjoin(
-            DailyReport, User.user_id == DailyReport.user_id
-        ).group_by(
-            User.user_id, User.name
-        ).order_by(
-            func.coalesce(func.sum(DailyReport.total_study_time), 0).desc()
-        ).limit(10).all()
-
-        result = []
-        for rank, (user_id, name, total_time) in enumerate(rankings, 1):
-            result.append({
-                'rank': rank,
-                'user_id': user_id,
-                'name': name,
-                'total_study_time': total_time or 0
-            })
-
-        print(f'Total study time ranking result: {result}')
-        return jsonify(result)
+        data, etag = _get_rankings()
+        return _rankings_response(data, etag)
     except Exception as e:
-        print(f'Error in get_total_study_time_ranking: {e}')
-        return jsonify([])
+        print(f'Error in get_rankings: {e}')
+        return jsonify({board: [] for board in RANKING_BOARDS})
+
+# 個別のランキング（/api/rankings の各要素と同じ内容を返す）
+@user_bp.route('/rankings/study-time/total', methods=['GET'])
+def get_total_study_time_ranking():
+    return _get_single_ranking('study_time_total')
 
 @user_bp.route('/rankings/focus-time/total', methods=['GET'])
-# @token_required  # テスト用に一時的に無効化
 def get_total_focus_time_ranking():
-    from sqlalchemy import func
-    
-    try:
-        rankings = db.session.query(
-            User.user_id,
-            User.name,
-            func.coalesce(func.sum(DailyReport.total_focus_time), 0).label('total_focus_time')
-        ).outerjoin(
-            DailyReport, User.user_id == DailyReport.user_id
-        ).group_by(
-            User.user_id, User.name
-        ).order_by(
-            func.coalesce(func.sum(DailyReport.total_focus_time), 0).desc()
-        ).limit(10).all()
-
-        result = []
-        for rank, (user_id, name, total_time) in enumerate(rankings, 1):
-            result.append({
-                'rank': rank,
-                'user_id': user_id,
-                'name': name,
-                'total_focus_time': total_time or 0
-            })
-
-        return jsonify(result)
-    except Exception as e:
-        print(f'Error in get_total_focus_time_ranking: {e}')
-        return jsonify([])
+    return _get_single_ranking('focus_time_total')
 
 @user_bp.route('/rankings/study-time/today', methods=['GET'])
-# @token_required  # テスト用に一時的に無効化
 def get_today_study_time_ranking():
-    from datetime import date
-    
-    try:
-        today = date.today().strftime('%Y-%m-%d')
-        print(f'Looking for today\'s data: {today}')
-        
-        rankings = db.session.query(
-            User.user_id,
-            User.name,
-            DailyReport.total_study_time
-        ).join(
-            DailyReport, User.user_id == DailyReport.user_id
-        ).filter(
-            DailyReport.date == today
-        ).order_by(
-            DailyReport.total_study_time.desc()
-        ).limit(10).all()
-
-        result = []
-        for rank, (user_id, name, study_time) in enumerate(rankings, 1):
-            result.append({
-                'rank': rank,
-                'user_id': user_id,
-                'name': name,
-                'total_study_time': study_time or 0
-            })
-
-        print(f'Today study time ranking result: {result}')
-        return jsonify(result)
-    except Exception as e:
-        print(f'Error in get_today_study_time_ranking: {e}')
-        return jsonify([])
+    return _get_single_ranking('study_time_today')
 
 @user_bp.route('/rankings/focus-time/today', methods=['GET'])
-# @token_required  # テスト用に一時的に無効化
 def get_today_focus_time_ranking():
-    from datetime import date
-    
+    return _get_single_ranking('focus_time_today')
+
+def _get_single_ranking(board):
     try:
-        today = date.today().strftime('%Y-%m-%d')
-        
-        rankings = db.session.query(
-            User.user_id,
-            User.name,
-            DailyReport.total_focus_time
-        ).join(
-            DailyReport, User.user_id == DailyReport.user_id
-        ).filter(
-            DailyReport.date == today
-        ).order_by(
-            DailyReport.total_focus_time.desc()
-        ).limit(10).all()
-
-        result = []
-        for rank, (user_id, name, focus_time) in enumerate(rankings, 1):
-            result.append({
-                'rank': rank,
-                'user_id': user_id,
-                'name': name,
-                'total_focus_time': focus_time or 0
-            })
-
-        return jsonify(result)
+        data, etag = _get_rankings()
+        return _rankings_response(data[board], f'{etag}-{board}')
     except Exception as e:
-        print(f'Error in get_today_focus_time_ranking: {e}')
+        print(f'Error in ranking {board}: {e}')
         return jsonify([])
 
+# 期間・ページ指定のランキング
+RANKING_METRICS = {
+    'study-time': 'total_study_time',
+    'focus-time': 'total_focus_time'
+}
+RANKING_MAX_PAGE_SIZE = 100
+RANKING_MAX_RANGE_DAYS = 366
+
+def _ranking_period(window):
+    """
+    期間の種類から集計する日付の範囲を返す（totalはNone, None）
+    """
+    from datetime import date, timedelta
+
+    today = date.today()
+    if window == 'total':
+        return None, None
+    if window == 'today':
+        return today, today
+    if window == 'week':
+        return today - timedelta(days=today.weekday()), today
+    if window == 'month':
+        return today.replace(day=1), today
+    if window == 'range':
+        start = parse_report_date(request.args.get('start'))
+        end = parse_report_date(request.args.get('end'))
+        if start is None or end is None:
+            raise ValueError('start and end must be YYYY-MM-DD')
+        if start > end or (end - start).days >= RANKING_MAX_RANGE_DAYS:
+            raise ValueError(f'Range must be between 1 and {RANKING_MAX_RANGE_DAYS} days')
+        return start, end
+    raise ValueError('window must be one of total, today, week, month, range')
+
+def _ranking_source(key, start, end):
+    """
+    ユーザーごとの値（user_id, value）のサブクエリ
+    累計は LeaderboardTotal をそのまま、期間指定は日別の集計を期間内で合計する
+    """
+    from sqlalchemy import func, select
+
+    if start is None:
+        return select(
+            LeaderboardTotal.user_id.label('user_id'), getattr(LeaderboardTotal, key).label('value')
+        ).subquery()
+    return select(
+        LeaderboardDaily.user_id.label('user_id'), func.sum(getattr(LeaderboardDaily, key)).label('value')
+    ).where(
+        LeaderboardDaily.day.between(start, end)
+    ).group_by(LeaderboardDaily.user_id).subquery()
+
+def _encode_ranking_cursor(value, user_id, rank):
+    import base64
+    return base64.urlsafe_b64encode(json.dumps([value, user_id, rank]).encode()).decode().rstrip('=')
+
+def _decode_ranking_cursor(cursor):
+    import base64
+    try:
+        value, user_id, rank = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(value), str(user_id), int(rank)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+@user_bp.route('/rankings/<string:metric>', methods=['GET'])
+def get_ranking_page(metric):
+    """
+    ?window=total|today|week|month|range（rangeは start, end も指定）
+    ?limit=件数 ?cursor=前のページの next_cursor ?user_id=自分の順位を含める場合
+    """
+    from sqlalchemy import and_, func, not_, select
+
+    key = RANKING_METRICS.get(metric)
+    if key is None:
+        return jsonify({'error': 'Unknown ranking'}), 404
+
+    window = request.args.get('window', 'total')
+    try:
+        start, end = _ranking_period(window)
+        limit = min(max(int(request.args.get('limit', 10)), 1), RANKING_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        after = _decode_ranking_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    source = _ranking_source(key, start, end)
+    query = select(User.user_id, User.name, source.c.value).join(User, User.user_id == source.c.user_id)
+    rank_offset = 0
+    if after is not None:
+        # キーセットページネーション: 前のページの最後の行（値の降順、同値はuser_idの昇順）の続きから読む
+        last_value, last_user_id, rank_offset = after
+        query = query.where(
+            source.c.value <= last_value,
+            not_(and_(source.c.value == last_value, source.c.user_id <= last_user_id))
+        )
+    rows = db.session.execute(
+        query.order_by(source.c.value.desc(), source.c.user_id).limit(limit + 1)
+    ).all()
+
+    items = [
+        {'rank': rank_offset + index, 'user_id': user_id, 'name': name, key: value or 0}
+        for index, (user_id, name, value) in enumerate(rows[:limit], 1)
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = _encode_ranking_cursor(last[key], last['user_id'], last['rank'])
+
+    result = {
+        'metric': metric,
+        'window': window,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'items': items,
+        'next_cursor': next_cursor
+    }
+
+    me = request.args.get('user_id')
+    if me:
+        # 自分の値より大きいユーザーの数だけを数える（同値は同順位）
+        # 一覧・順位の計算と同じくユーザーが存在する行だけを対象にする
+        my_value = db.session.execute(
+            select(source.c.value).join(User, User.user_id == source.c.user_id).where(source.c.user_id == me)
+        ).scalar()
+        if my_value is None:
+            result['me'] = None
+        else:
+            higher = db.session.execute(
+                select(func.count()).select_from(source).join(User, User.user_id == source.c.user_id).where(
+                    source.c.value > my_value
+                )
+            ).scalar()
+            result['me'] = {'rank': higher + 1, 'user_id': me, key: my_value}
+
+    return jsonify(result)
+
 # Comment endpoints
 @user_bp.route('/users/<string:user_id>/comments/<string:date>', methods=['GET'])
 def get_daily_comments(user_id, date):
-    comments = DailyReportComment.query.filter_by(user_id=user_id, date=date).order_by(DailyReportComment.created_at.desc()).all()
+    comment_date = parse_report_date(date)
+    if comment_date is None:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    comments = DailyReportComment.query.filter_by(user_id=user_id, date=comment_date).order_by(DailyReportComment.created_at.desc()).all()
     return jsonify([comment.to_dict() for comment in comments])
 
 @user_bp.route('/users/<string:user_id>/comments', methods=['POST'])
 def create_comment(user_id):
     data = request.json
+    comment_date = parse_report_date(data.get('date'))
+    if comment_date is None:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
     comment = DailyReportComment(
         comment_id=str(uuid.uuid4()),
         user_id=user_id,
-        date=data['date'],
+        date=comment_date,
         comment_text=data['comment_text']
     )
     db.session.add(comment)
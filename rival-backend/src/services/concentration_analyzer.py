@@ -1,67 +1,421 @@
 import boto3
 import base64
+import math
 import os
+import threading
+import time
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
+from src.services.frame_cache import FRAME_CACHE_ENABLED, compute_frame_hash, frame_cache
+from src.services.frame_preprocessor import FRAME_PREPROCESS_ENABLED, preprocess_frame, preprocess_stats
 
 # --- 設定 ---
 PRESENCE_CONFIDENCE_THRESHOLD = 75
+
+# 顔検出バックエンド（rekognition: AWS Rekognition / opencv: CPU上のローカル検出）
+FACE_DETECTOR_BACKEND = os.environ.get('FACE_DETECTOR_BACKEND', 'rekognition')
+# OpenCVバックエンドの設定（DNNモデルが未指定の場合はHaarカスケードを使う）
+OPENCV_DNN_MODEL = os.environ.get('OPENCV_DNN_MODEL')
+OPENCV_DNN_CONFIG = os.environ.get('OPENCV_DNN_CONFIG')
+OPENCV_HAAR_MIN_NEIGHBORS = int(os.environ.get('OPENCV_HAAR_MIN_NEIGHBORS', 5))
+
+# Rekognitionクライアントの接続プール設定（gunicornワーカーごとに1つ作成される）
+REKOGNITION_MAX_POOL_CONNECTIONS = int(os.environ.get('REKOGNITION_MAX_POOL_CONNECTIONS', 10))
+REKOGNITION_CONNECT_TIMEOUT = float(os.environ.get('REKOGNITION_CONNECT_TIMEOUT', 3))
+REKOGNITION_READ_TIMEOUT = float(os.environ.get('REKOGNITION_READ_TIMEOUT', 10))
 # --- 設定ここまで ---
 
+# プロセス全体で共有するRekognitionクライアント
+# 認証情報・リージョン・エンドポイントが変わった場合のみ再作成する
+_client_lock = threading.Lock()
+_client_key = None
+_rekognition_client = None
+_client_stats = {
+    'client_builds': 0,
+    'client_reuses': 0
+}
+
+
+def _get_aws_settings():
+    """
+    環境変数からAWS設定を読み込む
+    戻り値: (access_key, secret_key, region, endpoint_url)
+    """
+    return (
+        os.environ.get('AWS_ACCESS_KEY_ID'),
+        os.environ.get('AWS_SECRET_ACCESS_KEY'),
+        os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        os.environ.get('REKOGNITION_ENDPOINT_URL') or None
+    )
+
+
+def _build_rekognition_client(access_key, secret_key, region, endpoint_url=None):
+    """
+    接続プールとKeep-Aliveを設定したRekognitionクライアントを作成する
+    """
+    config = Config(
+        max_pool_connections=REKOGNITION_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=REKOGNITION_CONNECT_TIMEOUT,
+        read_timeout=REKOGNITION_READ_TIMEOUT,
+        retries={'max_attempts': 2, 'mode': 'standard'}
+    )
+    return boto3.session.Session().client(
+        'rekognition',
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        endpoint_url=endpoint_url,
+        config=config
+    )
+
+
+def get_rekognition_client(access_key, secret_key, region, endpoint_url=None):
+    """
+    共有のRekognitionクライアントを取得する（スレッドセーフ）
+    認証情報・リージョン・エンドポイントが変わった場合のみ再作成する
+    """
+    global _client_key, _rekognition_client
+
+    key = (access_key, secret_key, region, endpoint_url)
+    with _client_lock:
+        if _rekognition_client is not None and _client_key == key:
+            _client_stats['client_reuses'] += 1
+            return _rekognition_client
+
+        _rekognition_client = _build_rekognition_client(access_key, secret_key, region, endpoint_url)
+        _client_key = key
+        _client_stats['client_builds'] += 1
+        return _rekognition_client
+
+
+def reset_rekognition_client():
+    """
+    共有クライアントを破棄する（次回呼び出し時に再作成される）
+    """
+    global _client_key, _rekognition_client
+
+    with _client_lock:
+        _client_key = None
+        _rekognition_client = None
+
+
+def _get_connection_pool_stats(client):
+    """
+    urllib3の接続プールからリクエスト数と新規接続数を集計する
+    """
+    requests_sent = 0
+    connections_opened = 0
+    try:
+        manager = client._endpoint.http_session._manager
+        for pool_key in manager.pools.keys():
+            pool = manager.pools[pool_key]
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+    except (AttributeError, KeyError):
+        pass
+    return requests_sent, connections_opened
+
+
+def get_client_stats():
+    """
+    クライアント作成回数と接続再利用回数を返す
+    """
+    with _client_lock:
+        stats = dict(_client_stats)
+        client = _rekognition_client
+
+    requests_sent, connections_opened = (0, 0)
+    if client is not None:
+        requests_sent, connections_opened = _get_connection_pool_stats(client)
+
+    stats['http_requests'] = requests_sent
+    stats['http_connections_opened'] = connections_opened
+    stats['http_connection_reuses'] = max(requests_sent - connections_opened, 0)
+    stats['max_pool_connections'] = REKOGNITION_MAX_POOL_CONNECTIONS
+    return stats
+
+
+def decode_image_data(image_base64_string):
+    """
+    Base64形式（データURL可）の画像データをバイト列にデコードする
+    """
+    # Base64ヘッダーを削除
+    if ',' in image_base64_string:
+        image_data = image_base64_string.split(',')[1]
+    else:
+        image_data = image_base64_string
+
+    # Base64をデコード
+    return base64.b64decode(image_data)
+
+
 def analyze_face_presence(image_base64_string):
     """
     Base64形式の画像データを受け取り、顔が在席しているかを判定する
     戻り値: (face_detected: bool, confidence: float, error: str or None)
     """
     try:
-        # Base64ヘッダーを削除
-        if ',' in image_base64_string:
-            image_data = image_base64_string.split(',')[1]
-        else:
-            image_data = image_base64_string
-        
-        # Base64をデコード
-        image_bytes = base64.b64decode(image_data)
-        
-        # AWS認証情報を確認
-        access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-        secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-        region = os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')
-        
-        if not access_key or not secret_key:
+        image_bytes = decode_image_data(image_base64_string)
+    except Exception as e:
+        return False, 0, f"予期しないエラー: {str(e)}"
+
+    return detect_face_presence(image_bytes)
+
+
+def analyze_frame(image_bytes, session_key=None):
+    """
+    フレームを解析する
+    1. 1回だけデコードし、検出に十分なサイズまで縮小・再エンコードする
+    2. 直前に解析したフレームとほぼ同一の場合はキャッシュ結果を再利用する
+    戻り値: {'face_detected', 'confidence', 'error', 'cached', 'timings'}
+    """
+    timings = {}
+
+    prepared = None
+    if FRAME_PREPROCESS_ENABLED:
+        try:
+            prepared = preprocess_frame(image_bytes)
+            timings.update(prepared.timings)
+        except Exception:
+            # デコードできない画像はそのまま検出に回し、検出側のエラーを返す
+            prepared = None
+
+    frame_hash = None
+    if FRAME_CACHE_ENABLED and session_key is not None:
+        start = time.perf_counter()
+        try:
+            frame_hash = compute_frame_hash(prepared.image if prepared else image_bytes)
+        except Exception:
+            frame_hash = None
+        timings['hash'] = (time.perf_counter() - start) * 1000
+        preprocess_stats.record_stage('hash', timings['hash'])
+
+    if frame_hash is not None:
+        cached = frame_cache.lookup(session_key, frame_hash)
+        if cached is not None:
+            face_detected, confidence = cached
+            return {'face_detected': face_detected, 'confidence': confidence, 'error': None,
+                    'cached': True, 'timings': timings}
+
+    start = time.perf_counter()
+    face_detected, confidence, error = detect_face_presence(
+        prepared.data if prepared else image_bytes,
+        prepared.image if prepared else None
+    )
+    timings['detect'] = (time.perf_counter() - start) * 1000
+    preprocess_stats.record_stage('detect', timings['detect'])
+
+    if frame_hash is not None and not error:
+        frame_cache.store(session_key, frame_hash, (face_detected, confidence))
+
+    return {'face_detected': face_detected, 'confidence': confidence, 'error': error,
+            'cached': False, 'timings': timings}
+
+
+def detect_face_presence(image_bytes, image=None):
+    """
+    画像のバイト列を受け取り、設定された検出バックエンドで顔が在席しているかを判定する
+    image: デコード済みの画像（ローカルバックエンドでの再デコードを省略するため、任意）
+    戻り値: (face_detected: bool, confidence: float, error: str or None)
+    """
+    return get_detector().detect(image_bytes, image)
+
+
+class RekognitionDetector:
+    """
+    AWS Rekognitionのdetect_facesで判定するバックエンド
+    """
+    name = 'rekognition'
+
+    def detect(self, image_bytes, image=None):
+        try:
+            # AWS認証情報を確認
+            access_key, secret_key, region, endpoint_url = _get_aws_settings()
+
+            if not access_key or not secret_key:
+                return False, 0, "AWS認証情報が設定されていません"
+
+            if access_key == 'YOUR_AWS_ACCESS_KEY_ID':
+                return False, 0, "AWS認証情報を実際の値に設定してください"
+
+            # 共有のAWS Rekognitionクライアントを取得
+            rekognition = get_rekognition_client(access_key, secret_key, region, endpoint_url)
+
+            response = rekognition.detect_faces(
+                Image={'Bytes': image_bytes},
+                Attributes=['DEFAULT']
+            )
+
+            if response['FaceDetails']:
+                best_face = max(response['FaceDetails'], key=lambda x: x['Confidence'])
+                if best_face['Confidence'] >= PRESENCE_CONFIDENCE_THRESHOLD:
+                    return True, best_face['Confidence'], None
+
+            return False, 0, None
+
+        except NoCredentialsError:
             return False, 0, "AWS認証情報が設定されていません"
-        
-        if access_key == 'YOUR_AWS_ACCESS_KEY_ID':
-            return False, 0, "AWS認証情報を実際の値に設定してください"
-        
-        # AWS Rekognitionクライアントを作成
-        rekognition = boto3.client(
-            'rekognition',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-        
-        response = rekognition.detect_faces(
-            Image={'Bytes': image_bytes},
-            Attributes=['DEFAULT']
-        )
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code == 'SignatureDoesNotMatch':
+                return False, 0, "AWS認証情報が正しくありません。Access KeyとSecret Keyを確認してください。"
+            elif error_code == 'InvalidImageFormatException':
+                return False, 0, "画像フォーマットが無効です"
+            else:
+                return False, 0, f"AWS APIエラー: {e.response['Error']['Message']}"
+        except Exception as e:
+            return False, 0, f"予期しないエラー: {str(e)}"
 
-        if response['FaceDetails']:
-            best_face = max(response['FaceDetails'], key=lambda x: x['Confidence'])
-            if best_face['Confidence'] >= PRESENCE_CONFIDENCE_THRESHOLD:
-                return True, best_face['Confidence'], None
-        
-        return False, 0, None
-
-    except NoCredentialsError:
-        return False, 0, "AWS認証情報が設定されていません"
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'SignatureDoesNotMatch':
-            return False, 0, "AWS認証情報が正しくありません。Access KeyとSecret Keyを確認してください。"
-        elif error_code == 'InvalidImageFormatException':
-            return False, 0, "画像フォーマットが無効です"
+
+class OpenCVDetector:
+    """
+    OpenCVでCPU上で判定するローカルバックエンド（ネットワーク往復なし）
+    OPENCV_DNN_MODEL / OPENCV_DNN_CONFIG が設定されていればSSD顔検出モデル（Caffe）を、
+    なければOpenCV同梱のHaarカスケードを使う。
+    cv2のNet / CascadeClassifierは同時に呼び出せないため、検出を行うスレッドごとに1つずつ読み込み、
+    ロックなしで並列に検出する
+    """
+    name = 'opencv'
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances = 0
+        self._cv2 = None
+        self._np = None
+        self._use_dnn = bool(OPENCV_DNN_MODEL and OPENCV_DNN_CONFIG)
+        self._load_error = None
+        try:
+            import cv2
+            import numpy as np
+            self._cv2 = cv2
+            self._np = np
+            if not self._use_dnn and not hasattr(cv2, 'CascadeClassifier'):
+                # OpenCV 5以降はHaarカスケードが本体から外れている
+                self._load_error = "このOpenCVにはHaarカスケードがありません。OPENCV_DNN_MODELを設定するか opencv-python-headless<5 を使用してください"
+            elif self._get_model() is None:
+                self._load_error = "Haarカスケードの読み込みに失敗しました"
+        except ImportError:
+            self._load_error = "OpenCVがインストールされていません（opencv-python-headlessが必要です）"
+        except Exception as e:
+            self._load_error = f"OpenCVモデルの読み込みに失敗しました: {str(e)}"
+
+    @property
+    def model(self):
+        return 'dnn' if self._use_dnn else 'haar'
+
+    @property
+    def instances(self):
+        return self._instances
+
+    def _get_model(self):
+        """
+        このスレッド用のモデルを返す（初回のみ読み込む。Haarカスケードの読み込みに失敗した場合はNone）
+        """
+        model = getattr(self._local, 'model', None)
+        if model is not None:
+            return model
+
+        cv2 = self._cv2
+        if self._use_dnn:
+            model = cv2.dnn.readNetFromCaffe(OPENCV_DNN_CONFIG, OPENCV_DNN_MODEL)
         else:
-            return False, 0, f"AWS APIエラー: {e.response['Error']['Message']}"
-    except Exception as e:
-        return False, 0, f"予期しないエラー: {str(e)}"
\ No newline at end of file
+            model = cv2.CascadeClassifier(
+                os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+            )
+            if model.empty():
+                return None
+        self._local.model = model
+        with self._lock:
+            self._instances += 1
+        return model
+
+    def _to_array(self, image_bytes, image, grayscale):
+        if image is not None:
+            if grayscale:
+                return self._np.asarray(image.convert('L'))
+            # PILはRGB、OpenCVはBGRの並び
+            return self._np.asarray(image.convert('RGB'))[:, :, ::-1]
+        flags = self._cv2.IMREAD_GRAYSCALE if grayscale else self._cv2.IMREAD_COLOR
+        return self._cv2.imdecode(self._np.frombuffer(image_bytes, dtype=self._np.uint8), flags)
+
+    def _detect_dnn(self, frame):
+        cv2 = self._cv2
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net = self._get_model()
+        net.setInput(blob)
+        detections = net.forward()
+        if detections.shape[2] == 0:
+            return 0
+        return float(detections[0, 0, :, 2].max()) * 100
+
+    def _detect_haar(self, gray):
+        faces, _, weights = self._get_model().detectMultiScale3(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=OPENCV_HAAR_MIN_NEIGHBORS,
+            minSize=(40, 40),
+            outputRejectLevels=True
+        )
+        if len(faces) == 0:
+            return 0
+        # カスケード最終段の重みを0-100の信頼度に換算する（重み3で約78、5で約92）
+        return 100 * (1 - math.exp(-float(max(weights)) / 2))
+
+    def detect(self, image_bytes, image=None):
+        if self._load_error:
+            return False, 0, self._load_error
+        try:
+            frame = self._to_array(image_bytes, image, grayscale=not self._use_dnn)
+            if frame is None:
+                return False, 0, "画像フォーマットが無効です"
+
+            if self._use_dnn:
+                confidence = self._detect_dnn(frame)
+            else:
+                confidence = self._detect_haar(frame)
+
+            if confidence >= PRESENCE_CONFIDENCE_THRESHOLD:
+                return True, confidence, None
+            return False, 0, None
+        except Exception as e:
+            return False, 0, f"予期しないエラー: {str(e)}"
+
+
+DETECTOR_BACKENDS = {
+    RekognitionDetector.name: RekognitionDetector,
+    OpenCVDetector.name: OpenCVDetector
+}
+
+# 設定ミスは初回の検出リクエストではなく起動時に検出する
+if FACE_DETECTOR_BACKEND not in DETECTOR_BACKENDS:
+    raise ValueError(
+        f"Unknown face detector backend: {FACE_DETECTOR_BACKEND} "
+        f"(choose from: {', '.join(DETECTOR_BACKENDS)})"
+    )
+
+_detector_lock = threading.Lock()
+_detector = None
+
+
+def get_detector():
+    """
+    FACE_DETECTOR_BACKENDで選択された検出バックエンドを返す（ワーカーごとに1回だけ作成）
+    """
+    global _detector
+
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = DETECTOR_BACKENDS[FACE_DETECTOR_BACKEND]()
+    return _detector
+
+
+def get_detector_info():
+    detector = get_detector()
+    info = {'backend': detector.name}
+    if isinstance(detector, OpenCVDetector):
+        info['model'] = detector.model
+        info['model_instances'] = detector.instances
+    return info
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.curriculum import CurriculumResponseCache, db
+from src.services import curriculum_generator
+
+# --- 設定 ---
+CURRICULUM_CACHE_ENABLED = os.environ.get('CURRICULUM_CACHE_ENABLED', 'true').lower() == 'true'
+# 保存する生成結果の件数の上限（超えた分は最後に使われた日時が古いものから削除する）
+CURRICULUM_CACHE_MAX_ENTRIES = int(os.environ.get('CURRICULUM_CACHE_MAX_ENTRIES', 1000))
+# --- 設定ここまで ---
+
+
+def normalize_goal(goal):
+    """
+    全角・半角、大文字・小文字、空白の違いを吸収した目標の文字列を返す
+    """
+    goal = unicodedata.normalize('NFKC', goal or '')
+    return re.sub(r'\s+', ' ', goal).strip().casefold()
+
+
+def make_cache_key(goal, duration_days, prompt_version, model):
+    raw = '\0'.join([str(prompt_version), model, str(int(duration_days)), normalize_goal(goal)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CurriculumResponseCacheService:
+    """
+    Geminiの生成結果をDBに保存して同じ目標・日数のリクエストで再利用する
+    同じキーの生成が同時に要求された場合は、1回のGemini呼び出しの結果を共有する（プロセス内）
+    """
+
+    def __init__(self, max_entries=CURRICULUM_CACHE_MAX_ENTRIES, generate=None):
+        self.max_entries = max_entries
+        self._generate = generate
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._bypassed = 0
+        self._evictions = 0
+
+    def get_or_generate(self, goal, duration_days, use_cache=True, on_day=None):
+        """
+        カリキュラム（dict）を返す。use_cache=Falseの場合はキャッシュを読まずに生成し、結果で上書きする
+        on_dayはストリーミング生成で各日が届いた時点で呼ばれる（キャッシュや他のリクエストの結果を使った場合は最後にまとめて呼ぶ）
+        アプリケーションコンテキスト内で呼び出すこと
+        """
+        if not CURRICULUM_CACHE_ENABLED:
+            return self._call_generate(goal, duration_days, on_day)
+
+        key = make_cache_key(
+            goal, duration_days, curriculum_generator.PROMPT_VERSION, curriculum_generator.GEMINI_MODEL
+        )
+        if use_cache:
+            cached = self._load(key)
+            if cached is not None:
+                with self._lock:
+                    self._hits += 1
+                return self._replay(cached, on_day)
+
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            owner = in_flight is None
+            if owner:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+                if use_cache:
+                    self._misses += 1
+                else:
+                    self._bypassed += 1
+            else:
+                self._coalesced += 1
+
+        if not owner:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return self._replay(in_flight.result, on_day)
+
+        try:
+            in_flight.result = self._call_generate(goal, duration_days, on_day)
+            self._store(key, goal, duration_days, in_flight.result)
+            return in_flight.result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def _call_generate(self, goal, duration_days, on_day=None):
+        return (self._generate or curriculum_generator.generate_curriculum)(goal, duration_days, on_day=on_day)
+
+    @staticmethod
+    def _replay(curriculum_data, on_day):
+        if on_day is not None:
+            for plan in curriculum_data.get('daily_plan', []):
+                on_day(plan)
+        return curriculum_data
+
+    def _load(self, key):
+        entry = CurriculumResponseCache.query.filter_by(cache_key=key).first()
+        if entry is None:
+            return None
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        db.session.commit()
+        return json.loads(entry.curriculum_data)
+
+    def _store(self, key, goal, duration_days, curriculum_data):
+        """
+        生成結果を保存し、件数の上限を超えた分を古いものから削除する（保存の失敗は生成結果に影響させない）
+        """
+        try:
+            now = datetime.utcnow()
+            data = json.dumps(curriculum_data, ensure_ascii=False)
+            entry = CurriculumResponseCache.query.filter_by(cache_key=key).first()
+            if entry is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(CurriculumResponseCache(
+                            cache_key=key,
+                            goal=normalize_goal(goal),
+                            duration_days=duration_days,
+                            prompt_version=curriculum_generator.PROMPT_VERSION,
+                            model=curriculum_generator.GEMINI_MODEL,
+                            curriculum_data=data,
+                            created_at=now,
+                            last_used_at=now
+                        ))
+                except IntegrityError:
+                    # 別のプロセスが同じキーを先に保存した
+                    entry = CurriculumResponseCache.query.filter_by(cache_key=key).first()
+            if entry is not None:
+                entry.curriculum_data = data
+                entry.created_at = now
+                entry.last_used_at = now
+            db.session.commit()
+            self._evict()
+        except Exception as e:
+            db.session.rollback()
+            print(f'Error storing curriculum response cache: {e}')
+
+    def _evict(self):
+        count = CurriculumResponseCache.query.count()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = db.session.query(CurriculumResponseCache.id).order_by(
+            CurriculumResponseCache.last_used_at.asc()
+        ).limit(overflow).subquery()
+        deleted = CurriculumResponseCache.query.filter(
+            CurriculumResponseCache.id.in_(db.select(oldest.c.id))
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        with self._lock:
+            self._evictions += deleted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': CURRICULUM_CACHE_ENABLED,
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced,
+                'bypassed': self._bypassed,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'in_flight': len(self._in_flight)
+            }
+
+
+# プロセス全体で共有するキャッシュ
+curriculum_response_cache = CurriculumResponseCacheService()
@@ -0,0 +1,233 @@
+import json
+import os
+import time
+
+# --- 設定 ---
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+# trueの場合はGeminiを呼ばずにスタブのカリキュラムを返す（テスト・ローカル開発用）
+GEMINI_STUB = os.environ.get('GEMINI_STUB', 'false').lower() == 'true'
+# スタブの応答にかける秒数（生成待ちの動作確認用）
+GEMINI_STUB_DELAY = float(os.environ.get('GEMINI_STUB_DELAY', 0))
+# --- 設定ここまで ---
+
+# プロンプトを変更した場合は上げる（生成結果のキャッシュのキーに含まれる）
+PROMPT_VERSION = 1
+
+_configured = False
+
+
+def check_configuration():
+    """
+    Gemini APIキーが設定されているか確認する（スタブ使用時は不要）
+    """
+    if not GEMINI_STUB and not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in environment variables.")
+
+
+def _get_model():
+    global _configured
+    import google.generativeai as genai
+
+    if not _configured:
+        genai.configure(api_key=GEMINI_API_KEY)
+        _configured = True
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+def build_curriculum_prompt(goal, duration_days):
+    return f"""あなたはプロの家庭教師です。以下の目標と期間に基づいて、詳細な学習カリキュラムをJSON形式で生成してください。
+
+    **目標:** {goal}
+    **期間:** {duration_days}日
+
+    **JSON形式の仕様:**
+    {{
+      "curriculum_title": "(カリキュラムのタイトル)",
+      "overview": "(カリキュラム全体の概要)",
+      "daily_plan": [
+        {{
+          "day": (日数),
+          "title": "(その日の学習テーマ)",
+          "objectives": ["(箇条書きの学習目標1)", "(箇条書きの学習目標2)"],
+          "topics": ["(学習トピック1)", "(学習トピック2)"],
+          "activities": [
+            {{
+              "title": "(具体的な活動タイトル)",
+              "description": "(活動内容の詳細)",
+              "duration_minutes": (活動時間（分）)
+            }}
+          ],
+          "resources": ["(参考リソースのURLや書籍名など)"],
+          "assessment": "(その日の理解度を確認する方法)",
+          "homework": "(宿題や課題)"
+        }}
+      ],
+      "milestones": [
+        {{
+          "day": (マイルストーン達成日),
+          "title": "(マイルストーンのタイトル)",
+          "description": "(マイルストーン達成の具体的な内容)"
+        }}
+      ]
+    }}
+    """
+
+
+def parse_curriculum_response(response_text):
+    """
+    応答テキストから最初の { と最後の } の間をJSONとして読み込む
+    """
+    try:
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+
+        if json_start == -1 or json_end == 0:
+            raise ValueError("No JSON object found in the response.")
+
+        json_string = response_text[json_start:json_end]
+        return json.loads(json_string)
+    except (json.JSONDecodeError, ValueError) as e:
+        raise Exception(f"Failed to parse curriculum from Gemini response: {e}, response: {response_text}")
+
+
+class DailyPlanStreamParser:
+    """
+    ストリーミングで届く応答テキストを少しずつ読み、daily_plan の各日が閉じた時点でその日のdictを返す
+    文字列中の括弧やエスケープを考慮して括弧の深さだけを追跡する（応答全体の検証は最後に行う）
+    """
+
+    def __init__(self):
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._last_key = None
+        self._in_daily_plan = False
+        self._item_start = None
+        self._text = ''
+
+    def feed(self, chunk):
+        """
+        テキストの断片を追加し、新たに完成した daily_plan の要素のリストを返す
+        """
+        self._text += chunk
+        completed = []
+        text = self._text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ':' and self._depth == 1:
+                self._last_key = self._last_string
+            elif ch in '{[':
+                if ch == '[' and self._depth == 1 and self._last_key == 'daily_plan':
+                    self._in_daily_plan = True
+                elif ch == '{' and self._in_daily_plan and self._depth == 2:
+                    self._item_start = self._pos
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if ch == '}' and self._in_daily_plan and self._depth == 2 and self._item_start is not None:
+                    try:
+                        completed.append(json.loads(text[self._item_start:self._pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif ch == ']' and self._in_daily_plan and self._depth == 1:
+                    self._in_daily_plan = False
+            self._pos += 1
+        return completed
+
+    @property
+    def text(self):
+        return self._text
+
+
+def stub_curriculum(goal, duration_days):
+    """
+    Geminiの代わりに返す決まった形のカリキュラム
+    """
+    return {
+        'curriculum_title': f'{goal}の学習カリキュラム',
+        'overview': f'{goal}を{duration_days}日間で達成するためのカリキュラムです。',
+        'daily_plan': [
+            {
+                'day': day,
+                'title': f'{day}日目の学習',
+                'objectives': [f'{goal}の学習目標{day}'],
+                'topics': [f'トピック{day}'],
+                'activities': [
+                    {'title': f'演習{day}', 'description': f'{goal}の演習を行う', 'duration_minutes': 60}
+                ],
+                'resources': [],
+                'assessment': '確認テスト',
+                'homework': '復習'
+            }
+            for day in range(1, duration_days + 1)
+        ],
+        'milestones': [
+            {'day': duration_days, 'title': '目標達成', 'description': f'{goal}を達成する'}
+        ]
+    }
+
+
+def _stream_response_text(goal, duration_days):
+    """
+    応答テキストを断片ごとに返す（スタブの場合は1日分ずつ返す）
+    """
+    if GEMINI_STUB:
+        curriculum = stub_curriculum(goal, duration_days)
+        daily_plan = curriculum.pop('daily_plan')
+        text = json.dumps(curriculum, ensure_ascii=False)
+        yield text[:-1] + ', "daily_plan": ['
+        for i, plan in enumerate(daily_plan):
+            if GEMINI_STUB_DELAY:
+                time.sleep(GEMINI_STUB_DELAY / max(duration_days, 1))
+            yield (', ' if i else '') + json.dumps(plan, ensure_ascii=False)
+        yield ']}'
+        return
+
+    response = _get_model().generate_content(build_curriculum_prompt(goal, duration_days), stream=True)
+    for chunk in response:
+        yield chunk.text
+
+
+def generate_curriculum(goal, duration_days, on_day=None):
+    """
+    目標と期間からカリキュラム（dict）を生成する
+    on_dayを渡した場合はストリーミングで生成し、daily_plan の各日が届いた時点でon_day(plan)を呼ぶ
+    """
+    if on_day is not None:
+        parser = DailyPlanStreamParser()
+        for chunk in _stream_response_text(goal, duration_days):
+            for plan in parser.feed(chunk):
+                on_day(plan)
+        return parse_curriculum_response(parser.text)
+
+    if GEMINI_STUB:
+        if GEMINI_STUB_DELAY:
+            time.sleep(GEMINI_STUB_DELAY)
+        return stub_curriculum(goal, duration_days)
+
+    response = _get_model().generate_content(build_curriculum_prompt(goal, duration_days))
+    return parse_curriculum_response(response.text)
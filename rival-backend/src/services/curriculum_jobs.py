@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 設定 ---
+# カリキュラム生成（Gemini呼び出し）を同時に実行する数（ワーカープロセスごと）
+CURRICULUM_JOB_WORKERS = int(os.environ.get('CURRICULUM_JOB_WORKERS', 2))
+# 実行待ちにできるジョブの最大数（超えた場合は429を返す）
+CURRICULUM_JOB_QUEUE_DEPTH = int(os.environ.get('CURRICULUM_JOB_QUEUE_DEPTH', 32))
+# この秒数を超えて完了しないジョブは失敗とみなす（実行中にワーカーが再起動した場合など）
+CURRICULUM_JOB_TIMEOUT = int(os.environ.get('CURRICULUM_JOB_TIMEOUT', 600))
+# --- 設定ここまで ---
+
+
+class JobPool:
+    """
+    リクエストを処理するスレッドとは別に、時間のかかるジョブを実行する上限付きスレッドプール
+    """
+
+    def __init__(self, max_workers=CURRICULUM_JOB_WORKERS, max_queue=CURRICULUM_JOB_QUEUE_DEPTH):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='curriculum-job')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._run_ms_total = 0
+
+    def submit(self, fn, *args):
+        """
+        ジョブを投入する。実行待ちが上限に達している場合はFalseを返す
+        """
+        with self._lock:
+            if self._pending + self._running >= self.max_queue:
+                self._rejected += 1
+                return False
+            self._pending += 1
+            self._submitted += 1
+        self._executor.submit(self._run, fn, args)
+        return True
+
+    def _run(self, fn, args):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            fn(*args)
+            succeeded = True
+        except Exception as e:
+            print(f'Error in curriculum job: {e}')
+            succeeded = False
+        with self._lock:
+            self._running -= 1
+            self._run_ms_total += (time.perf_counter() - start) * 1000
+            if succeeded:
+                self._succeeded += 1
+            else:
+                self._failed += 1
+
+    def stats(self):
+        with self._lock:
+            finished = self._succeeded + self._failed
+            return {
+                'workers': self.max_workers,
+                'max_queue_depth': self.max_queue,
+                'pending': self._pending,
+                'running': self._running,
+                'submitted': self._submitted,
+                'rejected': self._rejected,
+                'succeeded': self._succeeded,
+                'failed': self._failed,
+                'avg_run_ms': round(self._run_ms_total / finished, 3) if finished else 0
+            }
+
+
+# プロセス全体で共有するプール
+curriculum_job_pool = JobPool()
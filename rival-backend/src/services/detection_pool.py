@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# --- 設定 ---
+# 同時に実行する顔検出の数（ワーカープロセスごと）
+DETECTION_POOL_WORKERS = int(os.environ.get('DETECTION_POOL_WORKERS', 4))
+# 実行待ちにできる検出の最大数（超えた場合は最新結果または429を返す）
+DETECTION_QUEUE_DEPTH = int(os.environ.get('DETECTION_QUEUE_DEPTH', 16))
+# リクエストが検出結果を待つ最大秒数
+DETECTION_WAIT_TIMEOUT = float(os.environ.get('DETECTION_WAIT_TIMEOUT', 10))
+# バッチ検出で同時に実行する顔検出の数と、1リクエストあたりの最大フレーム数
+BATCH_DETECTION_WORKERS = int(os.environ.get('BATCH_DETECTION_WORKERS', 8))
+BATCH_MAX_FRAMES = int(os.environ.get('BATCH_MAX_FRAMES', 64))
+# 最新結果を保持するユーザー数の上限
+DETECTION_LATEST_MAX_ENTRIES = int(os.environ.get('DETECTION_LATEST_MAX_ENTRIES', 10000))
+# --- 設定ここまで ---
+
+
+class _Slot:
+    """
+    ユーザーごとの実行状態（実行中のジョブと、次に実行する最新のジョブ）
+    """
+
+    def __init__(self):
+        self.pending_fn = None
+        self.pending_future = None
+        self.pending_at = None
+
+
+class DetectionPool:
+    """
+    顔検出を実行する上限付きスレッドプール
+    同じユーザーのジョブは1つずつ実行し、実行中に届いた新しいフレームは
+    待機中の古いフレームを置き換える（古いフレームの待ち手は新しいフレームの結果を受け取る）
+    """
+
+    def __init__(self, max_workers=DETECTION_POOL_WORKERS, max_queue=DETECTION_QUEUE_DEPTH,
+                 latest_max_entries=DETECTION_LATEST_MAX_ENTRIES):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.latest_max_entries = latest_max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detection')
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._latest = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._coalesced = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_ms_total = 0
+        self._wait_ms_max = 0
+        self._run_ms_total = 0
+
+    def submit(self, key, fn):
+        """
+        ジョブを投入してFutureを返す。プールが飽和している場合はNoneを返す
+        """
+        now = time.perf_counter()
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                # 実行中のジョブがあれば待機中のジョブを置き換える
+                if slot.pending_future is not None:
+                    slot.pending_fn = fn
+                    self._submitted += 1
+                    self._coalesced += 1
+                    return slot.pending_future
+                if self._queued >= self.max_queue:
+                    self._rejected += 1
+                    return None
+                slot.pending_fn = fn
+                slot.pending_future = Future()
+                slot.pending_at = now
+                self._queued += 1
+                self._submitted += 1
+                return slot.pending_future
+
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                return None
+            slot = _Slot()
+            self._slots[key] = slot
+            future = Future()
+            self._queued += 1
+            self._submitted += 1
+
+        self._executor.submit(self._run, key, slot, fn, future, now)
+        return future
+
+    def _run(self, key, slot, fn, future, submitted_at):
+        start = time.perf_counter()
+        wait_ms = (start - submitted_at) * 1000
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_ms_total += wait_ms
+            self._wait_ms_max = max(self._wait_ms_max, wait_ms)
+
+        try:
+            result = fn()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            self.set_latest(key, result)
+            future.set_result(result)
+
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            self._run_ms_total += (time.perf_counter() - start) * 1000
+
+            if slot.pending_future is None:
+                del self._slots[key]
+                return
+            next_fn, next_future, next_at = slot.pending_fn, slot.pending_future, slot.pending_at
+            slot.pending_fn = slot.pending_future = slot.pending_at = None
+
+        self._executor.submit(self._run, key, slot, next_fn, next_future, next_at)
+
+    def set_latest(self, key, result):
+        with self._lock:
+            self._latest[key] = result
+            self._latest.move_to_end(key)
+            while len(self._latest) > self.latest_max_entries:
+                self._latest.popitem(last=False)
+
+    def get_latest(self, key):
+        """
+        直近に完了したジョブの結果を返す（なければNone）
+        """
+        with self._lock:
+            return self._latest.get(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._latest.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                'workers': self.max_workers,
+                'max_queue_depth': self.max_queue,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'submitted': self._submitted,
+                'coalesced': self._coalesced,
+                'rejected': self._rejected,
+                'completed': self._completed,
+                'avg_wait_ms': round(self._wait_ms_total / completed, 3),
+                'max_wait_ms': round(self._wait_ms_max, 3),
+                'avg_run_ms': round(self._run_ms_total / completed, 3)
+            }
+
+
+# プロセス全体で共有するプール
+detection_pool = DetectionPool()
+
+# バッチ検出用のプール（フレームを間引かずに全て解析するため、上のプールとは分ける）
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_DETECTION_WORKERS, thread_name_prefix='batch-detection')
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+# --- 設定 ---
+# バッファした検出サンプルをDBへ書き出す条件（サンプル数・最古サンプルからの秒数）
+FOCUS_SERIES_FLUSH_SAMPLES = int(os.environ.get('FOCUS_SERIES_FLUSH_SAMPLES', 30))
+FOCUS_SERIES_FLUSH_INTERVAL = int(os.environ.get('FOCUS_SERIES_FLUSH_INTERVAL', 60))
+# バッファを定期的に見回る間隔（秒）と、この秒数サンプルが届かないユーザーを書き出して破棄する秒数
+FOCUS_SERIES_SWEEP_INTERVAL = int(os.environ.get('FOCUS_SERIES_SWEEP_INTERVAL', 5))
+FOCUS_SERIES_IDLE_TIMEOUT = int(os.environ.get('FOCUS_SERIES_IDLE_TIMEOUT', 15))
+# --- 設定ここまで ---
+
+# 集中度の時系列はチャンク単位でバイナリに詰める
+#   [バージョン(1byte)] [サンプル数(varint)] [先頭のUNIX時刻(varint)]
+#   [前サンプルとの時刻差(zigzag varint) x (サンプル数-1)] [スコア(uint8) x サンプル数]
+# チャンクは連結するだけで追記できる
+FORMAT_VERSION = 1
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_samples(samples):
+    """
+    (UNIX時刻[秒], スコア0-100)のリストを1チャンクのバイト列にエンコードする
+    """
+    if not samples:
+        return b''
+
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(out, len(samples))
+    _write_varint(out, int(samples[0][0]))
+    previous = int(samples[0][0])
+    for timestamp, _ in samples[1:]:
+        delta = int(timestamp) - previous
+        previous = int(timestamp)
+        # 負の差分（ワーカー間で前後した場合）もzigzagで正の整数にする
+        _write_varint(out, (delta << 1) ^ (delta >> 63))
+    out.extend(max(0, min(100, int(round(score)))) for _, score in samples)
+    return bytes(out)
+
+
+def decode_samples(data):
+    """
+    エンコード済みのバイト列（チャンクの連結）を時刻順の(UNIX時刻, スコア)リストに戻す
+    """
+    samples = []
+    pos = 0
+    data = memoryview(data or b'')
+    while pos < len(data):
+        version = data[pos]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported focus series format: {version}")
+        count, pos = _read_varint(data, pos + 1)
+        timestamp, pos = _read_varint(data, pos)
+        timestamps = [timestamp]
+        for _ in range(count - 1):
+            zigzag, pos = _read_varint(data, pos)
+            timestamp += (zigzag >> 1) ^ -(zigzag & 1)
+            timestamps.append(timestamp)
+        samples.extend(zip(timestamps, data[pos:pos + count].tolist()))
+        pos += count
+    samples.sort(key=lambda sample: sample[0])
+    return samples
+
+
+def samples_to_json(samples):
+    """
+    APIで返す形式（[{'timestamp': ISO8601, 'score': 0-100}]）に変換する
+    """
+    return [
+        {'timestamp': datetime.fromtimestamp(timestamp).isoformat(), 'score': score}
+        for timestamp, score in samples
+    ]
+
+
+def group_samples_by_date(samples):
+    """
+    サンプルをローカル日付（date）ごとに分ける
+    """
+    groups = {}
+    for timestamp, score in samples:
+        date = datetime.fromtimestamp(timestamp).date()
+        groups.setdefault(date, []).append((timestamp, score))
+    return groups
+
+
+class FocusSeriesBuffer:
+    """
+    検出ごとのサンプルをユーザー単位でメモリにため、まとめてDBへ書き出すためのバッファ
+    次のリクエストが来ないユーザー（タブを閉じた、別のワーカーでセッションを終了した）の分は
+    定期的な見回りで書き出し、バッファから取り除く
+    """
+
+    def __init__(self, flush_samples=FOCUS_SERIES_FLUSH_SAMPLES, flush_interval=FOCUS_SERIES_FLUSH_INTERVAL,
+                 sweep_interval=FOCUS_SERIES_SWEEP_INTERVAL, idle_timeout=FOCUS_SERIES_IDLE_TIMEOUT):
+        self.flush_samples = flush_samples
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.idle_timeout = idle_timeout
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._sweeper_thread = None
+        self._sweeps = 0
+        self._swept_users = 0
+
+    def append(self, user_id, score, timestamp=None):
+        with self._lock:
+            self._buffers.setdefault(user_id, []).append((int(timestamp or time.time()), score))
+
+    def _is_due(self, samples, now):
+        return len(samples) >= self.flush_samples or now - samples[0][0] >= self.flush_interval
+
+    def drain(self, user_id, force=False):
+        """
+        書き出し条件を満たしていれば（forceなら常に）バッファを空にしてサンプルを返す
+        """
+        with self._lock:
+            samples = self._buffers.get(user_id)
+            if not samples:
+                return []
+            if not force and not self._is_due(samples, time.time()):
+                return []
+            del self._buffers[user_id]
+            return samples
+
+    def drain_idle(self, is_ended=None):
+        """
+        書き出し条件を満たしたユーザー、idle_timeout秒サンプルが届いていないユーザー、
+        セッションが終了した（is_ended(user_id)が真の）ユーザーのバッファを空にして {user_id: サンプル} を返す
+        セッションの終了は、見回りの間隔以上サンプルが届いていないユーザーについてだけ確認する
+        """
+        now = time.time()
+        with self._lock:
+            candidates = {}
+            for user_id, samples in self._buffers.items():
+                idle = now - samples[-1][0]
+                if self._is_due(samples, now) or idle >= self.idle_timeout:
+                    candidates[user_id] = True
+                elif is_ended is not None and idle >= self.sweep_interval:
+                    candidates[user_id] = False
+        # セッションの確認（共有ストアへの問い合わせ）はロックの外で行う
+        due = [user_id for user_id, flush in candidates.items() if flush or is_ended(user_id)]
+        with self._lock:
+            drained = {user_id: self._buffers.pop(user_id) for user_id in due if user_id in self._buffers}
+            self._sweeps += 1
+            self._swept_users += len(drained)
+        return drained
+
+    def start_sweeper(self, sweep, *args):
+        """
+        見回りのスレッドを開始する（gunicornのワーカーごとに1本）。sweep(*args)をsweep_interval秒ごとに呼ぶ
+        """
+        if self._sweeper_thread is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper_thread is not None:
+                return
+            self._sweeper_thread = threading.Thread(
+                target=self._sweep_loop, args=(sweep, args), name='focus-series-sweeper', daemon=True
+            )
+        self._sweeper_thread.start()
+
+    def _sweep_loop(self, sweep, args):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                sweep(*args)
+            except Exception as e:
+                print(f'Error sweeping focus series: {e}')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._buffers),
+                'samples': sum(len(samples) for samples in self._buffers.values()),
+                'sweeps': self._sweeps,
+                'swept_users': self._swept_users,
+                'sweep_interval': self.sweep_interval,
+                'idle_timeout': self.idle_timeout
+            }
+
+
+# プロセス全体で共有するバッファ
+focus_buffer = FocusSeriesBuffer()
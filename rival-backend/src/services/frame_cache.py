@@ -0,0 +1,117 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+# --- 設定 ---
+FRAME_CACHE_ENABLED = os.environ.get('FRAME_CACHE_ENABLED', 'true').lower() == 'true'
+# 前回解析したフレームとのハミング距離（64ビット中）がこの値以下なら結果を再利用する
+FRAME_CACHE_MAX_DISTANCE = int(os.environ.get('FRAME_CACHE_MAX_DISTANCE', 4))
+# 再利用できる結果の最大経過秒数（これを超えたら必ず再解析する）
+FRAME_CACHE_MAX_AGE = float(os.environ.get('FRAME_CACHE_MAX_AGE', 10))
+# キャッシュを保持するセッション数の上限
+FRAME_CACHE_MAX_SESSIONS = int(os.environ.get('FRAME_CACHE_MAX_SESSIONS', 10000))
+# --- 設定ここまで ---
+
+HASH_SIZE = 8
+
+
+def compute_frame_hash(image):
+    """
+    画像の差分ハッシュ（dHash, 64ビット）を計算する
+    image: JPEG等のバイト列、またはPIL.Image
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(image))
+        # JPEGはDCTスケーリングで縮小デコードし、フル解像度の展開を避ける
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+
+    pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+
+    frame_hash = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            frame_hash = (frame_hash << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return frame_hash
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class FrameDedupCache:
+    """
+    セッションごとに直前に解析したフレームのハッシュと結果を保持し、
+    ほぼ同一のフレームに対する顔検出呼び出しを省略する
+    """
+
+    def __init__(self, max_distance=FRAME_CACHE_MAX_DISTANCE, max_age=FRAME_CACHE_MAX_AGE,
+                 max_sessions=FRAME_CACHE_MAX_SESSIONS):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+
+    def lookup(self, session_key, frame_hash):
+        """
+        再利用できる結果があれば返す（なければNone）
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            cached_hash, result, analyzed_at = entry
+            if now - analyzed_at > self.max_age:
+                self._stale += 1
+                self._misses += 1
+                return None
+            if hamming_distance(cached_hash, frame_hash) > self.max_distance:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._entries.move_to_end(session_key)
+            return result
+
+    def store(self, session_key, frame_hash, result):
+        """
+        解析したフレームのハッシュと結果を保存する
+        """
+        with self._lock:
+            self._entries[session_key] = (frame_hash, result, time.time())
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': FRAME_CACHE_ENABLED,
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale_misses': self._stale,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'sessions': len(self._entries),
+                'max_distance': self.max_distance,
+                'max_age_seconds': self.max_age
+            }
+
+
+# プロセス全体で共有するキャッシュ
+frame_cache = FrameDedupCache()
@@ -0,0 +1,133 @@
+import io
+import os
+import threading
+import time
+
+from PIL import Image
+
+# --- 設定 ---
+FRAME_PREPROCESS_ENABLED = os.environ.get('FRAME_PREPROCESS_ENABLED', 'true').lower() == 'true'
+# 長辺をこのピクセル数以下に縮小する（顔の在席判定にはこれで十分）
+FRAME_MAX_EDGE = int(os.environ.get('FRAME_MAX_EDGE', 320))
+# 再エンコード時のJPEG品質
+FRAME_JPEG_QUALITY = int(os.environ.get('FRAME_JPEG_QUALITY', 75))
+# 既にこのサイズ以下の小さいJPEGは再エンコードせずにそのまま送る
+FRAME_PASSTHROUGH_BYTES = int(os.environ.get('FRAME_PASSTHROUGH_BYTES', 24 * 1024))
+# --- 設定ここまで ---
+
+
+class PreparedFrame:
+    """
+    前処理済みのフレーム
+    image: デコード済みの画像（ハッシュ計算などで再利用する）
+    data: 顔検出に送るバイト列
+    timings: 各ステージの処理時間（ミリ秒）
+    """
+
+    def __init__(self, image, data, original_bytes, reencoded, timings):
+        self.image = image
+        self.data = data
+        self.original_bytes = original_bytes
+        self.reencoded = reencoded
+        self.timings = timings
+
+
+class PreprocessStats:
+    """
+    前処理ステージごとの累計時間と転送バイト数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._reencoded = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._stage_ms = {}
+        # ステージごとの計測回数（hash・detectは前処理が無効でも記録されるためフレーム数とは一致しない）
+        self._stage_samples = {}
+
+    def record(self, frame):
+        with self._lock:
+            self._frames += 1
+            self._reencoded += 1 if frame.reencoded else 0
+            self._bytes_in += frame.original_bytes
+            self._bytes_out += len(frame.data)
+            for stage, elapsed in frame.timings.items():
+                self._add_stage(stage, elapsed)
+
+    def record_stage(self, stage, elapsed):
+        with self._lock:
+            self._add_stage(stage, elapsed)
+
+    def _add_stage(self, stage, elapsed):
+        self._stage_ms[stage] = self._stage_ms.get(stage, 0) + elapsed
+        self._stage_samples[stage] = self._stage_samples.get(stage, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': FRAME_PREPROCESS_ENABLED,
+                'frames': self._frames,
+                'reencoded_frames': self._reencoded,
+                'bytes_in': self._bytes_in,
+                'bytes_out': self._bytes_out,
+                'bytes_saved': self._bytes_in - self._bytes_out,
+                'avg_stage_ms': {
+                    stage: round(total / self._stage_samples[stage], 3) for stage, total in self._stage_ms.items()
+                },
+                'max_edge': FRAME_MAX_EDGE,
+                'jpeg_quality': FRAME_JPEG_QUALITY
+            }
+
+
+preprocess_stats = PreprocessStats()
+
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def preprocess_frame(image_bytes, max_edge=FRAME_MAX_EDGE, quality=FRAME_JPEG_QUALITY):
+    """
+    フレームを1回だけデコードし、長辺がmax_edgeを超える場合は縮小して再エンコードする
+    既に小さいJPEGはそのまま通す
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    original_format = image.format
+    small_enough = max(image.size) <= max_edge
+    if original_format == 'JPEG' and not small_enough:
+        # DCTスケーリングで目標サイズに近い解像度までデコード時に縮小する
+        scale = max_edge / max(image.size)
+        image.draft('RGB', (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    image.load()
+    timings['decode'] = _elapsed_ms(start)
+
+    if small_enough and original_format == 'JPEG' and len(image_bytes) <= FRAME_PASSTHROUGH_BYTES:
+        frame = PreparedFrame(image, image_bytes, len(image_bytes), False, timings)
+        preprocess_stats.record(frame)
+        return frame
+
+    start = time.perf_counter()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.BILINEAR)
+    timings['resize'] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    data = buffer.getvalue()
+    timings['encode'] = _elapsed_ms(start)
+
+    # 縮小不要で再エンコードしても小さくならない場合は元のバイト列を使う
+    if small_enough and original_format == 'JPEG' and len(data) >= len(image_bytes):
+        data = image_bytes
+
+    frame = PreparedFrame(image, data, len(image_bytes), data is not image_bytes, timings)
+    preprocess_stats.record(frame)
+    return frame
@@ -0,0 +1,103 @@
+import json
+import re
+import uuid
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjsonがない環境では標準のjsonを使う
+    orjson = None
+
+
+class RawJSON:
+    """
+    シリアライズ済みのJSON文字列（DBのJSON列など）。レスポンスにデコードせずそのまま埋め込む
+    内容が正しいJSONであることは呼び出し側が保証する
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    orjsonがあればorjsonで、なければ標準のjsonでレスポンスを作るJSONプロバイダ
+    RawJSONの値はプレースホルダーを使ってシリアライズ後の文字列に差し込む
+    （キーの並び替え・日時の形式など、それ以外の出力はFlask標準と同じ）
+    """
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+
+    def _encode(self, obj, kwargs):
+        """
+        シリアライズしてRawJSONを差し込む。orjsonの場合はbytes、標準のjsonの場合はstrを返す
+        """
+        raw_values = []
+        default = kwargs.pop('default', self.default)
+        placeholder = f'__raw_json_{uuid.uuid4().hex}_'
+
+        def encode_default(value):
+            if isinstance(value, RawJSON):
+                raw_values.append(value.text or 'null')
+                return f'{placeholder}{len(raw_values) - 1}'
+            return default(value)
+
+        if self.use_orjson:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if kwargs.get('sort_keys', self.sort_keys):
+                option |= orjson.OPT_SORT_KEYS
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            output = orjson.dumps(obj, default=encode_default, option=option)
+            if raw_values:
+                raw_bytes = [raw.encode('utf-8') for raw in raw_values]
+                output = re.sub(
+                    b'"' + placeholder.encode() + rb'(\d+)"', lambda match: raw_bytes[int(match.group(1))], output
+                )
+            return output
+
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        output = json.dumps(obj, default=encode_default, **kwargs)
+        if raw_values:
+            output = re.sub(f'"{placeholder}(\\d+)"', lambda match: raw_values[int(match.group(1))], output)
+        return output
+
+    def dumps(self, obj, **kwargs):
+        output = self._encode(obj, kwargs)
+        return output.decode('utf-8') if isinstance(output, bytes) else output
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """
+        jsonifyから呼ばれる。orjsonの出力はbytesのまま返し、str経由の再エンコードを避ける
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        else:
+            dump_args['separators'] = (',', ':')
+        output = self._encode(obj, dump_args)
+        if isinstance(output, str):
+            output = output.encode('utf-8')
+        return self._app.response_class(output + b'\n', mimetype=self.mimetype)
+
+
+def supports_raw_json():
+    """
+    現在のアプリのJSONプロバイダがRawJSONを埋め込めるか（FastJSONProviderを登録していないアプリでは使わない）
+    """
+    return isinstance(current_app.json, FastJSONProvider)
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- 設定 ---
+# ランキングの結果を再利用する最大秒数（日報・ユーザーの書き込みがあれば即座に破棄する）
+RANKING_CACHE_TTL = float(os.environ.get('RANKING_CACHE_TTL', 30))
+# --- 設定ここまで ---
+
+
+class RankingCache:
+    """
+    ランキング（4種類をまとめた結果）とそのETagを保持するキャッシュ
+    日報・ユーザーの書き込み時にinvalidate()でバージョンを進めて破棄する
+    キャッシュはワーカープロセスごとに持つため、呼び出し側はDB上の版（件数・最終更新日時）を
+    keyに含め、他のワーカーでの書き込みも次のリクエストで反映されるようにする
+    """
+
+    def __init__(self, ttl=RANKING_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entry = None
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, key, loader):
+        """
+        keyに対応する(結果, ETag)を返す。なければloader()で作成して保存する
+        """
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry['key'] == key and entry['version'] == self._version \
+                    and time.time() - entry['created_at'] <= self.ttl:
+                self._hits += 1
+                return entry['data'], entry['etag']
+            self._misses += 1
+            version = self._version
+
+        data = loader()
+        etag = hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+        with self._lock:
+            # 読み込み中に書き込みがあった場合は古い結果を保存しない
+            if version == self._version:
+                self._entry = {
+                    'key': key, 'version': version, 'data': data, 'etag': etag, 'created_at': time.time()
+                }
+        return data, etag
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._entry = None
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'invalidations': self._invalidations,
+                'ttl_seconds': self.ttl
+            }
+
+
+# プロセス全体で共有するキャッシュ
+ranking_cache = RankingCache()
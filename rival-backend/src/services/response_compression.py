@@ -0,0 +1,171 @@
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotliがない環境ではgzip（とzstd）のみ
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandardがない環境ではgzip（とbrotli）のみ
+    zstandard = None
+
+# --- 設定 ---
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+# この大きさ（バイト）未満のレスポンスは圧縮しない
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3))
+# ETagの付いたレスポンスの圧縮結果を再利用する件数とバイト数の上限（0で無効）
+COMPRESSION_CACHE_MAX_ENTRIES = int(os.environ.get('COMPRESSION_CACHE_MAX_ENTRIES', 256))
+COMPRESSION_CACHE_MAX_BYTES = int(os.environ.get('COMPRESSION_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# --- 設定ここまで ---
+
+# 圧縮する価値のあるContent-Type
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+}
+
+
+class ResponseCompressor:
+    """
+    Accept-Encodingに応じてレスポンス本文をbrotli / zstd / gzipで圧縮するafter_requestフック
+    小さいレスポンス、圧縮済み・ストリーミングのレスポンス、圧縮に向かないContent-Typeは素通しする
+    """
+
+    def __init__(self, min_size=COMPRESSION_MIN_SIZE, cache_max_entries=COMPRESSION_CACHE_MAX_ENTRIES,
+                 cache_max_bytes=COMPRESSION_CACHE_MAX_BYTES):
+        self.min_size = min_size
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self._compressors = OrderedDict()
+        if brotli is not None:
+            self._compressors['br'] = lambda data: brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+        if zstandard is not None:
+            self._compressors['zstd'] = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress
+        self._compressors['gzip'] = lambda data: gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._compressed = {encoding: 0 for encoding in self._compressors}
+        self._skipped = {
+            'small': 0, 'mimetype': 0, 'encoded': 0, 'streamed': 0, 'not_accepted': 0, 'incompressible': 0
+        }
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._cpu_ms_total = 0
+        self._compress_runs = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def init_app(self, app):
+        if COMPRESSION_ENABLED:
+            app.after_request(self.compress_response)
+
+    def _skip(self, reason, response):
+        with self._lock:
+            self._skipped[reason] += 1
+        return response
+
+    def compress_response(self, response):
+        if request.method == 'HEAD' or response.status_code != 200:
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            return self._skip('streamed', response)
+        if 'Content-Encoding' in response.headers:
+            return self._skip('encoded', response)
+        mimetype = response.mimetype or ''
+        if not (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES):
+            return self._skip('mimetype', response)
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return self._skip('small', response)
+
+        # クライアントのq値を考慮して、使える方式の中から選ぶ（同じq値ならbr, zstd, gzipの順）
+        encoding = request.accept_encodings.best_match(list(self._compressors))
+        if encoding is None:
+            return self._skip('not_accepted', response)
+
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        cache_key = (request.full_path, etag, encoding) if etag and self.cache_max_entries > 0 else None
+        compressed = self._cache_get(cache_key) if cache_key else None
+        if compressed is None:
+            start = time.thread_time()
+            compressed = self._compressors[encoding](data)
+            cpu_ms = (time.thread_time() - start) * 1000
+            with self._lock:
+                self._cpu_ms_total += cpu_ms
+                self._compress_runs += 1
+            if len(compressed) >= len(data):
+                return self._skip('incompressible', response)
+            if cache_key:
+                self._cache_put(cache_key, compressed)
+
+        with self._lock:
+            self._compressed[encoding] += 1
+            self._bytes_in += len(data)
+            self._bytes_out += len(compressed)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # 圧縮した表現はバイト列が変わるため弱いETagにする（If-None-Matchは弱い比較で一致する）
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _cache_get(self, key):
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is None:
+                self._cache_misses += 1
+                return None
+            self._cache_hits += 1
+            self._cache.move_to_end(key)
+            return compressed
+
+    def _cache_put(self, key, compressed):
+        if len(compressed) > self.cache_max_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                self._cache_bytes -= len(self._cache.pop(key))
+            self._cache[key] = compressed
+            self._cache_bytes += len(compressed)
+            while len(self._cache) > self.cache_max_entries or self._cache_bytes > self.cache_max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': COMPRESSION_ENABLED,
+                'encodings': list(self._compressors),
+                'min_size': self.min_size,
+                'compressed': dict(self._compressed),
+                'skipped': dict(self._skipped),
+                'bytes_in': self._bytes_in,
+                'bytes_out': self._bytes_out,
+                'bytes_saved': self._bytes_in - self._bytes_out,
+                'ratio': round(self._bytes_out / self._bytes_in, 4) if self._bytes_in else 0,
+                'cpu_ms_total': round(self._cpu_ms_total, 3),
+                # キャッシュから返した分は含まない（実際に圧縮した回数あたりのCPU時間）
+                'avg_cpu_ms': round(self._cpu_ms_total / self._compress_runs, 3) if self._compress_runs else 0,
+                'cache_hits': self._cache_hits,
+                'cache_misses': self._cache_misses,
+                'cache_entries': len(self._cache),
+                'cache_bytes': self._cache_bytes
+            }
+
+
+# プロセス全体で共有する圧縮フック
+response_compressor = ResponseCompressor()
@@ -0,0 +1,297 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# --- 設定 ---
+# memory: プロセス内のみ / sqlite: 同一ホストの全ワーカーで共有（WALモード）
+SESSION_STORE_BACKEND = os.environ.get('CONCENTRATION_SESSION_BACKEND', 'sqlite')
+SESSION_DB_PATH = os.environ.get(
+    'CONCENTRATION_SESSION_DB_PATH',
+    os.path.join(tempfile.gettempdir(), 'rival_concentration_sessions.db')
+)
+# 最後の検出からこの秒数が経過したセッションは破棄する
+SESSION_IDLE_TTL = int(os.environ.get('CONCENTRATION_SESSION_TTL', 1800))
+# 保持するセッション数の上限（超えた場合は最も古いものから破棄）
+SESSION_MAX_ENTRIES = int(os.environ.get('CONCENTRATION_SESSION_MAX', 10000))
+# SQLiteで期限切れセッションを掃除する間隔（秒）
+SESSION_PURGE_INTERVAL = int(os.environ.get('CONCENTRATION_SESSION_PURGE_INTERVAL', 60))
+# --- 設定ここまで ---
+
+
+class SessionStore(ABC):
+    """
+    集中度検出セッションの保存先インターフェース
+    セッションは以下のキーを持つ辞書で表す
+        start_time, last_detection: UNIX時刻（秒）
+        total_detections, present_detections: 検出回数
+    """
+
+    @abstractmethod
+    def start(self, user_id):
+        """セッションを開始（既存のセッションはリセット）して返す"""
+
+    @abstractmethod
+    def end(self, user_id):
+        """セッションを終了する"""
+
+    @abstractmethod
+    def get(self, user_id):
+        """セッションを返す（存在しない・期限切れの場合はNone）"""
+
+    def record_detection(self, user_id, face_detected):
+        """検出結果を1件アトミックに加算し、更新後のセッションを返す"""
+        return self.record_detections(user_id, 1, 1 if face_detected else 0)
+
+    @abstractmethod
+    def record_detections(self, user_id, total, present):
+        """検出回数をまとめてアトミックに加算し、更新後のセッションを返す"""
+
+    @abstractmethod
+    def stats(self):
+        """ストアの状態を返す"""
+
+
+def _new_session(now):
+    return {
+        'start_time': now,
+        'total_detections': 0,
+        'present_detections': 0,
+        'last_detection': now
+    }
+
+
+class MemorySessionStore(SessionStore):
+    """
+    プロセス内の辞書に保存するストア（単一ワーカー・開発用）
+    最終アクセス順に並べ、期限切れと上限超過のセッションを先頭から破棄する
+    """
+
+    def __init__(self, ttl=SESSION_IDLE_TTL, max_entries=SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def _evict(self, now):
+        cutoff = now - self.ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session['last_detection'] >= cutoff and len(self._sessions) <= self.max_entries:
+                break
+            self._sessions.popitem(last=False)
+            self._evictions += 1
+
+    def _get_live(self, user_id, now):
+        session = self._sessions.get(user_id)
+        if session is not None and session['last_detection'] < now - self.ttl:
+            del self._sessions[user_id]
+            self._evictions += 1
+            return None
+        return session
+
+    def start(self, user_id):
+        now = time.time()
+        with self._lock:
+            session = _new_session(now)
+            self._sessions[user_id] = session
+            self._sessions.move_to_end(user_id)
+            self._evict(now)
+            return dict(session)
+
+    def end(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def get(self, user_id):
+        with self._lock:
+            session = self._get_live(user_id, time.time())
+            return dict(session) if session is not None else None
+
+    def record_detections(self, user_id, total, present):
+        now = time.time()
+        with self._lock:
+            session = self._get_live(user_id, now)
+            if session is None:
+                session = _new_session(now)
+                self._sessions[user_id] = session
+            session['total_detections'] += total
+            session['present_detections'] += present
+            session['last_detection'] = now
+            self._sessions.move_to_end(user_id)
+            self._evict(now)
+            return dict(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'evictions': self._evictions,
+                'ttl_seconds': self.ttl,
+                'max_entries': self.max_entries
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    WALモードのSQLiteに保存するストア
+    同一ホスト上のgunicornワーカー間でセッションを共有する
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_IDLE_TTL, max_entries=SESSION_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0
+        self._evictions = 0
+
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS concentration_session (
+                user_id TEXT PRIMARY KEY,
+                start_time REAL NOT NULL,
+                total_detections INTEGER NOT NULL DEFAULT 0,
+                present_detections INTEGER NOT NULL DEFAULT 0,
+                last_detection REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_concentration_session_last_detection
+            ON concentration_session (last_detection)
+        """)
+
+    def _connect(self):
+        # sqlite3の接続はスレッド間で共有できないため、スレッドごとに保持する
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_session(row):
+        if row is None:
+            return None
+        return {
+            'start_time': row[0],
+            'total_detections': row[1],
+            'present_detections': row[2],
+            'last_detection': row[3]
+        }
+
+    def _maybe_purge(self, now):
+        """期限切れと上限超過のセッションを一定間隔で削除する"""
+        if now - self._last_purge < SESSION_PURGE_INTERVAL:
+            return
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                expired = conn.execute(
+                    'DELETE FROM concentration_session WHERE last_detection < ?',
+                    (now - self.ttl,)
+                ).rowcount
+                overflow = conn.execute("""
+                    DELETE FROM concentration_session WHERE user_id IN (
+                        SELECT user_id FROM concentration_session
+                        ORDER BY last_detection DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,)).rowcount
+                conn.execute('COMMIT')
+                self._evictions += expired + overflow
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            self._purge_lock.release()
+
+    def start(self, user_id):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("""
+            INSERT INTO concentration_session
+                (user_id, start_time, total_detections, present_detections, last_detection)
+            VALUES (?, ?, 0, 0, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                start_time = excluded.start_time,
+                total_detections = 0,
+                present_detections = 0,
+                last_detection = excluded.last_detection
+        """, (user_id, now, now))
+        self._maybe_purge(now)
+        return _new_session(now)
+
+    def end(self, user_id):
+        self._connect().execute('DELETE FROM concentration_session WHERE user_id = ?', (user_id,))
+
+    def get(self, user_id):
+        row = self._connect().execute("""
+            SELECT start_time, total_detections, present_detections, last_detection
+            FROM concentration_session WHERE user_id = ? AND last_detection >= ?
+        """, (user_id, time.time() - self.ttl)).fetchone()
+        return self._row_to_session(row)
+
+    def record_detections(self, user_id, total, present):
+        now = time.time()
+        cutoff = now - self.ttl
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 期限切れのセッションは新しいセッションとしてやり直す
+            conn.execute("""
+                INSERT INTO concentration_session
+                    (user_id, start_time, total_detections, present_detections, last_detection)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    start_time = CASE WHEN last_detection < ? THEN excluded.start_time ELSE start_time END,
+                    total_detections = CASE WHEN last_detection < ?
+                        THEN excluded.total_detections ELSE total_detections + excluded.total_detections END,
+                    present_detections = CASE WHEN last_detection < ?
+                        THEN excluded.present_detections ELSE present_detections + excluded.present_detections END,
+                    last_detection = excluded.last_detection
+            """, (user_id, now, total, present, now, cutoff, cutoff, cutoff))
+            row = conn.execute("""
+                SELECT start_time, total_detections, present_detections, last_detection
+                FROM concentration_session WHERE user_id = ?
+            """, (user_id,)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._maybe_purge(now)
+        return self._row_to_session(row)
+
+    def stats(self):
+        count = self._connect().execute('SELECT COUNT(*) FROM concentration_session').fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'sessions': count,
+            'evictions': self._evictions,
+            'ttl_seconds': self.ttl,
+            'max_entries': self.max_entries
+        }
+
+
+def create_session_store(backend=SESSION_STORE_BACKEND):
+    """
+    設定に応じたセッションストアを作成する
+    """
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
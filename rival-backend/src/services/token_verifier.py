@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import firebase_admin
+from firebase_admin import auth
+
+# --- 設定 ---
+TOKEN_CACHE_ENABLED = os.environ.get('TOKEN_CACHE_ENABLED', 'true').lower() == 'true'
+# 検証済みトークンを保持する件数の上限
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))
+# 検証結果を再利用する最大秒数（トークンの有効期限 exp を超えて再利用することはない）
+TOKEN_CACHE_MAX_TTL = float(os.environ.get('TOKEN_CACHE_MAX_TTL', 3600))
+# Googleの公開鍵（証明書）を取得し直す間隔（0で先読みしない）
+TOKEN_CERT_PREFETCH_INTERVAL = float(os.environ.get('TOKEN_CERT_PREFETCH_INTERVAL', 3600))
+# --- 設定ここまで ---
+
+# Firebase IDトークンの署名に使われる公開鍵
+ID_TOKEN_CERT_URI = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+
+def _get_cert_request():
+    """
+    firebase_adminが署名の検証に使うHTTPリクエスト（公開鍵のキャッシュ付き）を返す
+    firebase_adminは公開鍵を取得する公開APIを持たないため内部の属性をたどる。見つからなければNone
+    """
+    get_client = getattr(auth, '_get_client', None)
+    if get_client is None:
+        return None
+    client = get_client(firebase_admin.get_app())
+    return getattr(getattr(client, '_token_verifier', None), 'request', None)
+
+
+class TokenVerifier:
+    """
+    Firebase IDトークンの検証結果をトークンのハッシュをキーにキャッシュする
+    同じトークンでの2回目以降のリクエストでは署名の検証を省略する
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES, max_ttl=TOKEN_CACHE_MAX_TTL,
+                 prefetch_interval=TOKEN_CERT_PREFETCH_INTERVAL, verify=None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.prefetch_interval = prefetch_interval
+        self._verify = verify
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._prefetch_thread = None
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+        self._prefetches = 0
+        self._prefetch_errors = 0
+        self._last_prefetch = None
+        self._prefetch_supported = True
+
+    def verify(self, token):
+        """
+        トークンを検証してデコード済みのクレームを返す（不正なトークンは例外）
+        """
+        self._start_prefetch()
+        if not TOKEN_CACHE_ENABLED:
+            return self._verify_signature(token)
+
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if now < expires_at:
+                    self._hits += 1
+                    self._entries.move_to_end(key)
+                    return claims
+                del self._entries[key]
+            self._misses += 1
+
+        try:
+            claims = self._verify_signature(token)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+
+        expires_at = min(float(claims.get('exp', 0)), now + self.max_ttl)
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def _verify_signature(self, token):
+        return (self._verify or auth.verify_id_token)(token)
+
+    def _start_prefetch(self):
+        """
+        初回の検証時に公開鍵の先読みスレッドを開始する（gunicornのワーカーごとに1本）
+        """
+        if self._prefetch_thread is not None or self.prefetch_interval <= 0:
+            return
+        with self._lock:
+            if self._prefetch_thread is not None:
+                return
+            self._prefetch_thread = threading.Thread(
+                target=self._prefetch_loop, name='token-cert-prefetch', daemon=True
+            )
+        self._prefetch_thread.start()
+
+    def _prefetch_loop(self):
+        while self._prefetch_supported:
+            self.prefetch_certificates()
+            time.sleep(self.prefetch_interval)
+
+    def prefetch_certificates(self):
+        """
+        firebase_adminが署名の検証に使うHTTPキャッシュに公開鍵を読み込んでおき、
+        リクエスト処理中に証明書の取得を待たないようにする
+        """
+        try:
+            request = _get_cert_request()
+            if request is None:
+                # firebase_adminの内部構成が変わった場合は先読みをやめる（検証時に通常どおり取得される）
+                with self._lock:
+                    self._prefetch_supported = False
+                return
+            request(ID_TOKEN_CERT_URI, method='GET')
+            with self._lock:
+                self._prefetches += 1
+                self._last_prefetch = time.time()
+        except Exception as e:
+            with self._lock:
+                self._prefetch_errors += 1
+            print(f'Error prefetching token certificates: {e}')
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': TOKEN_CACHE_ENABLED,
+                'hits': self._hits,
+                'misses': self._misses,
+                'failures': self._failures,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'entries': len(self._entries),
+                'cert_prefetch_supported': self._prefetch_supported,
+                'cert_prefetches': self._prefetches,
+                'cert_prefetch_errors': self._prefetch_errors,
+                'last_cert_prefetch': self._last_prefetch
+            }
+
+
+# プロセス全体で共有する検証器
+token_verifier = TokenVerifier()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+# 外部サービス（Gemini）を呼ばず、セッションはプロセス内に保持する
+os.environ.setdefault('GEMINI_STUB', 'true')
+os.environ.setdefault('CONCENTRATION_SESSION_BACKEND', 'memory')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+
+from src.models.user import db
+from src.routes.concentration import concentration_bp
+from src.routes.curriculum import curriculum_bp
+from src.routes.user import user_bp
+from src.services.json_provider import FastJSONProvider
+
+
+@pytest.fixture
+def app(tmp_path):
+    """テストごとに一時ファイルのSQLiteを使うアプリ"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.json = FastJSONProvider(app)
+    db.init_app(app)
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(curriculum_bp, url_prefix='/api')
+    app.register_blueprint(concentration_bp, url_prefix='/api/concentration')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,42 @@
+import pytest
+
+from src.routes import auth
+from src.services.token_verifier import token_verifier
+
+
+@pytest.fixture
+def auth_required(monkeypatch):
+    """AUTH_REQUIRED=true の状態で、'valid-*' のトークンだけを正しいものとして扱う"""
+    def verify(token):
+        if not token.startswith('valid-'):
+            raise ValueError('invalid token')
+        return {'uid': token[len('valid-'):], 'exp': 4102444800}
+
+    monkeypatch.setattr(auth, 'AUTH_REQUIRED', True)
+    monkeypatch.setattr(token_verifier, '_verify', verify)
+    monkeypatch.setattr(token_verifier, 'prefetch_interval', 0)
+
+
+def test_request_without_token_is_rejected(client, auth_required):
+    response = client.post('/api/concentration/detect', data=b'\xff\xd8', content_type='image/jpeg')
+
+    assert response.status_code == 401
+
+
+def test_bearer_token_is_accepted(client, auth_required):
+    response = client.get('/api/concentration/metrics', headers={'Authorization': 'Bearer valid-alice'})
+
+    assert response.status_code == 200
+
+
+def test_access_token_query_is_accepted(client, auth_required):
+    # WebSocket（/stream）はヘッダーを付けられないため ?access_token= で送る
+    response = client.get('/api/concentration/metrics?access_token=valid-alice')
+
+    assert response.status_code == 200
+
+
+def test_invalid_token_is_rejected(client, auth_required):
+    response = client.get('/api/concentration/metrics', headers={'Authorization': 'Bearer forged'})
+
+    assert response.status_code == 401
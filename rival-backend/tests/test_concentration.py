@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.routes import concentration
+
+
+@pytest.fixture
+def detect_face(monkeypatch):
+    """顔検出の結果を固定する（AWS・OpenCVを使わない）"""
+    def analyze_frame(image_bytes, session_key=None):
+        return {'face_detected': True, 'confidence': 99.0, 'error': None, 'cached': False, 'timings': {}}
+    monkeypatch.setattr(concentration, 'analyze_frame', analyze_frame)
+
+
+def test_detect_with_user_id_records_focus_sample(client, detect_face):
+    # 検出は検出プールのスレッドで実行される（アプリケーションコンテキストがない）
+    response = client.post(
+        '/api/concentration/detect?userId=alice', data=b'\xff\xd8jpeg', content_type='image/jpeg'
+    )
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['faceDetected'] is True
+    assert body['totalDetections'] == 1
+    assert concentration.focus_buffer.drain('alice', force=True)
+
+
+def test_detect_rejects_non_object_json(client):
+    response = client.post('/api/concentration/detect', json=['image'])
+
+    assert response.status_code == 400
+
+
+def test_unknown_detector_backend_fails_at_import():
+    env = dict(os.environ, FACE_DETECTOR_BACKEND='nope')
+    result = subprocess.run(
+        [sys.executable, '-c', 'import src.services.concentration_analyzer'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode != 0
+    assert 'Unknown face detector backend: nope' in result.stderr
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+
+def _wait_for_job(client, location, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(location).get_json()
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f'job did not finish within {timeout}s: {job}')
+
+
+def _create_curriculum(client, user_id, goal, duration_days=3):
+    response = client.post(f'/api/users/{user_id}/curriculums', json={
+        'goal': goal, 'duration_days': duration_days, 'use_cache': False
+    })
+    assert response.status_code == 202, response.get_json()
+    return _wait_for_job(client, response.headers['Location'])
+
+
+def test_create_curriculum_runs_as_job(client):
+    # GEMINI_STUB=true（conftest）なのでGeminiは呼ばない
+    response = client.post('/api/users/alice/curriculums', json={'goal': 'Python', 'duration_days': 3})
+
+    assert response.status_code == 202
+    accepted = response.get_json()
+    assert accepted['status'] == 'queued'
+    assert response.headers['Location'] == f"/api/curriculum-jobs/{accepted['job_id']}"
+
+    job = _wait_for_job(client, response.headers['Location'])
+    assert job['status'] == 'succeeded', job
+    assert job['curriculum']['goal'] == 'Python'
+    assert job['curriculum']['duration_days'] == 3
+
+    progress = client.get(f"/api/curriculums/{job['curriculum_id']}/progress").get_json()
+    assert [day['day'] for day in progress] == [1, 2, 3]
+
+
+def test_regenerate_curriculum_updates_existing_curriculum(client):
+    created = _create_curriculum(client, 'alice', 'Python')
+
+    response = client.post(f"/api/curriculums/{created['curriculum_id']}/regenerate", json={
+        'goal': 'Rust', 'duration_days': 2, 'use_cache': False
+    })
+    assert response.status_code == 202, response.get_json()
+    job = _wait_for_job(client, response.headers['Location'])
+
+    assert job['status'] == 'succeeded', job
+    assert job['curriculum_id'] == created['curriculum_id']
+    assert job['curriculum']['goal'] == 'Rust'
+
+
+def test_curriculum_list_pages_with_cursor(client):
+    ids = [_create_curriculum(client, 'alice', f'goal {index}', duration_days=1)['curriculum_id'] for index in range(3)]
+
+    first = client.get('/api/users/alice/curriculums?limit=2')
+    assert len(first.get_json()) == 2
+    cursor = first.headers['X-Next-Cursor']
+
+    second = client.get(f'/api/users/alice/curriculums?limit=2&cursor={cursor}')
+    assert 'X-Next-Cursor' not in second.headers
+
+    listed = [item['curriculum_id'] for item in first.get_json() + second.get_json()]
+    # 新しい順に重複・欠落なく返る
+    assert listed == list(reversed(ids))
+
+
+def test_curriculum_get_returns_304_until_changed(client):
+    curriculum_id = _create_curriculum(client, 'alice', 'Python')['curriculum_id']
+    first = client.get(f'/api/curriculums/{curriculum_id}')
+    etag = first.headers['ETag']
+
+    assert client.get(f'/api/curriculums/{curriculum_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/api/curriculums/{curriculum_id}', json={'status': 'paused'})
+    changed = client.get(f'/api/curriculums/{curriculum_id}', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['status'] == 'paused'
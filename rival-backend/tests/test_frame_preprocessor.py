@@ -0,0 +1,14 @@
+from src.services.frame_preprocessor import PreprocessStats
+
+
+def test_stage_averages_use_each_stage_sample_count():
+    stats = PreprocessStats()
+    # 前処理が無効な場合はhash・detectだけが記録される（前処理済みフレームは0件）
+    stats.record_stage('hash', 2.0)
+    stats.record_stage('hash', 4.0)
+    stats.record_stage('detect', 30.0)
+
+    snapshot = stats.snapshot()
+
+    assert snapshot['frames'] == 0
+    assert snapshot['avg_stage_ms'] == {'hash': 3.0, 'detect': 30.0}
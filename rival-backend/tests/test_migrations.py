@@ -0,0 +1,47 @@
+from datetime import date, datetime
+
+from sqlalchemy import inspect, text
+
+from src.models.curriculum import CurriculumProgress
+from src.models.migrations import run_migrations
+from src.models.user import DailyReport, LeaderboardTotal, User, db
+
+
+def _report(report_id, updated_at, study_time):
+    return DailyReport(
+        report_id=report_id, user_id='alice', date=date(2024, 1, 5), total_study_time=study_time,
+        total_focus_time=0, updated_at=updated_at
+    )
+
+
+def test_lookup_index_migration_removes_duplicate_rows(app):
+    with app.app_context():
+        # 一意インデックスがなかった頃のデータベース（同じユーザー・日付の日報が重複している）
+        db.session.execute(text('DROP INDEX uq_daily_report_user_date'))
+        db.session.execute(text('DROP INDEX uq_curriculum_progress_curriculum_day'))
+        db.session.add_all([
+            User(user_id='alice', name='Alice', email='alice@example.com'),
+            _report('old', datetime(2024, 1, 5, 9), 600),
+            _report('new', datetime(2024, 1, 5, 21), 3600),
+            LeaderboardTotal(user_id='alice', total_study_time=4200, total_focus_time=0),
+        ])
+        for progress_id, updated_at in (('p1', datetime(2024, 1, 1)), ('p2', datetime(2024, 1, 2))):
+            db.session.add(CurriculumProgress(
+                progress_id=progress_id, curriculum_id='c', user_id='alice', day=1, updated_at=updated_at
+            ))
+        db.session.commit()
+
+        assert run_migrations() == [1, 2, 3]
+
+        assert [report.report_id for report in DailyReport.query.all()] == ['new']
+        assert [progress.progress_id for progress in CurriculumProgress.query.all()] == ['p2']
+        # 重複を含んでいた集計は空にされ、起動時に日報から作り直される
+        assert LeaderboardTotal.query.count() == 0
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('daily_report')}
+        assert 'uq_daily_report_user_date' in indexes
+
+
+def test_migrations_are_recorded_once(app):
+    with app.app_context():
+        assert run_migrations() == [1, 2, 3]
+        assert run_migrations() == []
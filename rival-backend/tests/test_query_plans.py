@@ -0,0 +1,71 @@
+"""
+よく使う検索がインデックスを使っているかを EXPLAIN QUERY PLAN で確認するテスト（SQLite）
+モデルに定義したインデックスやマイグレーションを変更したときに、検索がテーブル全体の走査に
+戻っていないことを確認する
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import event, func
+
+from src.models.curriculum import Curriculum, CurriculumProgress
+from src.models.migrations import run_migrations
+from src.models.user import DailyReport, DailyReportComment, LeaderboardDaily, LeaderboardTotal, User, db
+
+TODAY = date.today()
+
+# (説明, 実行する関数, 使われるべきインデックス名)
+HOT_QUERIES = [
+    ('report by user/date',
+     lambda: DailyReport.query.filter_by(user_id='u', date=TODAY).first(),
+     'uq_daily_report_user_date'),
+    ('reports by user',
+     lambda: DailyReport.query.filter_by(user_id='u').order_by(DailyReport.date.desc()).all(),
+     'uq_daily_report_user_date'),
+    ('comments by user/date',
+     lambda: DailyReportComment.query.filter_by(user_id='u', date=TODAY).order_by(
+         DailyReportComment.created_at.desc()).all(),
+     'ix_daily_report_comment_user_date'),
+    ('curriculums by user',
+     lambda: Curriculum.query.filter_by(user_id='u').order_by(Curriculum.created_at.desc()).all(),
+     'ix_curriculum_user_created'),
+    ('progress by curriculum/day',
+     lambda: CurriculumProgress.query.filter_by(curriculum_id='c', day=1).first(),
+     'uq_curriculum_progress_curriculum_day'),
+    ('progress by curriculum',
+     lambda: CurriculumProgress.query.filter_by(curriculum_id='c').order_by(CurriculumProgress.day).all(),
+     'uq_curriculum_progress_curriculum_day'),
+    ('today ranking',
+     lambda: DailyReport.query.filter_by(date=TODAY).order_by(DailyReport.total_study_time.desc()).limit(10).all(),
+     'ix_daily_report_date_study_time'),
+    ('total ranking',
+     lambda: db.session.query(LeaderboardTotal.user_id, User.name).join(
+         User, User.user_id == LeaderboardTotal.user_id).order_by(
+         LeaderboardTotal.total_study_time.desc()).limit(10).all(),
+     'ix_leaderboard_total_total_study_time'),
+    ('window ranking',
+     lambda: db.session.query(LeaderboardDaily.user_id, func.sum(LeaderboardDaily.total_study_time)).filter(
+         LeaderboardDaily.day.between(TODAY.replace(day=1), TODAY)).group_by(LeaderboardDaily.user_id).all(),
+     'ix_leaderboard_daily_day_user'),
+]
+
+
+@pytest.mark.parametrize('label, run, expected_index', HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(app, label, run, expected_index):
+    with app.app_context():
+        run_migrations()
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            run()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        statement, parameters = statements[-1]
+        plan = [row[-1] for row in db.session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        assert any(expected_index in step for step in plan), f'{label}: {" / ".join(plan)}'
@@ -0,0 +1,76 @@
+from datetime import date
+
+from src.models.user import LeaderboardDaily, LeaderboardTotal, User, apply_report_delta, db
+
+
+def _create_user(client, user_id, name):
+    response = client.post('/api/users', json={'user_id': user_id, 'name': name, 'email': f'{user_id}@example.com'})
+    assert response.status_code == 201, response.get_json()
+
+
+def _leaderboards(app, user_id):
+    with app.app_context():
+        total = LeaderboardTotal.query.filter_by(user_id=user_id).first()
+        daily = {
+            row.day: (row.total_study_time, row.total_focus_time)
+            for row in LeaderboardDaily.query.filter_by(user_id=user_id).all()
+        }
+        return (total.total_study_time, total.total_focus_time) if total else None, daily
+
+
+def test_report_writes_apply_leaderboard_deltas(app, client):
+    first, second = date(2024, 1, 1), date(2024, 1, 2)
+    for day, study_time, focus_time in ((first, 600, 300), (second, 1200, 900)):
+        response = client.post('/api/users/alice/reports', json={
+            'date': day.isoformat(), 'total_study_time': study_time, 'total_focus_time': focus_time
+        })
+        assert response.status_code == 201
+    assert _leaderboards(app, 'alice') == ((1800, 1200), {first: (600, 300), second: (1200, 900)})
+
+    client.put('/api/users/alice/reports/2024-01-01', json={'total_study_time': 1000})
+    assert _leaderboards(app, 'alice') == ((2200, 1200), {first: (1000, 300), second: (1200, 900)})
+
+    assert client.delete('/api/users/alice/reports/2024-01-02').status_code == 204
+    assert _leaderboards(app, 'alice') == ((1000, 300), {first: (1000, 300)})
+
+
+def test_rankings_reflect_writes_from_other_workers(app, client):
+    _create_user(client, 'alice', 'Alice')
+    _create_user(client, 'bob', 'Bob')
+    client.post('/api/users/alice/reports', json={'date': date.today().isoformat(), 'total_study_time': 600})
+    first = client.get('/api/rankings').get_json()
+    assert first['study_time_total'][0]['user_id'] == 'alice'
+
+    # 別のワーカーでの書き込み（このプロセスのキャッシュは破棄されない）
+    with app.app_context():
+        apply_report_delta('bob', date(2024, 1, 1), 3600, 0)
+        db.session.commit()
+
+    second = client.get('/api/rankings').get_json()
+    assert second['study_time_total'][0]['user_id'] == 'bob'
+
+
+def test_rankings_reflect_name_changes_from_other_workers(app, client):
+    _create_user(client, 'alice', 'Alice')
+    client.get('/api/rankings')
+
+    with app.app_context():
+        User.query.filter_by(user_id='alice').update({User.name: 'Alicia'})
+        LeaderboardTotal.touch('alice')
+        db.session.commit()
+
+    names = [item['name'] for item in client.get('/api/rankings').get_json()['study_time_total']]
+    assert names == ['Alicia']
+
+
+def test_ranking_page_ignores_deleted_users_for_me(app, client):
+    _create_user(client, 'alice', 'Alice')
+    with app.app_context():
+        # ユーザー行がなく集計だけが残っている
+        db.session.add(LeaderboardTotal(user_id='ghost', total_study_time=100, total_focus_time=0))
+        db.session.commit()
+
+    body = client.get('/api/rankings/study-time?user_id=ghost').get_json()
+
+    assert [item['user_id'] for item in body['items']] == ['alice']
+    assert body['me'] is None
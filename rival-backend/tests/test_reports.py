@@ -0,0 +1,69 @@
+from datetime import date
+
+
+def _create_report(client, user_id, day, study_time, focus_time=0, series=None):
+    response = client.post(f'/api/users/{user_id}/reports', json={
+        'date': day.isoformat(),
+        'total_study_time': study_time,
+        'total_focus_time': focus_time,
+        'time_series_focus_data': series or []
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def test_report_list_includes_time_series_by_default(client):
+    series = [{'timestamp': '2024-01-05T09:00:00', 'score': 80}]
+    _create_report(client, 'alice', date(2024, 1, 5), 600, series=series)
+
+    reports = client.get('/api/users/alice/reports').get_json()
+
+    assert reports[0]['time_series_focus_data'] == series
+
+
+def test_report_list_can_exclude_time_series(client):
+    _create_report(client, 'alice', date(2024, 1, 5), 600, series=[{'timestamp': '2024-01-05T09:00:00', 'score': 80}])
+
+    reports = client.get('/api/users/alice/reports?exclude=time_series').get_json()
+
+    assert 'time_series_focus_data' not in reports[0]
+
+
+def test_report_list_pages_with_cursor(client):
+    for day in range(1, 6):
+        _create_report(client, 'alice', date(2024, 1, day), 60 * day)
+
+    dates = []
+    cursor = None
+    pages = 0
+    while True:
+        response = client.get('/api/users/alice/reports?limit=2' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        dates += [report['date'] for report in response.get_json()]
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert dates == [date(2024, 1, day).isoformat() for day in range(5, 0, -1)]
+
+
+def test_report_list_rejects_invalid_cursor(client):
+    _create_report(client, 'alice', date(2024, 1, 5), 600)
+
+    assert client.get('/api/users/alice/reports?cursor=not-a-cursor').status_code == 400
+
+
+def test_report_list_returns_304_until_changed(client):
+    _create_report(client, 'alice', date(2024, 1, 5), 600)
+    etag = client.get('/api/users/alice/reports').headers['ETag']
+
+    unchanged = client.get('/api/users/alice/reports', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+
+    client.put('/api/users/alice/reports/2024-01-05', json={'total_study_time': 900})
+    changed = client.get('/api/users/alice/reports', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()[0]['total_study_time'] == 900
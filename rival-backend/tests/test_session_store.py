@@ -0,0 +1,29 @@
+import pytest
+
+from src.services.session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+def test_incomplete_store_cannot_be_instantiated():
+    class PartialStore(SessionStore):
+        def start(self, user_id):
+            return {}
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: MemorySessionStore(),
+    lambda tmp_path: SQLiteSessionStore(path=str(tmp_path / 'sessions.db'))
+], ids=['memory', 'sqlite'])
+def test_store_records_detections(make_store, tmp_path):
+    store = make_store(tmp_path)
+    store.start('alice')
+
+    store.record_detection('alice', True)
+    session = store.record_detection('alice', False)
+
+    assert session['total_detections'] == 2
+    assert session['present_detections'] == 1
+    store.end('alice')
+    assert store.get('alice') is None
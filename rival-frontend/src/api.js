@@ -49,6 +49,15 @@ export const api = {
         return response.json();
     },
 
+    async fetchCurriculum(auth, curriculumId) {
+        const headers = await getAuthHeader(auth);
+        const response = await fetch(`${API_BASE_URL}/curriculums/${curriculumId}`, {
+            headers: headers
+        });
+        if (!response.ok) throw new Error('Failed to fetch curriculum');
+        return response.json();
+    },
+
     async createCurriculum(auth, userId, data) {
         const headers = await getAuthHeader(auth);
         const response = await fetch(`${API_BASE_URL}/users/${userId}/curriculums`, {
@@ -60,6 +69,16 @@ export const api = {
             body: JSON.stringify(data),
         });
         if (!response.ok) throw new Error('Failed to create curriculum');
+        // 生成はバックグラウンドのジョブで行われ、ここではジョブ（job_id, status）が返る
+        return response.json();
+    },
+
+    async fetchCurriculumJob(auth, jobId) {
+        const headers = await getAuthHeader(auth);
+        const response = await fetch(`${API_BASE_URL}/curriculum-jobs/${jobId}`, {
+            headers: headers
+        });
+        if (!response.ok) throw new Error('Failed to fetch curriculum job');
         return response.json();
     },
 
@@ -95,6 +114,15 @@ export const api = {
         return response.json();
     },
 
+    async fetchUserCurriculumStats(auth, userId) {
+        const headers = await getAuthHeader(auth);
+        const response = await fetch(`${API_BASE_URL}/users/${userId}/curriculums/stats`, {
+            headers: headers
+        });
+        if (!response.ok) throw new Error('Failed to fetch curriculum stats');
+        return response.json();
+    },
+
     async fetchUserReports(auth, userId, dateString) {
         const headers = await getAuthHeader(auth);
         const response = await fetch(`${API_BASE_URL}/users/${userId}/reports/${dateString}`, {
@@ -220,58 +248,16 @@ export const api = {
         return response.status === 204 ? {} : response.json();
     },
 
-    async fetchTotalStudyTimeRanking(auth) {
-        const headers = await getAuthHeader(auth);
-        console.log('Fetching total study time ranking from:', `${API_BASE_URL}/rankings/study-time/total`);
-        const response = await fetch(`${API_BASE_URL}/rankings/study-time/total`, {
-            headers: headers
-        });
-        console.log('Response status:', response.status);
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('API Error:', errorText);
-            throw new Error(`Failed to fetch total study time ranking: ${response.status}`);
-        }
-        const data = await response.json();
-        console.log('Total study time ranking data:', data);
-        return data;
-    },
-
-    async fetchTotalFocusTimeRanking(auth) {
-        const headers = await getAuthHeader(auth);
-        const response = await fetch(`${API_BASE_URL}/rankings/focus-time/total`, {
-            headers: headers
-        });
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('API Error:', errorText);
-            throw new Error(`Failed to fetch total focus time ranking: ${response.status}`);
-        }
-        return response.json();
-    },
-
-    async fetchTodayStudyTimeRanking(auth) {
-        const headers = await getAuthHeader(auth);
-        const response = await fetch(`${API_BASE_URL}/rankings/study-time/today`, {
-            headers: headers
-        });
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('API Error:', errorText);
-            throw new Error(`Failed to fetch today study time ranking: ${response.status}`);
-        }
-        return response.json();
-    },
-
-    async fetchTodayFocusTimeRanking(auth) {
+    async fetchRankings(auth) {
         const headers = await getAuthHeader(auth);
-        const response = await fetch(`${API_BASE_URL}/rankings/focus-time/today`, {
+        // 4種類のランキングを1リクエストで取得する（変更がなければブラウザのキャッシュから304で再利用される）
+        const response = await fetch(`${API_BASE_URL}/rankings`, {
             headers: headers
         });
         if (!response.ok) {
             const errorText = await response.text();
             console.error('API Error:', errorText);
-            throw new Error(`Failed to fetch today focus time ranking: ${response.status}`);
+            throw new Error(`Failed to fetch rankings: ${response.status}`);
         }
         return response.json();
     },
@@ -32,6 +32,7 @@ import CurriculumRadialMap from './CurriculumRadialMap'
 export default function CurriculumPage({ user }) {
   const [activeTab, setActiveTab] = useState('create')
   const [curriculums, setCurriculums] = useState([])
+  const [curriculumStats, setCurriculumStats] = useState({})
   const [selectedCurriculum, setSelectedCurriculum] = useState(null)
   const [selectedDay, setSelectedDay] = useState(null)
   const [loading, setLoading] = useState(false)
@@ -56,7 +57,7 @@ export default function CurriculumPage({ user }) {
             setLoading(true);
             setGenerationStatus(parsedStatus);
           }
-          pollGenerationStatus(parsedStatus.userId, parsedStatus.startTime);
+          pollGenerationStatus(parsedStatus.userId, parsedStatus.startTime, parsedStatus.jobId);
         }
       }
     }, 3000);
@@ -73,12 +74,12 @@ export default function CurriculumPage({ user }) {
       if (parsedStatus.isGenerating) {
         setGenerationStatus(parsedStatus);
         setLoading(true);
-        pollGenerationStatus(parsedStatus.userId, parsedStatus.startTime);
+        pollGenerationStatus(parsedStatus.userId, parsedStatus.startTime, parsedStatus.jobId);
       }
     }
   };
 
-  const pollGenerationStatus = async (userId, startTime) => {
+  const pollGenerationStatus = async (userId, startTime, jobId) => {
     const maxWaitTime = 5 * 60 * 1000;
     const currentTime = Date.now();
     
@@ -90,6 +91,26 @@ export default function CurriculumPage({ user }) {
     }
 
     try {
+      if (jobId) {
+        const job = await api.fetchCurriculumJob(auth, jobId);
+        if (job.status === 'succeeded') {
+          const data = await api.fetchCurriculums(auth, userId);
+          setCurriculums(data);
+          clearGenerationStatus();
+          setLoading(false);
+          setFormData({ goal: '', duration_days: 30 });
+          setActiveTab('list');
+          alert(`カリキュラム「${job.curriculum ? job.curriculum.title : job.goal}」が正常に生成されました！`);
+        } else if (job.status === 'failed') {
+          clearGenerationStatus();
+          setLoading(false);
+          alert(`カリキュラムの生成に失敗しました: ${job.error || ''}`);
+        } else if (job.days_generated) {
+          setGenerationStatus(prev => prev ? { ...prev, daysGenerated: job.days_generated } : prev);
+        }
+        return;
+      }
+
       const data = await api.fetchCurriculums(auth, userId);
       const newCurriculum = data.find(c => {
         const createdTime = new Date(c.created_at).getTime();
@@ -114,11 +135,18 @@ export default function CurriculumPage({ user }) {
     setGenerationStatus(null);
   };
 
-  // カリキュラム一覧を取得
+  // カリキュラム一覧と、全カリキュラムの統計情報（1回のリクエスト）を取得
   const fetchCurriculums = async (userId) => {
     try {
-      const data = await api.fetchCurriculums(auth, userId);
+      const [data, statsList] = await Promise.all([
+        api.fetchCurriculums(auth, userId),
+        api.fetchUserCurriculumStats(auth, userId).catch((error) => {
+          console.error('Error fetching curriculum stats:', error);
+          return [];
+        })
+      ]);
       setCurriculums(data);
+      setCurriculumStats(Object.fromEntries(statsList.map(stats => [stats.curriculum_id, stats])));
     } catch (error) {
       console.error('Error fetching curriculums:', error);
     }
@@ -139,6 +167,7 @@ export default function CurriculumPage({ user }) {
   const fetchStats = async (curriculumId) => {
     try {
       const data = await api.fetchCurriculumStats(auth, curriculumId);
+      setCurriculumStats(prev => ({ ...prev, [curriculumId]: data }));
       return data;
     } catch (error) {
       console.error('Error fetching stats:', error);
@@ -164,31 +193,30 @@ export default function CurriculumPage({ user }) {
     setGenerationStatus(status);
 
     try {
-      const newCurriculum = await api.createCurriculum(auth, user.uid, formData);
-      setCurriculums(prev => [newCurriculum, ...prev]);
-      setFormData({ goal: '', duration_days: 30 });
-      clearGenerationStatus();
-      setLoading(false);
-      setActiveTab('list');
-      alert(`カリキュラム「${newCurriculum.title}」が正常に生成されました！`);
+      // 生成はサーバー側のジョブで行われるため、job_idを保存して完了するまでポーリングする
+      const job = await api.createCurriculum(auth, user.uid, formData);
+      const jobStatus = { ...status, jobId: job.job_id };
+      localStorage.setItem('curriculumGenerationStatus', JSON.stringify(jobStatus));
+      setGenerationStatus(jobStatus);
     } catch (error) {
       console.error('Error creating curriculum:', error);
-      pollGenerationStatus(user.uid, startTime);
+      clearGenerationStatus();
+      setLoading(false);
+      alert('カリキュラムの生成を開始できませんでした。しばらくしてからもう一度お試しください。');
     }
   }
 
   // 日別タスクの完了状態を更新
   const handleToggleCompletion = async (curriculumId, day, completed) => {
     try {
-      await api.updateCurriculumProgress(auth, curriculumId, day, { completed: !completed });
+      const updatedDay = await api.updateCurriculumProgress(auth, curriculumId, day, { completed: !completed });
 
-      // 選択されたカリキュラムの進捗を更新
+      // 選択されたカリキュラムの進捗を更新（更新した日は応答で差し替え、統計だけを取得し直す）
       if (selectedCurriculum && selectedCurriculum.curriculum_id === curriculumId) {
-        const updatedProgress = await fetchProgress(curriculumId)
         const updatedStats = await fetchStats(curriculumId)
         setSelectedCurriculum(prev => ({
           ...prev,
-          progress: updatedProgress,
+          progress: (prev.progress || []).map(p => p.day === updatedDay.day ? updatedDay : p),
           stats: updatedStats
         }))
       }
@@ -199,11 +227,19 @@ export default function CurriculumPage({ user }) {
 
   // カリキュラム詳細を表示
   const handleViewCurriculum = async (curriculum) => {
-    const progress = await fetchProgress(curriculum.curriculum_id)
-    const stats = await fetchStats(curriculum.curriculum_id)
+    // 一覧には日ごとの計画が含まれないため、詳細を表示するときにカリキュラム全体を取得する
+    const [detail, progress, stats] = await Promise.all([
+      api.fetchCurriculum(auth, curriculum.curriculum_id).catch((error) => {
+        console.error('Error fetching curriculum:', error)
+        return curriculum
+      }),
+      fetchProgress(curriculum.curriculum_id),
+      fetchStats(curriculum.curriculum_id)
+    ])
 
     setSelectedCurriculum({
-      ...curriculum,
+      ...detail,
+      curriculum_data: detail.curriculum_data || {},
       progress: progress,
       stats: stats
     })
@@ -367,6 +403,11 @@ export default function CurriculumPage({ user }) {
                     <p className="text-xs text-foreground/50">
                       AIがカリキュラムを作成しています。しばらくお待ちください...
                     </p>
+                    {generationStatus.daysGenerated > 0 && (
+                      <p className="text-xs text-blue-400 mt-1">
+                        {generationStatus.daysGenerated}日目まで作成済み
+                      </p>
+                    )}
                     <p className="text-xs text-foreground/40 mt-2">
                       ※ 他のページに移動しても生成は継続されます
                     </p>
@@ -496,8 +537,10 @@ export default function CurriculumPage({ user }) {
                     curriculum={selectedCurriculum}
                     progress={selectedCurriculum.progress || []}
                     onProgressUpdate={async () => {
-                      const updatedProgress = await fetchProgress(selectedCurriculum.curriculum_id)
-                      const updatedStats = await fetchStats(selectedCurriculum.curriculum_id)
+                      const [updatedProgress, updatedStats] = await Promise.all([
+                        fetchProgress(selectedCurriculum.curriculum_id),
+                        fetchStats(selectedCurriculum.curriculum_id)
+                      ])
                       setSelectedCurriculum(prev => ({
                         ...prev,
                         progress: updatedProgress,
@@ -658,6 +701,11 @@ export default function CurriculumPage({ user }) {
                       <div className="flex justify-between items-center">
                         <div className="text-sm text-foreground/70">
                           作成日: {formatDate(curriculum.created_at)}
+                          {curriculumStats[curriculum.curriculum_id] && (
+                            <span className="ml-3">
+                              進捗: {curriculumStats[curriculum.curriculum_id].completion_rate}%
+                            </span>
+                          )}
                         </div>
                         <div className="flex gap-2">
                           <Button
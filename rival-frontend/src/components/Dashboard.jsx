@@ -437,6 +437,7 @@ export default function Dashboard({ user }) {
         <div className="space-y-6">
           <FocusMonitor
             enabled={cameraEnabled}
+            userId={user?.uid}
             onFocusScoreUpdate={handleFocusScoreUpdate}
           />
           
@@ -3,10 +3,13 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Alert, AlertDescription } from '@/components/ui/alert'
 import { Camera, CameraOff, AlertTriangle } from 'lucide-react'
 import { API_BASE_URL } from '@/config';
+import { auth } from '../firebase';
 
-export default function FocusMonitor({ enabled, onFocusScoreUpdate }) {
+export default function FocusMonitor({ enabled, userId, onFocusScoreUpdate }) {
   const videoRef = useRef(null)
   const canvasRef = useRef(null)
+  const socketRef = useRef(null)
+  const frameTimerRef = useRef(null)
   const [stream, setStream] = useState(null)
   const [error, setError] = useState(null)
   const [isLoading, setIsLoading] = useState(false)
@@ -62,6 +65,13 @@ export default function FocusMonitor({ enabled, onFocusScoreUpdate }) {
   }
 
   const stopCamera = () => {
+    if (socketRef.current) {
+      const socket = socketRef.current
+      socketRef.current = null
+      clearTimeout(frameTimerRef.current)
+      socket.close()
+    }
+
     if (stream) {
       stream.getTracks().forEach(track => track.stop())
       setStream(null)
@@ -81,38 +91,112 @@ export default function FocusMonitor({ enabled, onFocusScoreUpdate }) {
     canvas.height = video.videoHeight;
     const context = canvas.getContext('2d');
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
-    return canvas.toDataURL('image/jpeg');
+    // Base64に変換せず、JPEGのバイナリをそのまま送信する
+    return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg'));
+  }
+
+  const handleDetectionResult = (data) => {
+    setDetectionData(data);
+    onFocusScoreUpdate(data.focusScore || 0);
+    setError(null);
+  }
+
+  const handleDetectionError = (error) => {
+    console.error('Error detecting face:', error);
+    const errorMessage = error.message || 'サーバーとの通信に失敗しました。';
+    setError(errorMessage);
+    setDetectionData({ faceDetected: false, confidence: 0, focusScore: 0, elapsedTime: 0, totalDetections: 0, presentDetections: 0 });
+    onFocusScoreUpdate(0);
+  }
+
+  // サーバー側で集中度の時系列をユーザーごとに記録するため、userIdを付けて送る
+  const userQuery = userId ? `?userId=${encodeURIComponent(userId)}` : '';
+
+  // Firebase IDトークン（SDKがキャッシュし、期限が近づくと更新する。forceRefreshで取り直す）
+  // サーバーでAUTH_REQUIRED=trueの場合、/detectはAuthorizationヘッダー、/streamは?access_token=で検証される
+  const getIdToken = async (forceRefresh = false) => {
+    try {
+      return auth.currentUser ? await auth.currentUser.getIdToken(forceRefresh) : null;
+    } catch (error) {
+      return null;
+    }
+  }
+
+  const postFrame = async (image, forceRefresh = false) => {
+    const token = await getIdToken(forceRefresh);
+    return fetch(`${API_BASE_URL}/concentration/detect${userQuery}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'image/jpeg',
+        ...(token ? { 'Authorization': `Bearer ${token}` } : {})
+      },
+      body: image,
+    });
   }
 
-    const startFocusDetection = () => {
+  // WebSocketでフレームを送り続け、集中スコアを受け取る
+  // 接続できない環境（WebSocket非対応のホスティングなど）ではHTTPポーリングに切り替える
+  const startFocusDetection = async () => {
+    // WebSocketはヘッダーを付けられないため、トークンはクエリで渡す
+    const token = await getIdToken();
+    const tokenQuery = token ? `${userQuery ? '&' : '?'}access_token=${encodeURIComponent(token)}` : '';
+    let socket;
+    try {
+      socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/concentration/stream${userQuery}${tokenQuery}`);
+    } catch (error) {
+      startPolling();
+      return;
+    }
+    socketRef.current = socket;
+
+    const sendFrame = async () => {
+      if (socket.readyState !== WebSocket.OPEN) return;
+      const image = await captureFrame();
+      if (image) {
+        socket.send(image);
+      }
+      frameTimerRef.current = setTimeout(sendFrame, 2000); // 2秒ごとに検出
+    }
+
+    socket.onopen = () => sendFrame();
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.error) {
+        handleDetectionError(new Error(data.error));
+      } else {
+        handleDetectionResult(data);
+      }
+    };
+    socket.onclose = () => {
+      clearTimeout(frameTimerRef.current);
+      // 自分で閉じた場合以外はポーリングで継続する
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+        startPolling();
+      }
+    };
+  }
+
+  const startPolling = () => {
     const detectFocus = async () => {
       if (!enabled) return;
 
-      const image = captureFrame();
+      const image = await captureFrame();
       if (image) {
         try {
-          const response = await fetch(`${API_BASE_URL}/concentration/detect`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ image }),
-          });
+          let response = await postFrame(image);
+          if (response.status === 401) {
+            // トークンの期限切れ・失効の場合は取り直して1回だけ再送する
+            response = await postFrame(image, true);
+          }
 
           if (!response.ok) {
             throw new Error('Network response was not ok');
           }
 
-          const data = await response.json();
-          setDetectionData(data);
-          onFocusScoreUpdate(data.focusScore || 0);
-          setError(null);
+          handleDetectionResult(await response.json());
         } catch (error) {
-          console.error('Error detecting face:', error);
-          const errorMessage = error.message || 'サーバーとの通信に失敗しました。';
-          setError(errorMessage);
-          setDetectionData({ faceDetected: false, confidence: 0, focusScore: 0, elapsedTime: 0, totalDetections: 0, presentDetections: 0 });
-          onFocusScoreUpdate(0);
+          handleDetectionError(error);
         }
       }
 
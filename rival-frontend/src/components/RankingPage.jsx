@@ -20,16 +20,11 @@ export default function RankingPage({ user, onBack }) {
   const fetchRankings = async () => {
     setLoading(true);
     try {
-      const [totalStudy, totalFocus, todayStudy, todayFocus] = await Promise.all([
-        api.fetchTotalStudyTimeRanking(auth),
-        api.fetchTotalFocusTimeRanking(auth),
-        api.fetchTodayStudyTimeRanking(auth),
-        api.fetchTodayFocusTimeRanking(auth)
-      ]);
-      setStudyTimeRanking(totalStudy);
-      setFocusTimeRanking(totalFocus);
-      setTodayStudyTimeRanking(todayStudy);
-      setTodayFocusTimeRanking(todayFocus);
+      const rankings = await api.fetchRankings(auth);
+      setStudyTimeRanking(rankings.study_time_total || []);
+      setFocusTimeRanking(rankings.focus_time_total || []);
+      setTodayStudyTimeRanking(rankings.study_time_today || []);
+      setTodayFocusTimeRanking(rankings.focus_time_today || []);
     } catch (error) {
       console.error('Error fetching rankings:', error);
     } finally {